@@ -1,6 +1,6 @@
 """
 Module to generate candlestick charts.
-Generates a chart image (as base64-encoded PNG) from stock data.
+Generates a chart image (as PNG bytes or base64-encoded PNG) from stock data.
 """
 import matplotlib
 
@@ -12,16 +12,19 @@ import io
 import base64
 
 
-def generate_candlestick_chart(data, ticker):
+def render_candlestick_png(data, ticker):
     """
-    Generate a candlestick chart from the provided data.
+    Render a candlestick chart of the provided data to PNG.
+
+    This function does not use Django, so it can run in the chart render process pool
+    (see core/analysis/chartcache.py).
 
     Parameters:
       data (DataFrame): The stock data.
       ticker (str): The stock ticker symbol.
 
     Returns:
-      str: Base64-encoded PNG image of the chart.
+      bytes: The PNG image of the chart.
     """
     data = data.copy()
     data.index.name = 'Date'
@@ -40,6 +43,18 @@ def generate_candlestick_chart(data, ticker):
     buf = io.BytesIO()
     plt.savefig(buf, format='png')
     plt.close(fig)
-    buf.seek(0)
-    image_base64 = base64.b64encode(buf.getvalue()).decode('utf-8')
-    return image_base64
+    return buf.getvalue()
+
+
+def generate_candlestick_chart(data, ticker):
+    """
+    Generate a candlestick chart from the provided data.
+
+    Parameters:
+      data (DataFrame): The stock data.
+      ticker (str): The stock ticker symbol.
+
+    Returns:
+      str: Base64-encoded PNG image of the chart.
+    """
+    return base64.b64encode(render_candlestick_png(data, ticker)).decode('utf-8')
@@ -0,0 +1,202 @@
+"""
+Module to cache rendered candlestick charts on disk and render them off the request path.
+
+A chart is identified by (ticker, start, end, interval, data version). The data version
+comes from the stock catalog (row count, last bar and last refresh), so storing new bars
+changes the key and the next request renders a fresh chart. PNG files are kept in
+charts.cache_dir and the least recently used ones are deleted once the directory grows
+beyond charts.max_cache_mb.
+
+Cold renders run in a dedicated process pool (charts.render_workers) so matplotlib's
+global state and its CPU-heavy drawing stay out of the web workers. The workers are
+spawned rather than forked, so they do not inherit the threads and imported modules of the
+web worker.
+"""
+import os
+import hashlib
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as RenderTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from django.conf import settings
+from core.data.catalog import get_data_version
+from core.data.querier import get_bars
+from core.analysis.chart import render_candlestick_png
+
+# Defaults for the charts section of config.yaml
+DEFAULT_CACHE_DIR = 'chart_cache'
+DEFAULT_MAX_CACHE_MB = 200
+DEFAULT_RENDER_WORKERS = 2
+DEFAULT_MAX_AGE = 300
+RENDER_TIMEOUT = 120
+
+
+class ChartCache:
+    """
+    Directory of rendered PNG files bounded by total size, evicted in least-recently-used
+    order (file mtime is refreshed on every hit).
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.png")
+
+    def get(self, key):
+        """
+        Return the path of the cached PNG for key, or None.
+        """
+        path = self.path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, key, png):
+        """
+        Store the PNG for key (atomically) and evict old files above the size budget.
+
+        Returns:
+          str: The path of the stored file.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(png)
+        os.replace(tmp_path, path)
+        self.evict(keep=path)
+        return path
+
+    def evict(self, keep=None):
+        """
+        Delete the least recently used files until the directory fits the size budget.
+        """
+        with self._lock:
+            entries = []
+            for name in os.listdir(self.directory):
+                if not name.endswith('.png'):
+                    continue
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                if path == keep:
+                    continue
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+
+
+_chart_cache = None
+_render_pool = None
+_lock = threading.Lock()
+
+
+def _charts_config():
+    return settings.CONFIG.get('charts') or {}
+
+
+def get_chart_cache():
+    """
+    Return the process-wide ChartCache, created from config.yaml on first use.
+    """
+    global _chart_cache
+    if _chart_cache is None:
+        with _lock:
+            if _chart_cache is None:
+                config = _charts_config()
+                directory = os.path.join(settings.BASE_DIR, config.get('cache_dir', DEFAULT_CACHE_DIR))
+                max_mb = config.get('max_cache_mb', DEFAULT_MAX_CACHE_MB)
+                _chart_cache = ChartCache(directory, int(max_mb * 1024 * 1024))
+    return _chart_cache
+
+
+def get_render_pool():
+    """
+    Return the process pool used for cold renders, or None if charts.render_workers is 0.
+    """
+    global _render_pool
+    workers = int(_charts_config().get('render_workers', DEFAULT_RENDER_WORKERS))
+    if workers <= 0:
+        return None
+    if _render_pool is None:
+        with _lock:
+            if _render_pool is None:
+                _render_pool = ProcessPoolExecutor(max_workers=workers,
+                                                   mp_context=multiprocessing.get_context("spawn"))
+    return _render_pool
+
+
+def chart_key(ticker, start_date, end_date, interval, version):
+    """
+    Return the cache key (a hex digest) of a chart.
+    """
+    raw = f"{ticker}|{start_date}|{end_date}|{interval}|{version}"
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def render_chart(bars, ticker):
+    """
+    Render a chart in the render process pool (or in this process if the pool is disabled).
+
+    Returns:
+      bytes: The PNG image, or None if the render timed out or the pool broke (a broken pool
+             is dropped, so the next render starts a new one).
+    """
+    global _render_pool
+    pool = get_render_pool()
+    if pool is None:
+        return render_candlestick_png(bars, ticker)
+    try:
+        return pool.submit(render_candlestick_png, bars, ticker).result(timeout=RENDER_TIMEOUT)
+    except RenderTimeoutError:
+        return None
+    except BrokenProcessPool:
+        with _lock:
+            if _render_pool is pool:
+                _render_pool = None
+        pool.shutdown(wait=False)
+        return None
+
+
+def get_chart(ticker, start_date, end_date, interval):
+    """
+    Return the cached chart of a ticker, rendering it first on a miss.
+
+    Returns:
+      tuple: (path, key) of the PNG file, (None, None) if there are no bars in the range, or
+             (None, key) if the chart could not be rendered.
+    """
+    key = chart_key(ticker, start_date, end_date, interval, get_data_version(ticker))
+    cache = get_chart_cache()
+    path = cache.get(key)
+    if path is not None:
+        return path, key
+    # Minute bars for '1m', the bar pyramid otherwise
+    bars = get_bars(ticker, start_date, end_date, interval)
+    if bars is None or bars.empty:
+        return None, None
+    png = render_chart(bars, ticker)
+    if png is None:
+        return None, key
+    return cache.put(key, png), key
+
+
+def chart_max_age():
+    """
+    Return the Cache-Control max-age of chart responses in seconds.
+    """
+    return int(_charts_config().get('max_age', DEFAULT_MAX_AGE))
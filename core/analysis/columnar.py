@@ -0,0 +1,72 @@
+"""
+Module to encode bars as columns for client-side charting.
+
+Instead of one JSON object per bar, the bars are sent as one array per field:
+  - t: bar start as epoch seconds (UTC)
+  - o, h, l, c: prices, rounded to PRICE_DECIMALS
+  - v: volumes as integers
+  - m: session codes, indexes into the "sessions" list
+Compact JSON (no whitespace) and Arrow IPC stream are supported; both carry the same columns.
+"""
+import json
+import numpy as np
+import pandas as pd
+from core.data.sessions import MARKET_SESSIONS, MARKET_TIMEZONE
+
+PRICE_DECIMALS = 4
+
+# Session names of the m column; bars covering all sessions (1d) use the last code
+COLUMN_SESSIONS = MARKET_SESSIONS + ['all']
+
+JSON_CONTENT_TYPE = 'application/json'
+ARROW_CONTENT_TYPE = 'application/vnd.apache.arrow.stream'
+
+
+def bars_to_columns(bars):
+    """
+    Convert bars (Open/High/Low/Close/Volume/Market columns, naive market-time index) to columns.
+
+    Returns:
+      dict: t (int64), o/h/l/c (float64), v (int64) and m (int8) arrays.
+    """
+    index = pd.DatetimeIndex(bars.index)
+    if index.tz is None:
+        index = index.tz_localize(MARKET_TIMEZONE)
+    codes = {name: code for code, name in enumerate(COLUMN_SESSIONS)}
+    markets = bars['Market'].astype(str).to_numpy() if 'Market' in bars else np.full(len(bars), 'unknown')
+    return {
+        't': index.as_unit('s').asi8,
+        'o': np.round(bars['Open'].to_numpy(dtype=float), PRICE_DECIMALS),
+        'h': np.round(bars['High'].to_numpy(dtype=float), PRICE_DECIMALS),
+        'l': np.round(bars['Low'].to_numpy(dtype=float), PRICE_DECIMALS),
+        'c': np.round(bars['Close'].to_numpy(dtype=float), PRICE_DECIMALS),
+        'v': np.nan_to_num(bars['Volume'].to_numpy(dtype=float)).astype(np.int64),
+        'm': np.array([codes.get(m, 0) for m in markets], dtype=np.int8),
+    }
+
+
+def encode_json(ticker, interval, columns):
+    """
+    Return the columns as compact JSON bytes. Missing prices are encoded as null.
+    """
+    payload = {'ticker': ticker, 'interval': interval, 'count': len(columns['t']), 'sessions': COLUMN_SESSIONS}
+    for name, values in columns.items():
+        if values.dtype.kind == 'f':
+            payload[name] = [None if np.isnan(x) else x for x in values.tolist()]
+        else:
+            payload[name] = values.tolist()
+    return json.dumps(payload, separators=(',', ':')).encode()
+
+
+def encode_arrow(ticker, interval, columns):
+    """
+    Return the columns as an Arrow IPC stream. Ticker, interval and sessions are schema metadata.
+    """
+    import pyarrow as pa
+    table = pa.table({name: pa.array(values) for name, values in columns.items()})
+    table = table.replace_schema_metadata({
+        'ticker': ticker, 'interval': interval, 'sessions': json.dumps(COLUMN_SESSIONS)})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
@@ -1,11 +1,208 @@
 """
 Module to calculate technical indicators.
-Currently, a simple 5-period Simple Moving Average (SMA) is implemented.
+
+Indicators are requested with specs such as "ema:20", "macd:12,26,9" or "vwap":
+  - sma:period               SMA_<period>
+  - ema:period               EMA_<period>
+  - macd:fast,slow,signal    MACD_*, MACD_SIGNAL_*, MACD_HIST_* (suffix fast_slow_signal)
+  - rsi:period               RSI_<period> (Wilder smoothing)
+  - bbands:period,width      BB_MID_*, BB_UPPER_*, BB_LOWER_* (suffix period_width)
+  - atr:period               ATR_<period> (Wilder smoothing)
+  - vwap                     VWAP, anchored at the start of every trading day and session
+
+All indicators of a request are computed in one pass over the price arrays: the arrays are
+extracted once and intermediate series (e.g. the 12 and 26 period EMAs shared by several
+MACD specs and EMA specs) are computed only once. get_indicators memoizes the result per
+(ticker, interval, range, specs) and storage version in the process-wide frame cache.
 """
+import numpy as np
 import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from core.data.sessions import session_codes, market_time_index
+
+# Parameters used when a spec gives none
+DEFAULT_PARAMS = {
+    'sma': (5,),
+    'ema': (20,),
+    'macd': (12, 26, 9),
+    'rsi': (14,),
+    'bbands': (20, 2),
+    'atr': (14,),
+    'vwap': (),
+}
+
+
+def parse_spec(spec):
+    """
+    Parse an indicator spec ("macd:12,26,9") into (name, params).
+
+    Raises:
+      Exception: If the indicator is unknown or the parameters are invalid.
+    """
+    name, _, raw = str(spec).strip().lower().partition(':')
+    if name not in DEFAULT_PARAMS:
+        raise Exception(f"Unknown indicator: {spec}")
+    if not raw:
+        return name, DEFAULT_PARAMS[name]
+    try:
+        params = tuple(float(p) if '.' in p else int(p) for p in raw.split(','))
+    except ValueError:
+        raise Exception(f"Invalid indicator parameters: {spec}")
+    if len(params) != len(DEFAULT_PARAMS[name]) or any(p <= 0 for p in params):
+        raise Exception(f"Invalid indicator parameters: {spec}")
+    return name, params
+
+
+def _suffix(params):
+    return '_'.join(f"{p:g}" for p in params)
+
+
+class IndicatorPass:
+    """
+    One pass over the price arrays of a set of bars. Intermediate series are memoized,
+    so indicators that share them (EMA and MACD, RSI variants, ...) compute them once.
+    """
+
+    def __init__(self, bars):
+        self.close = bars['Close'].to_numpy(dtype=float)
+        self.high = bars['High'].to_numpy(dtype=float)
+        self.low = bars['Low'].to_numpy(dtype=float)
+        self.volume = np.nan_to_num(bars['Volume'].to_numpy(dtype=float))
+        self.index = market_time_index(bars.index)
+        self._memo = {}
+
+    def _cached(self, key, compute):
+        if key not in self._memo:
+            self._memo[key] = compute()
+        return self._memo[key]
+
+    def exponential(self, period, values=None, key='close'):
+        """
+        Exponential moving average (alpha = 2 / (period + 1)), NaN for the first period - 1 bars.
+        """
+        values = self.close if values is None else values
+        return self._cached(('ema', key, period), lambda: pd.Series(values).ewm(
+            span=period, adjust=False, min_periods=period).mean().to_numpy())
+
+    def wilder(self, period, values, key):
+        """
+        Wilder smoothing (alpha = 1 / period), NaN for the first period - 1 bars.
+        """
+        return self._cached(('wilder', key, period), lambda: pd.Series(values).ewm(
+            alpha=1.0 / period, adjust=False, min_periods=period).mean().to_numpy())
+
+    def rolling(self, period, func):
+        """
+        Apply a reduction (np.mean, np.std, ...) over sliding windows of the close, NaN before
+        the first full window.
+        """
+        def compute():
+            result = np.full(len(self.close), np.nan)
+            if len(self.close) >= period:
+                result[period - 1:] = func(sliding_window_view(self.close, period), axis=1)
+            return result
+        return self._cached(('rolling', func.__name__, period), compute)
+
+    def sma(self, period):
+        return {f"SMA_{period}": self.rolling(period, np.mean)}
+
+    def ema(self, period):
+        return {f"EMA_{period}": self.exponential(period)}
+
+    def macd(self, fast, slow, signal):
+        line = self.exponential(fast) - self.exponential(slow)
+        signal_line = self.exponential(signal, line, key=('macd', fast, slow))
+        suffix = _suffix((fast, slow, signal))
+        return {f"MACD_{suffix}": line, f"MACD_SIGNAL_{suffix}": signal_line, f"MACD_HIST_{suffix}": line - signal_line}
+
+    def rsi(self, period):
+        change = np.diff(self.close, prepend=np.nan)
+        gain = self.wilder(period, np.where(change > 0, change, 0.0)[1:], 'gain')
+        loss = self.wilder(period, np.where(change < 0, -change, 0.0)[1:], 'loss')
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rsi = np.where(loss == 0, np.where(gain == 0, 50.0, 100.0), 100 - 100 / (1 + gain / loss))
+        rsi = np.where(np.isnan(gain) | np.isnan(loss), np.nan, rsi)
+        return {f"RSI_{period}": np.r_[np.nan, rsi][:len(self.close)]}
+
+    def bbands(self, period, width):
+        mid = self.rolling(period, np.mean)
+        std = self.rolling(period, np.std)
+        suffix = _suffix((period, width))
+        return {f"BB_MID_{suffix}": mid, f"BB_UPPER_{suffix}": mid + width * std, f"BB_LOWER_{suffix}": mid - width * std}
+
+    def atr(self, period):
+        prev_close = np.r_[np.nan, self.close[:-1]]
+        true_range = np.fmax(self.high - self.low, np.fmax(np.abs(self.high - prev_close), np.abs(self.low - prev_close)))
+        return {f"ATR_{period}": self.wilder(period, true_range, 'true_range')}
+
+    def vwap(self):
+        typical = (self.high + self.low + self.close) / 3
+        pv = np.nan_to_num(typical * self.volume)
+        days = self.index.normalize().to_numpy()
+        sessions = session_codes(self.index)
+        # Cumulative sums restart wherever the day or the session changes
+        starts = np.flatnonzero(np.r_[True, (days[1:] != days[:-1]) | (sessions[1:] != sessions[:-1])])
+        lengths = np.diff(np.r_[starts, len(days)])
+        cum_pv = np.cumsum(pv)
+        cum_volume = np.cumsum(self.volume)
+        cum_pv -= np.repeat(cum_pv[starts] - pv[starts], lengths)
+        cum_volume -= np.repeat(cum_volume[starts] - self.volume[starts], lengths)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return {"VWAP": np.where(cum_volume > 0, cum_pv / cum_volume, np.nan)}
+
+    def compute(self, spec):
+        name, params = parse_spec(spec)
+        return getattr(self, name)(*params)
+
+
+def compute_indicators(bars, specs):
+    """
+    Compute several indicators in one pass.
+
+    Parameters:
+      bars (DataFrame): Bars with Open/High/Low/Close/Volume columns and a DatetimeIndex.
+      specs (list): Indicator specs, see the module docstring.
+
+    Returns:
+      DataFrame: A new frame with the bars' columns followed by the indicator columns.
+    """
+    result = bars.copy()
+    if bars.empty:
+        for spec in specs:
+            parse_spec(spec)
+        return result
+    indicator_pass = IndicatorPass(bars)
+    for spec in specs:
+        for column, values in indicator_pass.compute(spec).items():
+            result[column] = values
+    return result
+
+
+def get_indicators(ticker, start_date, end_date, interval, specs):
+    """
+    Return the bars of a ticker with the requested indicators, memoized per
+    (ticker, interval, range, specs) and storage version.
+
+    Indicators are computed over the bars of the range only, so the first bars of the
+    range carry the warm-up NaNs. The returned frame is shared and must not be modified
+    in place.
+    """
+    # Imported here because the querier imports the data modules this one is used with
+    from core.data.cache import get_frame_cache
+    from core.data.catalog import get_data_version
+    from core.data.querier import get_bars
+
+    start_day = pd.Timestamp(start_date).strftime('%Y-%m-%d')
+    end_day = pd.Timestamp(end_date).strftime('%Y-%m-%d')
+    specs = tuple(specs)
+    for spec in specs:
+        parse_spec(spec)
+    key = ('indicators', ticker, interval, start_day, end_day, specs)
+    return get_frame_cache().get(key, get_data_version(ticker),
+                                 lambda: compute_indicators(get_bars(ticker, start_day, end_day, interval), specs))
 
 
-def add_technical_indicators(data):
+def add_technical_indicators(data, specs=('sma:5',)):
     """
     Add technical indicators to the data.
 
@@ -13,9 +210,9 @@ def add_technical_indicators(data):
 
     Parameters:
       data (DataFrame): The stock data.
+      specs (iterable): Indicator specs, see the module docstring.
 
     Returns:
-      DataFrame: The data with additional indicator columns.
+      DataFrame: A copy of the data with additional indicator columns.
     """
-    data['SMA_5'] = data['Close'].rolling(window=5).mean()
-    return data
+    return compute_indicators(data, list(specs))
@@ -0,0 +1,363 @@
+"""
+Module to maintain technical indicators incrementally as minute bars arrive.
+
+The indicators listed in indicators.online of config.yaml (sma, ema, rsi, atr and vwap
+specs, see core/analysis/indicators.py) are kept as stateful objects that take one bar at a
+time in O(1). store_stock_data feeds them only the bars it adds, appends their values to the
+IndicatorValue table and saves their state in the ticker's IndicatorCheckpoint, so a
+watchlist refreshed every minute costs work in proportion to the new bars, not to the
+history.
+
+Fetches usually re-send bars of the current day. The checkpoint also keeps the state at
+the start of the day of its last bar and a digest of that day's bars: if the stored bars
+of the day are unchanged, only the bars after the last one are processed, otherwise the
+day is replayed from the saved state. Changes before that day rebuild everything.
+
+The values match compute_indicators over the same bars.
+"""
+import math
+import hashlib
+from abc import ABC, abstractmethod
+from collections import deque
+import numpy as np
+import pandas as pd
+from django.db import transaction
+from core.models import IndicatorCheckpoint, IndicatorValue
+from core.analysis.indicators import parse_spec
+from core.data.sessions import MARKET_TIMEZONE, session_codes, market_time_index
+
+
+class OnlineIndicator(ABC):
+    """
+    Base class of the online indicators. STATE names the attributes saved in checkpoints.
+    """
+    STATE = ()
+
+    @abstractmethod
+    def update(self, high, low, close, volume, session):
+        """
+        Take the next bar and return {column: value}; the value is NaN while warming up.
+        """
+
+    def get_state(self):
+        return {name: list(value) if isinstance(value, deque) else value
+                for name, value in ((name, getattr(self, name)) for name in self.STATE)}
+
+    def set_state(self, state):
+        for name in self.STATE:
+            value = state[name]
+            setattr(self, name, deque(value, maxlen=self.period) if name == 'window' else value)
+
+
+class OnlineSMA(OnlineIndicator):
+    STATE = ('window', 'total')
+
+    def __init__(self, period):
+        self.period = period
+        self.column = f"SMA_{period}"
+        self.window = deque(maxlen=period)
+        # Running sum of the window: the closes leaving it are subtracted
+        self.total = 0.0
+
+    def update(self, high, low, close, volume, session):
+        if len(self.window) == self.period:
+            self.total -= self.window[0]
+        self.window.append(close)
+        self.total += close
+        return {self.column: self.total / self.period if len(self.window) == self.period else math.nan}
+
+
+class OnlineEMA(OnlineIndicator):
+    STATE = ('value', 'count')
+
+    def __init__(self, period):
+        self.period = period
+        self.alpha = 2.0 / (period + 1)
+        self.column = f"EMA_{period}"
+        self.value = None
+        self.count = 0
+
+    def update(self, high, low, close, volume, session):
+        self.value = close if self.value is None else self.value + self.alpha * (close - self.value)
+        self.count += 1
+        return {self.column: self.value if self.count >= self.period else math.nan}
+
+
+class OnlineRSI(OnlineIndicator):
+    STATE = ('prev_close', 'gain', 'loss', 'count')
+
+    def __init__(self, period):
+        self.period = period
+        self.column = f"RSI_{period}"
+        self.prev_close = None
+        self.gain = self.loss = 0.0
+        self.count = 0
+
+    def update(self, high, low, close, volume, session):
+        prev_close, self.prev_close = self.prev_close, close
+        if prev_close is None:
+            return {self.column: math.nan}
+        change = close - prev_close
+        gain, loss = max(change, 0.0), max(-change, 0.0)
+        # Wilder smoothing, seeded with the first change
+        if self.count:
+            gain = self.gain + (gain - self.gain) / self.period
+            loss = self.loss + (loss - self.loss) / self.period
+        self.gain, self.loss = gain, loss
+        self.count += 1
+        if self.count < self.period:
+            return {self.column: math.nan}
+        if loss == 0:
+            return {self.column: 50.0 if gain == 0 else 100.0}
+        return {self.column: 100 - 100 / (1 + gain / loss)}
+
+
+class OnlineATR(OnlineIndicator):
+    STATE = ('prev_close', 'value', 'count')
+
+    def __init__(self, period):
+        self.period = period
+        self.column = f"ATR_{period}"
+        self.prev_close = None
+        self.value = None
+        self.count = 0
+
+    def update(self, high, low, close, volume, session):
+        true_range = high - low
+        if self.prev_close is not None:
+            true_range = max(true_range, abs(high - self.prev_close), abs(low - self.prev_close))
+        self.prev_close = close
+        self.value = true_range if self.value is None else self.value + (true_range - self.value) / self.period
+        self.count += 1
+        return {self.column: self.value if self.count >= self.period else math.nan}
+
+
+class OnlineVWAP(OnlineIndicator):
+    STATE = ('session', 'cum_pv', 'cum_volume')
+
+    def __init__(self):
+        self.column = "VWAP"
+        self.session = None
+        self.cum_pv = self.cum_volume = 0.0
+
+    def update(self, high, low, close, volume, session):
+        # Anchored at the start of every trading day and session
+        if session != self.session:
+            self.session = session
+            self.cum_pv = self.cum_volume = 0.0
+        pv = (high + low + close) / 3 * volume
+        self.cum_pv += 0.0 if math.isnan(pv) else pv
+        self.cum_volume += volume
+        return {self.column: self.cum_pv / self.cum_volume if self.cum_volume > 0 else math.nan}
+
+
+ONLINE_INDICATORS = {
+    'sma': OnlineSMA,
+    'ema': OnlineEMA,
+    'rsi': OnlineRSI,
+    'atr': OnlineATR,
+    'vwap': OnlineVWAP,
+}
+
+
+def create_indicators(specs):
+    """
+    Create the online indicators of a list of specs.
+
+    Raises:
+      Exception: If a spec is invalid or the indicator is not available online.
+    """
+    indicators = []
+    for spec in specs:
+        name, params = parse_spec(spec)
+        if name not in ONLINE_INDICATORS:
+            raise Exception(f"Indicator not available online: {spec}")
+        indicators.append(ONLINE_INDICATORS[name](*params))
+    return indicators
+
+
+def get_state(indicators):
+    return [indicator.get_state() for indicator in indicators]
+
+
+def set_state(indicators, state):
+    for indicator, indicator_state in zip(indicators, state):
+        indicator.set_state(indicator_state)
+
+
+def run_indicators(indicators, data):
+    """
+    Feed minute bars to the indicators, in time order.
+
+    Bars without a close are skipped. The state of the indicators before the first bar of
+    the last day is recorded for the checkpoint.
+
+    Parameters:
+      indicators (list): Online indicators, see create_indicators.
+      data (DataFrame): Bars with High/Low/Close/Volume columns and a DatetimeIndex.
+
+    Returns:
+      tuple: (values, day_state). values is a DataFrame of the indicator columns with a naive
+             market-time index; day_state is None if all bars are on one day.
+    """
+    index = market_time_index(data.index)
+    keep = ~np.isnan(data['Close'].to_numpy(dtype=float))
+    index = index[keep]
+    high = data['High'].to_numpy(dtype=float)[keep].tolist()
+    low = data['Low'].to_numpy(dtype=float)[keep].tolist()
+    close = data['Close'].to_numpy(dtype=float)[keep].tolist()
+    volume = np.nan_to_num(data['Volume'].to_numpy(dtype=float))[keep].tolist()
+    days = index.strftime('%Y-%m-%d').tolist()
+    # One key per trading day and session, a string so that it survives the JSON checkpoint
+    sessions = [f"{day} {code}" for day, code in zip(days, session_codes(index).tolist())]
+
+    rows = []
+    day_state = None
+    current_day = None
+    for i in range(len(index)):
+        if days[i] != current_day:
+            if current_day is not None:
+                day_state = get_state(indicators)
+            current_day = days[i]
+        row = {}
+        for indicator in indicators:
+            row.update(indicator.update(high[i], low[i], close[i], volume[i], sessions[i]))
+        rows.append(row)
+    columns = [indicator.column for indicator in indicators]
+    return pd.DataFrame(rows, index=pd.DatetimeIndex(index, name='Datetime'), columns=columns), day_state
+
+
+def _day_digest(data):
+    # Rounded so that bars read back from CSV files give the same digest
+    values = np.ascontiguousarray(np.round(data[['Open', 'High', 'Low', 'Close', 'Volume']].to_numpy(dtype=float), 6))
+    return hashlib.sha1(values.tobytes()).hexdigest()
+
+
+def _online_specs():
+    # Imported here so the module can be used without configured settings
+    from django.conf import settings
+    return list((settings.CONFIG.get('indicators') or {}).get('online') or [])
+
+
+def _save_values(ticker, values):
+    starts = values.index.tz_localize(MARKET_TIMEZONE)
+    rows = [
+        IndicatorValue(ticker=ticker, start=start.to_pydatetime(), date=ts.date(),
+                       values={column: None if math.isnan(value) else value for column, value in zip(values.columns, row)})
+        for start, ts, row in zip(starts, values.index, values.itertuples(index=False))
+    ]
+    IndicatorValue.objects.bulk_create(rows, batch_size=2000)
+
+
+def _save_checkpoint(ticker, specs, indicators, values, data, day_state):
+    last = values.index[-1]
+    index = market_time_index(data.index)
+    day_bars = data[(index.normalize() == last.normalize()) & (index <= last)]
+    IndicatorCheckpoint.objects.update_or_create(ticker=ticker, defaults={
+        'specs': specs,
+        'last_bar': last.tz_localize(MARKET_TIMEZONE).to_pydatetime(),
+        'state': get_state(indicators),
+        'day': last.date(),
+        'day_state': day_state,
+        'day_digest': _day_digest(day_bars),
+        'latest': {column: None if math.isnan(value) else value for column, value in values.iloc[-1].items()},
+    })
+
+
+def update_online_indicators(ticker, tail, first_day):
+    """
+    Feed the bars merged in by store_stock_data to the online indicators of a ticker.
+
+    Parameters:
+      ticker (str): The stock ticker symbol.
+      tail (DataFrame): All stored bars from first_day on, in time order.
+      first_day (date): The first trading day that changed.
+
+    Returns:
+      bool: False if the indicators have to be rebuilt with rebuild_online_indicators
+            (no checkpoint yet, other specs configured, or bars before the checkpoint's
+            day changed).
+    """
+    specs = _online_specs()
+    if not specs:
+        return True
+    with transaction.atomic():
+        checkpoint = IndicatorCheckpoint.objects.select_for_update().filter(ticker=ticker).first()
+        if checkpoint is None or checkpoint.specs != specs or first_day < checkpoint.day:
+            return False
+        indicators = create_indicators(specs)
+        index = market_time_index(tail.index)
+        last_bar = market_time_index(pd.DatetimeIndex([checkpoint.last_bar]))[0]
+        day_state = checkpoint.day_state
+        replay = first_day == checkpoint.day and _day_digest(tail[index <= last_bar]) != checkpoint.day_digest
+        if replay:
+            # Bars of the checkpoint's day changed: replay the day
+            set_state(indicators, checkpoint.day_state)
+            IndicatorValue.objects.filter(ticker=ticker, date__gte=checkpoint.day).delete()
+            new_bars = tail
+        else:
+            set_state(indicators, checkpoint.state)
+            new_bars = tail[index > last_bar]
+            if new_bars.empty:
+                return True
+            if market_time_index(new_bars.index)[0].date() != checkpoint.day:
+                # The first new bar starts a new day
+                day_state = checkpoint.state
+        values, new_day_state = run_indicators(indicators, new_bars)
+        if values.empty:
+            return True
+        _save_values(ticker, values)
+        _save_checkpoint(ticker, specs, indicators, values, tail, new_day_state or day_state)
+    return True
+
+
+def rebuild_online_indicators(ticker, data):
+    """
+    Replace the online indicator values and checkpoint of a ticker with ones computed over
+    all of its stored bars.
+    """
+    specs = _online_specs()
+    with transaction.atomic():
+        IndicatorValue.objects.filter(ticker=ticker).delete()
+        IndicatorCheckpoint.objects.filter(ticker=ticker).delete()
+        if not specs or data is None or data.empty:
+            return
+        data = data.iloc[np.argsort(market_time_index(data.index), kind='stable')]
+        indicators = create_indicators(specs)
+        values, day_state = run_indicators(indicators, data)
+        if values.empty:
+            return
+        _save_values(ticker, values)
+        _save_checkpoint(ticker, specs, indicators, values, data,
+                         day_state or get_state(create_indicators(specs)))
+
+
+def get_online_indicators(ticker, start_date, end_date):
+    """
+    Return the stored online indicator values of a ticker between two trading days (inclusive).
+
+    Returns:
+      DataFrame: One column per indicator with a naive market-time "Datetime" index.
+    """
+    rows = list(IndicatorValue.objects.filter(ticker=ticker, date__range=[start_date, end_date])
+                .order_by('start').values_list('start', 'values'))
+    index = market_time_index(pd.DatetimeIndex([start for start, _ in rows], tz='UTC') if rows else [])
+    return pd.DataFrame([values for _, values in rows], index=pd.DatetimeIndex(index, name='Datetime'),
+                        dtype=float)
+
+
+def get_latest_indicators(ticker):
+    """
+    Return the online indicator values at the last stored bar of a ticker, e.g. for a
+    watchlist.
+
+    Returns:
+      dict: Datetime (naive market time) and one entry per indicator column, or None if
+            the ticker has no checkpoint.
+    """
+    checkpoint = IndicatorCheckpoint.objects.filter(ticker=ticker).first()
+    if checkpoint is None:
+        return None
+    latest = {'Datetime': market_time_index(pd.DatetimeIndex([checkpoint.last_bar]))[0]}
+    latest.update({column: math.nan if value is None else value for column, value in checkpoint.latest.items()})
+    return latest
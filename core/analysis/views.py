@@ -10,25 +10,49 @@ Actions:
    - Process TickerForm to get the ticker.
    - Fetch stock data using yfinance (1-minute interval for the last 7 days).
    - Store the fetched data locally (CSV or PostgreSQL based on configuration).
-   - Read the local data to extract the available dates.
+   - Read the available dates from the trading-day index.
    - Set the available dates as choices for the start_date and end_date fields of DateRangeForm.
 2. When the "SHOW CANDLESTICK" button is pressed:
    - Process DateRangeForm to get the selected start_date and end_date.
    - Retrieve the ticker from a hidden field.
-   - Load the local data, filter it by the selected date range, and generate a candlestick chart.
-   - Update the available date options and pass the chart image to the template.
+   - Check that stored trading days fall in the range and pass the URL of the chart image
+     to the template. The image is rendered by chart_image_view: 1m charts read the minute
+     bars, coarser intervals the pre-aggregated bar pyramid (see core/data/intervalbars.py).
+   - Update the available date options.
+
+stock_chart_view is the routed chart page of a stored ticker, linked from the dashboard.
 """
 
-import os
+import hashlib
 import pandas as pd
+from urllib.parse import urlencode
+from django.http import HttpResponse
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import condition
 from django.shortcuts import render
+from django.urls import reverse
 from django.contrib import messages
 from core.forms import TickerForm, DateRangeForm
-from core.data.fetcher import fetch_stock_data
-from core.data.storage import store_stock_data
-from core.analysis.chart import generate_candlestick_chart
-from django.conf import settings
+from core.data.fetcher import fetch_and_store
+from core.analysis.chartcache import chart_key, get_chart, chart_max_age
+from core.analysis import columnar
+from core.data.catalog import get_data_version
+from core.data.querier import get_bars
 from core.data.querier import get_local_data
+from core.data.dayindex import list_trading_days
+from core.data.intervalbars import get_interval_bars, source_level
+
+
+def _stored_date_list(ticker):
+    """
+    Return the stored trading days of a ticker as 'YYYY-MM-DD' strings.
+    Tickers without a trading-day index fall back to reading the stored bars.
+    """
+    days = list_trading_days(ticker)
+    if days:
+        return [d.strftime("%Y-%m-%d") for d in days]
+    local_data = get_local_data(ticker)
+    return sorted({d.strftime("%Y-%m-%d") for d in local_data.index})
 
 
 def analysis_index(request):
@@ -44,26 +68,13 @@ def analysis_index(request):
             if ticker_form.is_valid():
                 ticker = ticker_form.cleaned_data["ticker"]
                 try:
-                    # Fetch stock data (1-minute interval, last 7 days)
-                    data = fetch_stock_data(ticker, period="7d", interval="1m")
-                    # Store the fetched data locally (CSV or PostgreSQL as per configuration)
-                    store_stock_data(ticker, data, settings.CONFIG)
+                    # Fetch the 1-minute bars since the last stored one and store them locally
+                    # (concurrent refreshes of the ticker share one fetch)
+                    fetch_and_store(ticker, period="7d", interval="1m")
                     messages.success(request, "Stock data fetched and stored successfully.")
 
-                    # Read local data to extract available dates.
-                    if settings.CONFIG.get("storage_method") == "csv":
-                        csv_path = os.path.join(settings.BASE_DIR, settings.CONFIG.get("csv_data_dir", "csv_data"),
-                                                f"{ticker}.csv")
-                        local_data = pd.read_csv(csv_path, index_col=0, parse_dates=True)
-                    else:
-                        from core.models import StockData
-                        qs = StockData.objects.filter(ticker=ticker).order_by("date")
-                        local_data = pd.DataFrame(list(qs.values("date", "open", "high", "low", "close", "volume")))
-                        local_data["date"] = pd.to_datetime(local_data["date"])
-                        local_data.set_index("date", inplace=True)
-
-                    # Extract unique dates from the local data
-                    date_list = sorted({d.strftime("%Y-%m-%d") for d in local_data.index})
+                    # Available dates from the trading-day index
+                    date_list = _stored_date_list(ticker)
                     context["date_options"] = date_list
                     context["ticker"] = ticker
 
@@ -83,9 +94,8 @@ def analysis_index(request):
             ticker = request.POST.get("ticker_hidden")
             chosen_interval = request.POST.get("interval", "1m")  # Default to "1m" if not provided
 
-            # First, extract the date_list from your local data (after loading local_data)
-            local_data = get_local_data(ticker)
-            date_list = sorted({d.strftime("%Y-%m-%d") for d in local_data.index})
+            # First, extract the date_list from the trading-day index
+            date_list = _stored_date_list(ticker)
             # Create choices as a list of tuples
             date_choices = [(d, d) for d in date_list]  # date_list extracted from local data
             # Instantiate DateRangeForm with the dynamic choices
@@ -98,61 +108,13 @@ def analysis_index(request):
                     messages.error(request, "Ticker not provided.")
                 else:
                     try:
-                        if settings.CONFIG.get("storage_method") == "csv":
-                            csv_path = os.path.join(settings.BASE_DIR, settings.CONFIG.get("csv_data_dir", "csv_data"),
-                                                    f"{ticker}.csv")
-                            local_data = pd.read_csv(csv_path, index_col=0, parse_dates=True)
-                        else:
-                            from core.models import StockData
-                            qs = StockData.objects.filter(ticker=ticker).order_by("date")
-                            local_data = pd.DataFrame(list(qs.values("date", "open", "high", "low", "close", "volume")))
-                            local_data["date"] = pd.to_datetime(local_data["date"])
-                            local_data.set_index("date", inplace=True)
-
-                        # Ensure the index is datetime
-                        local_data.index = pd.to_datetime(local_data.index)
-                        # Filter local data by the selected date range.
-                        mask = (local_data.index.date >= pd.to_datetime(start_date).date()) & (
-                                    local_data.index.date <= pd.to_datetime(end_date).date())
-                        filtered = local_data.loc[mask]
-                        if filtered.empty:
+                        chart, price_list = _chart_context(ticker, date_list, start_date, end_date, chosen_interval)
+                        if chart is None:
                             messages.error(request, "No data available for the selected date range.")
                         else:
-                            # If the chosen interval is not 1m, resample the filtered data accordingly.
-                            if chosen_interval != "1m":
-                                resample_map = {
-                                    "5m": "5T",
-                                    "15m": "15T",
-                                    "30m": "30T",
-                                    "1h": "1H",
-                                    "1d": "1D"
-                                }
-                                if chosen_interval in resample_map:
-                                    filtered = filtered.resample(resample_map[chosen_interval]).agg({
-                                        "Open": "first",
-                                        "High": "max",
-                                        "Low": "min",
-                                        "Close": "last",
-                                        "Volume": "sum"
-                                    }).dropna()
-                            # Generate the candlestick chart image (base64 encoded).
-                            img = generate_candlestick_chart(filtered, ticker)
-                            context["chart"] = img
-                            # Build a price list: each entry contains date, open, high, low, close.
-                            price_list = []
-                            # only when interval is 1d shows detail price list
-                            if chosen_interval == "1d":
-                                for dt, row in filtered.iterrows():
-                                    price_list.append({
-                                        "date": dt.strftime("%Y-%m-%d"),
-                                        "open": round(row["Open"],2),
-                                        "high": round(row["High"],2),
-                                        "low": round(row["Low"],2),
-                                        "close": round(row["Close"],2),
-                                    })
+                            context["chart_url"] = chart
                             context["price_list"] = price_list
                         # Update available dates.
-                        date_list = sorted({d.strftime("%Y-%m-%d") for d in local_data.index})
                         context["date_options"] = date_list
                         context["ticker"] = ticker
                         # Update the DateRangeForm choices.
@@ -172,3 +134,184 @@ def analysis_index(request):
         context["date_range_form"] = date_range_form
 
     return render(request, "core/index.html", context)
+
+
+def _chart_context(ticker, date_list, start_date, end_date, interval):
+    """
+    Return (chart_url, price_list) of the chart of a ticker between two dates.
+
+    Whether the range has data is checked on the stored trading days, so no bars are
+    loaded here: chart_image_view renders the chart, and only the 1d price list reads
+    the (pre-aggregated) daily bars.
+
+    Returns:
+      tuple: (None, []) if no stored trading day is in the range.
+    """
+    if not any(start_date <= d <= end_date for d in date_list):
+        return None, []
+    # Build a price list: each entry contains date, open, high, low, close.
+    price_list = []
+    # only when interval is 1d shows detail price list
+    if interval == "1d":
+        daily = get_interval_bars(ticker, pd.to_datetime(start_date).date(), pd.to_datetime(end_date).date(), "1d")
+        for dt, row in daily.iterrows():
+            price_list.append({
+                "date": dt.strftime("%Y-%m-%d"),
+                "open": round(row["Open"], 2),
+                "high": round(row["High"], 2),
+                "low": round(row["Low"], 2),
+                "close": round(row["Close"], 2),
+            })
+    return chart_url(ticker, start_date, end_date, interval), price_list
+
+
+def stock_chart_view(request, ticker):
+    """
+    Candlestick chart page of a stored ticker.
+
+    Query parameters: start_date, end_date and interval, as chosen in the page's form
+    (default: the last 5 stored trading days at 5m). The chart image itself is served by
+    chart_image_view.
+    """
+    try:
+        date_list = _stored_date_list(ticker)
+    except Exception:
+        date_list = []
+    date_choices = [(d, d) for d in date_list]
+    context = {"ticker": ticker}
+    if "start_date" in request.GET:
+        form = DateRangeForm(request.GET, date_choices=date_choices)
+    elif date_list:
+        form = DateRangeForm({"start_date": date_list[-5:][0], "end_date": date_list[-1], "interval": "5m"},
+                             date_choices=date_choices)
+    else:
+        form = DateRangeForm(date_choices=date_choices)
+        messages.error(request, f"No stored data for {ticker}.")
+
+    if form.is_bound and form.is_valid():
+        start_date = form.cleaned_data["start_date"]
+        end_date = form.cleaned_data["end_date"]
+        chart, price_list = _chart_context(ticker, date_list, start_date, end_date, form.cleaned_data["interval"])
+        if chart is None:
+            messages.error(request, "No data available for the selected date range.")
+        context["chart_url"] = chart
+        context["price_list"] = price_list
+    elif form.is_bound:
+        messages.error(request, "Invalid date range input.")
+    context["date_range_form"] = form
+    return render(request, "core/stock_chart.html", context)
+
+
+def chart_url(ticker, start_date, end_date, interval):
+    """
+    Return the URL of the candlestick chart image of a ticker.
+    """
+    query = urlencode({"start_date": start_date, "end_date": end_date, "interval": interval})
+    return f"{reverse('chart_image', args=[ticker])}?{query}"
+
+
+def chart_image_view(request, ticker):
+    """
+    Serve the candlestick chart of a ticker as PNG.
+
+    Query parameters: start_date, end_date (YYYY-MM-DD) and interval (default "1m").
+    Charts are cached on disk per data version (see core/analysis/chartcache.py); the cache
+    key is the ETag, so unchanged charts are answered with 304.
+    """
+    start_date = request.GET.get("start_date")
+    end_date = request.GET.get("end_date")
+    interval = request.GET.get("interval", "1m")
+    try:
+        start_date = pd.Timestamp(start_date).strftime("%Y-%m-%d")
+        end_date = pd.Timestamp(end_date).strftime("%Y-%m-%d")
+        if interval != "1m":
+            source_level(interval)
+    except Exception as e:
+        return HttpResponse(f"Invalid chart parameters: {e}", status=400, content_type="text/plain")
+
+    # The key only depends on the data version: answer revalidations before any lookup or render
+    etag = f'"{chart_key(ticker, start_date, end_date, interval, get_data_version(ticker))}"'
+    if request.headers.get("If-None-Match") == etag:
+        return _chart_response(b"", etag, status=304)
+
+    png = None
+    for _ in range(2):
+        path, key = get_chart(ticker, start_date, end_date, interval)
+        if key is None:
+            return HttpResponse("No data available for the selected date range.", status=404,
+                                content_type="text/plain")
+        if path is None:
+            break
+        etag = f'"{key}"'
+        try:
+            with open(path, "rb") as f:
+                png = f.read()
+            break
+        except FileNotFoundError:
+            # Evicted between the lookup and the read, render it again
+            continue
+    if png is None:
+        return HttpResponse("Chart could not be rendered.", status=503, content_type="text/plain")
+    return _chart_response(png, etag)
+
+
+def _chart_response(png, etag, status=200):
+    response = HttpResponse(png, content_type="image/png", status=status)
+    response["ETag"] = etag
+    response["Cache-Control"] = f"private, max-age={chart_max_age()}"
+    return response
+
+
+def _bars_params(request):
+    """
+    Return (start_date, end_date, interval, format) of a bars API request.
+
+    Raises:
+      Exception: If a parameter is missing or invalid.
+    """
+    start_date = pd.Timestamp(request.GET["start_date"]).strftime("%Y-%m-%d")
+    end_date = pd.Timestamp(request.GET.get("end_date", start_date)).strftime("%Y-%m-%d")
+    interval = request.GET.get("interval", "1m")
+    if interval != "1m":
+        source_level(interval)
+    output_format = request.GET.get("format", "json")
+    if output_format not in ("json", "arrow"):
+        raise Exception(f"Unsupported format: {output_format}")
+    return start_date, end_date, interval, output_format
+
+
+def _bars_etag(request, ticker):
+    try:
+        params = _bars_params(request)
+    except Exception:
+        return None
+    raw = "|".join([ticker, *params, str(get_data_version(ticker))])
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+@gzip_page
+@condition(etag_func=_bars_etag)
+def bars_api_view(request, ticker):
+    """
+    Return the bars of a ticker as columns (see core/analysis/columnar.py) for client-side charts.
+
+    Query parameters: start_date, end_date (YYYY-MM-DD, end_date defaults to start_date),
+    interval (default "1m") and format ("json" or "arrow"). The ETag depends on the
+    parameters and the stored data version, so unchanged data is answered with 304;
+    responses are gzip-compressed when the client accepts it.
+    """
+    try:
+        start_date, end_date, interval, output_format = _bars_params(request)
+    except Exception as e:
+        return HttpResponse(f"Invalid bars parameters: {e}", status=400, content_type="text/plain")
+
+    columns = columnar.bars_to_columns(get_bars(ticker, start_date, end_date, interval))
+    if output_format == "arrow":
+        response = HttpResponse(columnar.encode_arrow(ticker, interval, columns),
+                                content_type=columnar.ARROW_CONTENT_TYPE)
+    else:
+        response = HttpResponse(columnar.encode_json(ticker, interval, columns),
+                                content_type=columnar.JSON_CONTENT_TYPE)
+    # Always revalidate, the ETag makes that a cheap 304
+    response["Cache-Control"] = "private, no-cache"
+    return response
@@ -0,0 +1,119 @@
+"""
+Module to backfill minute bars over ranges longer than one provider request.
+
+Providers serve 1-minute bars in windows of a few days only (Yahoo Finance: at most 7 days
+per request), so a single period fetch cannot reach further back. backfill splits the
+requested trading days into windows of fetcher.backfill_window_days, fetches the windows
+concurrently in a bounded thread pool through fetch_stock_data (so they share the rate
+limiter and the retries), stitches them into one frame and stores it with one
+store_stock_data call, which takes the bulk path of the configured storage method.
+"""
+import time
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from core.data.fetcher import DEFAULT_MAX_WORKERS, fetch_stock_data, get_rate_limiter
+from core.data.providers import get_provider
+from core.data.sessions import MARKET_TIMEZONE
+from core.data.storage import store_stock_data
+
+# Default for fetcher.backfill_window_days in config.yaml
+DEFAULT_WINDOW_DAYS = 7
+
+
+def backfill_windows(start, end, window_days=DEFAULT_WINDOW_DAYS):
+    """
+    Split the days from start to end (inclusive) into fetch windows.
+
+    Returns:
+      list: (window_start, window_end) pairs of tz-aware market-time midnights; window_end
+            is exclusive and is the start of the next window.
+    """
+    if window_days < 1:
+        raise Exception(f"Invalid backfill window: {window_days} days")
+    first = pd.Timestamp(start).normalize()
+    stop = pd.Timestamp(end).normalize() + pd.Timedelta(days=1)
+    if stop <= first:
+        return []
+    # Calendar days are counted on the naive wall clock, so windows start at midnight across DST changes
+    edges = list(pd.date_range(first, stop, freq=f"{window_days}D"))
+    if edges[-1] != stop:
+        edges.append(stop)
+    edges = [edge.tz_localize(MARKET_TIMEZONE) for edge in edges]
+    return list(zip(edges[:-1], edges[1:]))
+
+
+def stitch_windows(frames):
+    """
+    Concatenate the bars of consecutive windows in time order.
+
+    Bars returned by two windows (providers may include the bar at a window edge in both)
+    are kept once, from the later window.
+    """
+    frames = [frame for frame in frames if not frame.empty]
+    if not frames:
+        return pd.DataFrame(columns=['Open', 'High', 'Low', 'Close', 'Volume'], dtype=float,
+                            index=pd.DatetimeIndex([], tz=MARKET_TIMEZONE, name='Datetime'))
+    data = pd.concat(frames)
+    return data[~data.index.duplicated(keep='last')].sort_index()
+
+
+def backfill(ticker, start, end, interval="1m", window_days=None, max_workers=None, retries=3, delay=5,
+             provider=None, rate_limiter=None):
+    """
+    Fetch the bars of a ticker between two days in concurrent windows and store them.
+
+    Parameters:
+      ticker (str): The stock ticker symbol.
+      start, end (date): The days to backfill (inclusive).
+      interval (str): The data interval (default "1m").
+      window_days (int, optional): Days per request (default: fetcher.backfill_window_days).
+      max_workers (int, optional): Windows fetched at the same time (default: fetcher.max_workers).
+      retries, delay: As for fetch_stock_data, per window.
+      provider (optional): The data provider (default: the one configured in config.yaml).
+      rate_limiter (TokenBucket, optional): The rate limiter (default: the shared one).
+
+    Returns:
+      dict: bars (number of stitched bars stored), windows (number of windows), errors
+            (error message by failed window "first day - last day"), fetch_seconds,
+            store_seconds and bars_per_second (over both).
+    """
+    fetcher_config = settings.CONFIG.get('fetcher') or {}
+    window_days = window_days or fetcher_config.get('backfill_window_days', DEFAULT_WINDOW_DAYS)
+    max_workers = max_workers or fetcher_config.get('max_workers', DEFAULT_MAX_WORKERS)
+    provider = provider or get_provider(settings.CONFIG)
+    rate_limiter = rate_limiter or get_rate_limiter()
+    windows = backfill_windows(start, end, window_days)
+
+    started = time.perf_counter()
+    frames = []
+    errors = {}
+    if windows:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(windows))) as executor:
+            futures = [
+                (executor.submit(fetch_stock_data, ticker, interval=interval, retries=retries, delay=delay,
+                                 provider=provider, rate_limiter=rate_limiter,
+                                 start=window_start.to_pydatetime(), end=window_end.to_pydatetime()),
+                 window_start, window_end)
+                for window_start, window_end in windows
+            ]
+            for future, window_start, window_end in futures:
+                try:
+                    frames.append(future.result())
+                except Exception as e:
+                    last_day = window_end - pd.Timedelta(days=1)
+                    errors[f"{window_start.date()} - {last_day.date()}"] = str(e)
+    data = stitch_windows(frames)
+    fetched = time.perf_counter()
+
+    if not data.empty:
+        store_stock_data(ticker, data, settings.CONFIG)
+    stored = time.perf_counter()
+    return {
+        'bars': len(data),
+        'windows': len(windows),
+        'errors': errors,
+        'fetch_seconds': fetched - started,
+        'store_seconds': stored - fetched,
+        'bars_per_second': len(data) / (stored - started) if stored > started else 0.0,
+    }
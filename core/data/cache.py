@@ -0,0 +1,136 @@
+"""
+Module for a process-wide cache of parsed local market data.
+
+Parsing a ticker's CSV file is by far the most expensive part of a query, and the
+backtest views ask for the same ticker many times per request. The cache keeps the
+parsed DataFrame of each ticker together with the storage version it was read from
+(file mtime and size for CSV, row count and last timestamp for PostgreSQL).
+A lookup whose version no longer matches is treated as a miss, so changes made by
+other processes are picked up automatically.
+
+Entries are evicted in least-recently-used order once the configured memory budget
+(cache.max_memory_mb in config.yaml) is exceeded.
+"""
+import threading
+from collections import OrderedDict
+from django.conf import settings
+
+DEFAULT_MAX_MEMORY_MB = 256
+
+
+class FrameCache:
+    """
+    LRU cache of DataFrames keyed by ticker and storage version, bounded by memory use.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (version, frame, nbytes)
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, version, loader):
+        """
+        Return the cached frame for key if it was loaded from the same version.
+
+        Otherwise call loader() to read the frame, cache it and return it.
+        The returned frame is shared between callers and must not be modified in place.
+
+        Parameters:
+          key (hashable): The cache key, usually (storage_method, ticker).
+          version (hashable): The storage version of the data behind key.
+          loader (callable): Function returning the DataFrame for key.
+
+        Returns:
+          DataFrame: The frame returned by loader (possibly from an earlier call).
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        # Read outside the lock so a slow parse does not block lookups of other tickers
+        frame = loader()
+        if frame is None:
+            return None
+        nbytes = int(frame.memory_usage(index=True, deep=True).sum())
+
+        with self._lock:
+            self._discard(key)
+            if nbytes <= self.max_bytes:
+                self._entries[key] = (version, frame, nbytes)
+                self.current_bytes += nbytes
+                while self.current_bytes > self.max_bytes:
+                    _, (_, _, evicted_bytes) = self._entries.popitem(last=False)
+                    self.current_bytes -= evicted_bytes
+                    self.evictions += 1
+        return frame
+
+    def invalidate(self, ticker=None):
+        """
+        Drop the cached frames of a ticker (any storage method), or all frames if ticker is None.
+        """
+        with self._lock:
+            for key in list(self._entries):
+                if ticker is None or key[1] == ticker:
+                    self._discard(key)
+
+    def stats(self):
+        """
+        Return the hit/miss/eviction counters and the current memory use.
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'current_bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+            }
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.current_bytes -= entry[2]
+
+
+_frame_cache = None
+_frame_cache_lock = threading.Lock()
+
+
+def get_frame_cache():
+    """
+    Return the process-wide FrameCache, creating it from config.yaml on first use.
+    """
+    global _frame_cache
+    if _frame_cache is None:
+        with _frame_cache_lock:
+            if _frame_cache is None:
+                cache_config = settings.CONFIG.get('cache') or {}
+                max_mb = cache_config.get('max_memory_mb', DEFAULT_MAX_MEMORY_MB)
+                if not cache_config.get('enabled', True):
+                    max_mb = 0
+                _frame_cache = FrameCache(int(max_mb * 1024 * 1024))
+    return _frame_cache
+
+
+def invalidate_ticker(ticker):
+    """
+    Drop cached data for a ticker after its storage has been written.
+    """
+    if _frame_cache is not None:
+        _frame_cache.invalidate(ticker)
+
+
+def get_cache_stats():
+    """
+    Return the counters of the process-wide cache.
+    """
+    return get_frame_cache().stats()
@@ -0,0 +1,160 @@
+"""
+Module to maintain the stock catalog.
+
+The catalog keeps one StockCatalog row per ticker with the first/last stored bar,
+the number of rows and trading days, and the time of the last refresh.
+store_stock_data updates it incrementally with the rows it actually added,
+so listing the stored stocks is a single small query whatever the data size.
+"""
+import os
+import pandas as pd
+from django.conf import settings
+from django.db import transaction
+from core.models import StockCatalog
+from core.data.sessions import MARKET_TIMEZONE, market_time_index
+
+# Files in the CSV directory that hold other data than minute bars
+CSV_SIDECAR_SUFFIXES = ('_info.csv', '_recommend.csv')
+
+
+def to_market_time(ts):
+    """
+    Return ts as a tz-aware timestamp in market time.
+    Naive timestamps are taken to be market time already.
+    """
+    ts = pd.Timestamp(ts)
+    if ts.tzinfo is None:
+        return ts.tz_localize(MARKET_TIMEZONE)
+    return ts.tz_convert(MARKET_TIMEZONE)
+
+
+def update_stock_catalog(ticker, added_index, added_days):
+    """
+    Update the catalog entry of a ticker after new bars have been stored.
+
+    Parameters:
+      ticker (str): The stock ticker symbol.
+      added_index (DatetimeIndex): Timestamps of the rows that were added.
+      added_days (int): The number of trading days that had no stored rows before.
+
+    Returns:
+      bool: False if the ticker has no catalog entry yet, in which case it has to be
+            built from all stored bars with catalog_entry_from_frame.
+    """
+    with transaction.atomic():
+        entry = StockCatalog.objects.select_for_update().filter(ticker=ticker).first()
+        if entry is None:
+            return False
+        if len(added_index) == 0:
+            # Nothing new, but the refresh time still moves forward
+            entry.save(update_fields=['last_refreshed'])
+            return True
+
+        entry.first_timestamp = min(entry.first_timestamp, to_market_time(added_index.min()).to_pydatetime())
+        entry.last_timestamp = max(entry.last_timestamp, to_market_time(added_index.max()).to_pydatetime())
+        entry.row_count += len(added_index)
+        entry.trading_day_count += added_days
+        entry.save()
+    return True
+
+
+def refreshed_since(ticker, since):
+    """
+    Return whether the bars of a ticker have been stored at or after the given time.
+    """
+    return StockCatalog.objects.filter(ticker=ticker, last_refreshed__gte=since).exists()
+
+
+def get_watermark(ticker):
+    """
+    Return the timestamp of the last stored bar of a ticker (tz-aware), or None if the
+    ticker is not in the catalog. Incremental fetches start from this high-water mark.
+    """
+    return StockCatalog.objects.filter(ticker=ticker).values_list('last_timestamp', flat=True).first()
+
+
+def get_data_version(ticker):
+    """
+    Return a version string of a ticker's stored bars (row count, last bar and last refresh),
+    or None if the ticker is not in the catalog. It changes whenever bars are stored.
+    """
+    entry = StockCatalog.objects.filter(ticker=ticker).values_list(
+        'row_count', 'last_timestamp', 'last_refreshed').first()
+    if entry is None:
+        return None
+    row_count, last_timestamp, last_refreshed = entry
+    return f"{row_count}:{last_timestamp.isoformat()}:{last_refreshed.isoformat()}"
+
+
+def catalog_entry_from_frame(ticker, data):
+    """
+    Build (or replace) the catalog entry of a ticker from all of its stored bars.
+    """
+    if data is None or data.empty:
+        StockCatalog.objects.filter(ticker=ticker).delete()
+        return
+    index = market_time_index(data.index)
+    StockCatalog.objects.update_or_create(
+        ticker=ticker,
+        defaults={
+            'first_timestamp': to_market_time(index.min()).to_pydatetime(),
+            'last_timestamp': to_market_time(index.max()).to_pydatetime(),
+            'row_count': len(index),
+            'trading_day_count': index.normalize().nunique(),
+        }
+    )
+
+
+def rebuild_stock_catalog():
+    """
+    Rebuild the catalog, the trading-day index, the session bars, the bar pyramid and the online indicators by scanning the configured storage.
+
+    This reads every stored bar once. It is used to create the catalog for data
+    stored before the catalog existed, and by the rebuild_catalog management command.
+
+    Returns:
+      int: The number of tickers in the catalog.
+    """
+    # Imported here because the querier reads the catalog
+    from core.data.querier import _csv_path, _load_csv_frame, _load_postgres_frame, _parquet_dir, _mmap_dir
+    from core.data.parquet_store import read_parquet_frame
+    from core.data.mmap_store import list_mmap_tickers, read_mmap_frame
+
+    storage_method = settings.CONFIG.get('storage_method', 'csv')
+    if storage_method == 'csv':
+        csv_dir = os.path.dirname(_csv_path(''))
+        filenames = os.listdir(csv_dir) if os.path.exists(csv_dir) else []
+        tickers = [f[:-4] for f in filenames if f.endswith('.csv') and not f.endswith(CSV_SIDECAR_SUFFIXES)]
+        load = _load_csv_frame
+    elif storage_method == 'parquet':
+        parquet_dir = _parquet_dir()
+        # One partition directory per ticker (the directory also holds the tickers' lock files)
+        tickers = [name for name in os.listdir(parquet_dir) if os.path.isdir(os.path.join(parquet_dir, name))] \
+            if os.path.exists(parquet_dir) else []
+        load = lambda ticker: read_parquet_frame(ticker, parquet_dir)
+    elif storage_method == 'mmap':
+        mmap_dir = _mmap_dir()
+        tickers = list_mmap_tickers(mmap_dir)
+        load = lambda ticker: read_mmap_frame(ticker, mmap_dir)
+    elif storage_method == 'postgres':
+        from core.models import StockData
+        tickers = list(StockData.objects.order_by().values_list('ticker', flat=True).distinct())
+        load = _load_postgres_frame
+    else:
+        raise Exception("Invalid storage_method in config.")
+
+    from core.data.dayindex import rebuild_day_index
+    from core.data.dailybars import rebuild_session_bars
+    from core.data.intervalbars import rebuild_interval_bars
+    from core.analysis.online import rebuild_online_indicators
+    for ticker in tickers:
+        try:
+            data = load(ticker)
+            catalog_entry_from_frame(ticker, data)
+            rebuild_day_index(ticker, data)
+            rebuild_session_bars(ticker, data)
+            rebuild_interval_bars(ticker, data)
+            rebuild_online_indicators(ticker, data)
+        except Exception as e:
+            print(f"Error adding {ticker} to the catalog: {e}")
+    return StockCatalog.objects.count()
@@ -0,0 +1,138 @@
+"""
+Module to maintain the per-session daily bars.
+
+For every stored trading day and market session the DailySessionBar table holds the
+session's open, high, low, close, volume, VWAP and number of minute bars. store_stock_data
+recomputes only the days it merges bars into, so daily queries read a few small rows
+instead of resampling the minute history on every call.
+"""
+import numpy as np
+import pandas as pd
+from django.db import transaction
+from core.models import DailySessionBar
+from core.data.sessions import MARKET_SESSIONS, SESSION_CODES, session_codes, market_time_index
+
+
+def build_session_bars(data):
+    """
+    Aggregate minute bars into one bar per trading day and market session.
+
+    Parameters:
+      data (DataFrame): Minute bars in timestamp order with Open/High/Low/Close/Volume columns.
+
+    Returns:
+      DataFrame: Columns date, market, open, high, low, close, volume, vwap, bar_count,
+                 sorted by date and session.
+    """
+    columns = ['date', 'market', 'open', 'high', 'low', 'close', 'volume', 'vwap', 'bar_count']
+    if data is None or data.empty:
+        return pd.DataFrame(columns=columns)
+    index = market_time_index(data.index)
+    volume = data['Volume'].to_numpy(dtype=float)
+    typical = (data['High'].to_numpy(dtype=float) + data['Low'].to_numpy(dtype=float)
+               + data['Close'].to_numpy(dtype=float)) / 3
+    frame = pd.DataFrame({
+        'date': index.normalize(),
+        'session': session_codes(index),
+        'open': data['Open'].to_numpy(dtype=float),
+        'high': data['High'].to_numpy(dtype=float),
+        'low': data['Low'].to_numpy(dtype=float),
+        'close': data['Close'].to_numpy(dtype=float),
+        'volume': volume,
+        'pv': typical * volume,
+    })
+    bars = frame.groupby(['date', 'session'], sort=True).agg(
+        open=('open', 'first'), high=('high', 'max'), low=('low', 'min'), close=('close', 'last'),
+        volume=('volume', 'sum'), pv=('pv', 'sum'), bar_count=('open', 'size'),
+    ).reset_index()
+    # Sessions without volume have no VWAP
+    bars['vwap'] = bars['pv'] / bars['volume'].where(bars['volume'] > 0)
+    bars['market'] = np.asarray(MARKET_SESSIONS)[bars['session'].to_numpy()]
+    bars['date'] = pd.DatetimeIndex(bars['date']).date
+    return bars[columns]
+
+
+def _save_bars(ticker, bars):
+    DailySessionBar.objects.bulk_create([
+        DailySessionBar(
+            ticker=ticker, date=row.date, market=row.market,
+            open=float(row.open), high=float(row.high), low=float(row.low), close=float(row.close),
+            volume=int(row.volume), vwap=None if pd.isna(row.vwap) else float(row.vwap),
+            bar_count=int(row.bar_count),
+        )
+        for row in bars.itertuples(index=False)
+    ])
+
+
+def update_session_bars(ticker, tail, first_day):
+    """
+    Recompute the session bars of a ticker from first_day on after bars were merged in.
+
+    Parameters:
+      ticker (str): The stock ticker symbol.
+      tail (DataFrame): All stored bars from first_day on.
+      first_day (date): The first trading day that changed.
+
+    Returns:
+      bool: False if the ticker has no session bars yet, in which case they have to be
+            rebuilt with rebuild_session_bars.
+    """
+    with transaction.atomic():
+        if not DailySessionBar.objects.filter(ticker=ticker).exists():
+            return False
+        DailySessionBar.objects.filter(ticker=ticker, date__gte=first_day).delete()
+        _save_bars(ticker, build_session_bars(tail))
+    return True
+
+
+def rebuild_session_bars(ticker, data):
+    """
+    Replace the session bars of a ticker with ones built from all of its stored bars.
+    """
+    with transaction.atomic():
+        DailySessionBar.objects.filter(ticker=ticker).delete()
+        _save_bars(ticker, build_session_bars(data))
+
+
+def get_session_bars(ticker, start_date, end_date):
+    """
+    Return the session bars of a ticker between two trading days (inclusive), grouped by day.
+
+    Tickers stored before the session bars existed get them built from storage on first use.
+
+    Parameters:
+      ticker (str): The stock ticker symbol.
+      start_date (date): The first trading day.
+      end_date (date): The last trading day.
+
+    Returns:
+      list: One dictionary per trading day, {'date': 'YYYY-MM-DD', 'markets': {session: {'Open',
+            'Close', 'High', 'Low', 'Volume', 'VWAP', 'Bars'}}}, in date order.
+    """
+    qs = DailySessionBar.objects.filter(ticker=ticker)
+    if not qs.exists():
+        # Imported here because the storage module imports this one
+        from django.conf import settings
+        from core.data.storage import read_stored_frame
+        data = read_stored_frame(ticker, settings.CONFIG)
+        if data is None or data.empty:
+            return []
+        rebuild_session_bars(ticker, data)
+
+    rows = qs.filter(date__range=[start_date, end_date]).values_list(
+        'date', 'market', 'open', 'close', 'high', 'low', 'volume', 'vwap', 'bar_count')
+    rows = sorted(rows, key=lambda row: (row[0], SESSION_CODES.get(row[1], 0)))
+    days = []
+    for day, market, o, c, h, l, volume, vwap, bar_count in rows:
+        if not days or days[-1]['date'] != day.strftime('%Y-%m-%d'):
+            days.append({'date': day.strftime('%Y-%m-%d'), 'markets': {}})
+        days[-1]['markets'][market] = {
+            'Open': round(o, 2),
+            'Close': round(c, 2),
+            'High': round(h, 2),
+            'Low': round(l, 2),
+            'Volume': volume,
+            'VWAP': None if vwap is None else round(vwap, 2),
+            'Bars': bar_count,
+        }
+    return days
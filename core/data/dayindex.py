@@ -0,0 +1,180 @@
+"""
+Module to maintain the per-ticker trading-day index.
+
+For every stored trading day the TradingDay table records the position of the day's
+first and last bar in the ticker's stored order, the close of its 16:00 bar and the
+previous trading day with its 16:00 close. store_stock_data re-indexes only the days
+it merges bars into, so "the bars of this day" becomes a slice and "the previous close"
+a single lookup, independent of how much history is stored.
+"""
+import numpy as np
+import pandas as pd
+from django.db import transaction
+from core.models import TradingDay
+from core.data.sessions import market_time_index
+
+# Time of the bar whose close is used as the day's close
+CLOSE_BAR_HOUR = 16
+
+
+def build_day_index(data, row_offset=0, prev_date=None, prev_close=None):
+    """
+    Build day index entries from stored bars.
+
+    The bars of each day must be contiguous. Row positions are taken in the order of
+    data (i.e. the stored order) and shifted by row_offset; the previous-day links
+    follow calendar order.
+
+    Parameters:
+      data (DataFrame): Bars with a DatetimeIndex and a Close column.
+      row_offset (int): Stored position of the first row of data.
+      prev_date (date, optional): The stored day before the first day of data.
+      prev_close (float, optional): The 16:00 close of prev_date.
+
+    Returns:
+      DataFrame: Columns date, first_row, last_row, close, prev_date, prev_close.
+    """
+    index = market_time_index(data.index)
+    days = index.normalize().to_numpy()
+    if len(days) == 0:
+        return pd.DataFrame(columns=['date', 'first_row', 'last_row', 'close', 'prev_date', 'prev_close'])
+
+    # A new day starts wherever the date changes
+    starts = np.flatnonzero(np.r_[True, days[1:] != days[:-1]])
+    ends = np.r_[starts[1:] - 1, len(days) - 1]
+
+    # Close of the 16:00 bar of each day (NaN if the bar is missing)
+    closes = np.full(len(starts), np.nan)
+    close_rows = np.flatnonzero((index.hour == CLOSE_BAR_HOUR) & (index.minute == 0) & (index.second == 0))
+    if len(close_rows):
+        closes[np.searchsorted(starts, close_rows, side='right') - 1] = data['Close'].to_numpy(dtype=float)[close_rows]
+
+    entries = pd.DataFrame({
+        'date': pd.DatetimeIndex(days[starts]).date,
+        'first_row': starts + row_offset,
+        'last_row': ends + row_offset,
+        'close': closes,
+    }).sort_values('date', kind='stable').reset_index(drop=True)
+    entries['prev_date'] = entries['date'].shift(1)
+    entries['prev_close'] = entries['close'].shift(1)
+    entries.loc[0, 'prev_date'] = prev_date
+    entries.loc[0, 'prev_close'] = prev_close
+    return entries
+
+
+def _save_entries(ticker, entries):
+    TradingDay.objects.bulk_create([
+        TradingDay(
+            ticker=ticker,
+            date=row.date,
+            first_row=int(row.first_row),
+            last_row=int(row.last_row),
+            close=None if pd.isna(row.close) else float(row.close),
+            prev_date=None if pd.isna(row.prev_date) else row.prev_date,
+            prev_close=None if pd.isna(row.prev_close) else float(row.prev_close),
+        )
+        for row in entries.itertuples(index=False)
+    ])
+
+
+def update_day_index(ticker, tail, first_day):
+    """
+    Re-index the stored days of a ticker from first_day on after bars were merged in.
+
+    The stored bars must be in timestamp order, so the rows before first_day keep their
+    positions and only the entries from first_day on are replaced.
+
+    Parameters:
+      ticker (str): The stock ticker symbol.
+      tail (DataFrame): All stored bars from first_day on, in stored order.
+      first_day (date): The first trading day that changed.
+
+    Returns:
+      bool: False if the ticker has no index yet, in which case the index has to be
+            rebuilt with rebuild_day_index.
+    """
+    with transaction.atomic():
+        if not TradingDay.objects.filter(ticker=ticker).exists():
+            return False
+        prev = TradingDay.objects.filter(ticker=ticker, date__lt=first_day).order_by('-date').first()
+        TradingDay.objects.filter(ticker=ticker, date__gte=first_day).delete()
+        if tail is not None and not tail.empty:
+            if prev is None:
+                _save_entries(ticker, build_day_index(tail))
+            else:
+                _save_entries(ticker, build_day_index(tail, prev.last_row + 1, prev.date, prev.close))
+    return True
+
+
+def rebuild_day_index(ticker, data):
+    """
+    Replace the day index of a ticker with one built from all of its stored bars.
+
+    Parameters:
+      ticker (str): The stock ticker symbol.
+      data (DataFrame): All stored bars of the ticker, in stored order.
+    """
+    with transaction.atomic():
+        TradingDay.objects.filter(ticker=ticker).delete()
+        if data is not None and not data.empty:
+            _save_entries(ticker, build_day_index(data))
+
+
+def slice_trading_day(ticker, data, day):
+    """
+    Return the bars of one trading day from the full stored frame of a ticker.
+
+    The indexed row positions are checked against the frame's timestamps, so a stale
+    or missing index falls back to filtering by date instead of returning wrong rows.
+
+    Parameters:
+      ticker (str): The stock ticker symbol.
+      data (DataFrame): All stored bars of the ticker, in stored order.
+      day (date): The trading day.
+
+    Returns:
+      DataFrame: The bars of that day.
+    """
+    entry = TradingDay.objects.filter(ticker=ticker, date=day).values_list('first_row', 'last_row').first()
+    if entry is not None:
+        first, last = entry
+        dates = data.index
+        if (last < len(dates) and dates[first].date() == day and dates[last].date() == day
+                and (first == 0 or dates[first - 1].date() != day)
+                and (last + 1 == len(dates) or dates[last + 1].date() != day)):
+            return data.iloc[first:last + 1]
+    return data[data.index.normalize() == pd.Timestamp(day)]
+
+
+def get_previous_close(ticker, day):
+    """
+    Return the 16:00 close of the trading day before day from the index.
+
+    Returns:
+      tuple: (found, close). found is False if day is not indexed; close is None if
+             there is no previous day or it has no 16:00 bar.
+    """
+    entry = TradingDay.objects.filter(ticker=ticker, date=day).values_list('prev_close', flat=True)
+    if not entry:
+        return False, None
+    return True, entry[0]
+
+
+def get_previous_closes(ticker, start_date, end_date):
+    """
+    Return the previous 16:00 close of every indexed day from start_date to end_date
+    (inclusive) with one query.
+
+    Returns:
+      dict: date -> close of the previous trading day (None if there is none or it has no
+            16:00 bar). Days that are not indexed are missing.
+    """
+    return dict(TradingDay.objects.filter(ticker=ticker, date__range=(start_date, end_date))
+                .values_list('date', 'prev_close'))
+
+
+def list_trading_days(ticker):
+    """
+    Return the indexed trading days of a ticker in ascending order (empty if it has no index).
+    """
+    return list(TradingDay.objects.filter(ticker=ticker).order_by('date').values_list('date', flat=True))
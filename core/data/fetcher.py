@@ -1,10 +1,103 @@
 """
 Module to fetch stock data using yfinance.
+
+Bars are downloaded through a provider (see core/data/providers.py), so tests and
+benchmarks can use local fixtures instead of the network. All requests of the process
+share one token-bucket rate limiter, so concurrent fetches (the job worker's threads,
+backfill windows) stay within the provider's limits, and failed attempts are retried
+with exponential backoff and jitter.
+fetch_and_store refreshes a stored ticker; concurrent refreshes of the same ticker share
+one upstream request.
 """
 import yfinance as yf
+import pandas as pd
+import random
+import threading
 import time
+from contextlib import nullcontext
+from django.conf import settings
+from django.utils import timezone
+from core.data.catalog import get_watermark, refreshed_since
+from core.data.locks import SingleFlight, ticker_lock
+from core.data.providers import get_provider
+
+# Defaults for the fetcher section of config.yaml
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_REQUESTS_PER_SECOND = 2.0
+DEFAULT_BURST = 4
+
+
+class TokenBucket:
+    """
+    Thread-safe token-bucket rate limiter.
+
+    Tokens are added at `rate` per second up to `capacity`; acquire() takes one token
+    and blocks until one is available.
+
+    Raises:
+      Exception: If rate is not positive or capacity is below one token, which would
+                 make acquire() block forever.
+    """
 
-def fetch_stock_data(ticker, period="7d", interval="1m", retries=3, delay=5):
+    def __init__(self, rate, capacity):
+        if not float(rate) > 0:
+            raise Exception(f"Invalid rate: {rate} tokens per second (must be > 0)")
+        if not float(capacity) >= 1:
+            raise Exception(f"Invalid capacity: {capacity} tokens (must be >= 1)")
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            # Sleep outside the lock so other threads can refill/check in the meantime
+            time.sleep(wait)
+
+
+_rate_limiter = None
+_rate_limiter_lock = threading.Lock()
+# In-flight refreshes of the process, by (ticker, period, interval)
+_refreshes = SingleFlight()
+
+
+def get_rate_limiter():
+    """
+    Return the process-wide rate limiter, created from CONFIG['fetcher'] on first use.
+    """
+    global _rate_limiter
+    with _rate_limiter_lock:
+        if _rate_limiter is None:
+            fetcher_config = settings.CONFIG.get('fetcher') or {}
+            try:
+                _rate_limiter = TokenBucket(
+                    fetcher_config.get('requests_per_second', DEFAULT_REQUESTS_PER_SECOND),
+                    fetcher_config.get('burst', DEFAULT_BURST),
+                )
+            except Exception as e:
+                raise Exception(f"Invalid fetcher.requests_per_second or fetcher.burst in config: {e}")
+        return _rate_limiter
+
+
+def backoff_delay(attempt, delay):
+    """
+    Return the wait before retry number attempt (0-based): a random time up to
+    delay * 2 ** attempt ("full jitter"), so concurrent retries do not line up.
+    """
+    return random.uniform(0, delay * (2 ** attempt))
+
+
+def fetch_stock_data(ticker, period="7d", interval="1m", retries=3, delay=5, provider=None,
+                     rate_limiter=None, start=None, end=None):
     """
     Fetch stock data(including pre-market and post-market) using yfinance with a retry mechanism.
 
@@ -13,29 +106,115 @@ def fetch_stock_data(ticker, period="7d", interval="1m", retries=3, delay=5):
       period (str): The period of data to fetch (default "7d").
       interval (str): The data interval (default "1m").
       retries (int): The number of times to retry fetching data if it fails (default 3).
-      delay (int): The delay in seconds between retries (default 5 seconds).
+      delay (int): The base delay in seconds between retries (default 5 seconds); it doubles
+                   with every attempt and is randomized.
+      provider (optional): The data provider (default: the one configured in config.yaml).
+      rate_limiter (TokenBucket, optional): The rate limiter (default: the shared one).
+      start (datetime, optional): Fetch from this time instead of using period.
+      end (datetime, optional): Fetch up to this time (exclusive), used with start.
 
     Returns:
-      DataFrame: The fetched stock data if successful.
+      DataFrame: The fetched stock data if successful. With start, the frame is empty
+                 when there are no bars since start.
 
     Raises:
       Exception: If the data cannot be fetched after the given number of retries.
     """
+    provider = provider or get_provider(settings.CONFIG)
+    rate_limiter = rate_limiter or get_rate_limiter()
+    last_error = "no data returned"
     for attempt in range(retries):
+        rate_limiter.acquire()
         try:
             # Attempt to download data, including pre-market and after-hours data
-            ticker = yf.Ticker(ticker)
-            data = ticker.history(period=period, interval=interval, prepost=True)
+            data = provider.history(ticker, period=period, interval=interval, start=start, end=end)
             # If data is successfully fetched and is not empty, return it
             if not data.empty:
                 data.index = data.index.tz_convert('US/Eastern')
                 return data[['Open', 'High', 'Low', 'Close', 'Volume']]
+            if start is not None:
+                # No bars since start yet (e.g. outside trading hours)
+                return pd.DataFrame(columns=['Open', 'High', 'Low', 'Close', 'Volume'], dtype=float,
+                                    index=pd.DatetimeIndex([], tz='US/Eastern', name='Datetime'))
         except Exception as e:
-            print(f"Attempt {attempt + 1} failed: {e}")
-        # Wait for a specified delay before retrying
-        time.sleep(delay)
+            last_error = e
+            print(f"Attempt {attempt + 1} for {ticker} failed: {e}")
+        # Wait before retrying (no wait after the last attempt)
+        if attempt + 1 < retries:
+            time.sleep(backoff_delay(attempt, delay))
     # If all attempts fail, raise an exception
-    raise Exception("Failed to fetch data after multiple attempts.")
+    raise Exception(f"Failed to fetch data after multiple attempts: {last_error}")
+
+
+def incremental_start(ticker, period="7d"):
+    """
+    Return the time to fetch 1-minute bars of a stored ticker from: its last stored bar.
+
+    The last stored bar is fetched again because it may have been stored before its
+    minute was complete. None is returned (fetch the whole period) if the ticker is not
+    stored yet or its last bar is older than period.
+    """
+    watermark = get_watermark(ticker)
+    if watermark is None:
+        return None
+    try:
+        earliest = pd.Timestamp.now(tz='UTC') - pd.Timedelta(period)
+    except ValueError:
+        # Periods like "1mo" or "max" always fetch the whole period
+        return None
+    if pd.Timestamp(watermark) < earliest:
+        return None
+    return pd.Timestamp(watermark).tz_convert('US/Eastern').to_pydatetime()
+
+
+def fetch_since_watermark(ticker, period="7d", interval="1m", **kwargs):
+    """
+    Fetch only the bars after the last stored bar of a ticker (see incremental_start),
+    or the whole period for tickers that are not stored yet.
+
+    Other keyword arguments are passed on to fetch_stock_data.
+    """
+    start = incremental_start(ticker, period) if interval == "1m" else None
+    return fetch_stock_data(ticker, period=period, interval=interval, start=start, **kwargs)
+
+
+def fetch_and_store(ticker, period="7d", interval="1m", provider=None, store_lock=None, on_fetched=None):
+    """
+    Fetch the bars of a ticker since its last stored bar and store them.
+
+    Refreshes are coalesced: a call made while a refresh of the same ticker is in flight in
+    this process waits for it and shares its result. Across processes, the refresh holds the
+    ticker's write lock, and is skipped if the ticker was stored by another process after
+    this call was made.
+
+    Parameters:
+      ticker (str): The stock ticker symbol.
+      period, interval: As for fetch_stock_data.
+      provider (optional): The data provider (default: the one configured in config.yaml).
+      store_lock (optional): A lock held while storing, e.g. to store one ticker at a time.
+      on_fetched (callable, optional): Called with the number of fetched bars before they are stored.
+
+    Returns:
+      int: The number of fetched bars (0 if the refresh was skipped).
+    """
+    requested = timezone.now()
+    count, _ = _refreshes.do((ticker, period, interval), lambda: _refresh(
+        ticker, period, interval, requested, provider, store_lock, on_fetched))
+    return count
+
+
+def _refresh(ticker, period, interval, requested, provider, store_lock, on_fetched):
+    # Imported here because storage imports the analysis modules
+    from core.data.storage import store_stock_data
+    with ticker_lock(ticker, settings.CONFIG):
+        if refreshed_since(ticker, requested):
+            return 0
+        data = fetch_since_watermark(ticker, period=period, interval=interval, provider=provider)
+        if on_fetched is not None:
+            on_fetched(len(data))
+        with store_lock or nullcontext():
+            store_stock_data(ticker, data, settings.CONFIG)
+    return len(data)
 
 
 # Fetch company information (market cap, PE ratio, dividend, etc.)
@@ -0,0 +1,225 @@
+"""
+Module to maintain the multi-resolution bar pyramid used by charts and interval queries.
+
+The IntervalBar table holds the bars of every chart interval (5m, 15m, 30m, 1h and 1d).
+Each level is aggregated from the level below it (1m -> 5m -> 15m -> 30m -> 1h -> 1d), and
+store_stock_data recomputes only the days it merges bars into.
+
+Intraday bins are aligned to the clock but never span two market sessions, so the 09:00
+hour is split into a pre-market bar starting at 09:00 and an intraday bar starting at 09:30.
+A bar is labelled with the time of its first minute bar. 1d bars cover the whole day.
+
+Requests for other intervals (e.g. 10m or 2h) are aggregated from the coarsest stored level
+that divides them, so only intervals finer than 5m read the minute bars.
+"""
+import re
+import numpy as np
+import pandas as pd
+from django.db import transaction
+from core.models import IntervalBar
+from core.data.sessions import MARKET_SESSIONS, MARKET_TIMEZONE, SESSION_CODES, session_codes, market_time_index
+
+# Intraday levels of the pyramid in minutes, each aggregated from the one before it
+INTRADAY_LEVELS = {'5m': 5, '15m': 15, '30m': 30, '1h': 60}
+DAILY_LEVEL = '1d'
+PYRAMID_INTERVALS = list(INTRADAY_LEVELS) + [DAILY_LEVEL]
+
+# Session name of 1d bars
+ALL_SESSIONS = 'all'
+
+FRAME_COLUMNS = ['start', 'date', 'session', 'open', 'high', 'low', 'close', 'volume', 'bar_count']
+
+
+def interval_minutes(interval):
+    """
+    Return the length of an interval such as '5m', '2h' or '1d' in minutes.
+    """
+    match = re.fullmatch(r'(\d+)([mhd])', str(interval))
+    if not match or int(match.group(1)) == 0:
+        raise Exception(f"Unsupported interval: {interval}")
+    return int(match.group(1)) * {'m': 1, 'h': 60, 'd': 1440}[match.group(2)]
+
+
+def source_level(interval):
+    """
+    Return the coarsest stored level the interval can be aggregated from, or None if it
+    has to be aggregated from the minute bars.
+    """
+    minutes = interval_minutes(interval)
+    if minutes >= 1440:
+        if minutes != 1440:
+            raise Exception(f"Unsupported interval: {interval}")
+        return DAILY_LEVEL
+    levels = [level for level, size in INTRADAY_LEVELS.items() if minutes % size == 0]
+    return levels[-1] if levels else None
+
+
+def _minute_frame(data):
+    index = market_time_index(data.index)
+    frame = pd.DataFrame({
+        'start': index,
+        'date': index.normalize(),
+        'session': session_codes(index),
+        'open': data['Open'].to_numpy(dtype=float),
+        'high': data['High'].to_numpy(dtype=float),
+        'low': data['Low'].to_numpy(dtype=float),
+        'close': data['Close'].to_numpy(dtype=float),
+        'volume': data['Volume'].to_numpy(dtype=float),
+        'bar_count': 1,
+    })
+    return frame.sort_values('start', kind='stable').reset_index(drop=True)
+
+
+def aggregate_bars(frame, interval):
+    """
+    Aggregate bars (minute bars or a finer level) into bars of the given interval.
+
+    Parameters:
+      frame (DataFrame): Bars with the FRAME_COLUMNS, in time order.
+      interval (str): The target interval, e.g. '15m' or '1d'.
+
+    Returns:
+      DataFrame: The aggregated bars with the FRAME_COLUMNS, in time order. Bars whose
+                 prices are all missing are dropped.
+    """
+    if frame.empty:
+        return frame[FRAME_COLUMNS]
+    minutes = interval_minutes(interval)
+    if minutes >= 1440:
+        keys = [frame['date']]
+    else:
+        keys = [frame['date'], frame['session'], frame['start'].dt.floor(f'{minutes}min')]
+    bars = frame.groupby(keys, sort=False).agg(
+        start=('start', 'first'), date=('date', 'first'), session=('session', 'first'),
+        open=('open', 'first'), high=('high', 'max'), low=('low', 'min'), close=('close', 'last'),
+        volume=('volume', 'sum'), bar_count=('bar_count', 'sum'),
+    ).reset_index(drop=True)
+    if minutes >= 1440:
+        # 1d bars are labelled with the day and cover all sessions
+        bars['start'] = bars['date']
+        bars['session'] = -1
+    bars = bars.dropna(subset=['open', 'high', 'low', 'close'])
+    return bars.sort_values('start', kind='stable').reset_index(drop=True)[FRAME_COLUMNS]
+
+
+def build_interval_bars(data):
+    """
+    Build every level of the pyramid from minute bars.
+
+    Returns:
+      dict: interval -> DataFrame of bars with the FRAME_COLUMNS.
+    """
+    frame = _minute_frame(data) if data is not None and not data.empty else pd.DataFrame(columns=FRAME_COLUMNS)
+    levels = {}
+    for interval in PYRAMID_INTERVALS:
+        frame = aggregate_bars(frame, interval)
+        levels[interval] = frame
+    return levels
+
+
+def _save_levels(ticker, levels):
+    rows = []
+    for interval, bars in levels.items():
+        if bars.empty:
+            continue
+        starts = pd.DatetimeIndex(bars['start']).tz_localize(MARKET_TIMEZONE)
+        markets = np.where(bars['session'].to_numpy() < 0, ALL_SESSIONS,
+                           np.asarray(MARKET_SESSIONS)[bars['session'].to_numpy().clip(0)])
+        for start, row, market in zip(starts, bars.itertuples(index=False), markets):
+            rows.append(IntervalBar(
+                ticker=ticker, interval=interval, start=start.to_pydatetime(), date=row.date.date(),
+                market=market, open=float(row.open), high=float(row.high), low=float(row.low),
+                close=float(row.close), volume=int(row.volume), bar_count=int(row.bar_count),
+            ))
+    IntervalBar.objects.bulk_create(rows, batch_size=2000)
+
+
+def update_interval_bars(ticker, tail, first_day):
+    """
+    Recompute the pyramid of a ticker from first_day on after bars were merged in.
+
+    Parameters:
+      ticker (str): The stock ticker symbol.
+      tail (DataFrame): All stored bars from first_day on.
+      first_day (date): The first trading day that changed.
+
+    Returns:
+      bool: False if the ticker has no pyramid yet, in which case it has to be rebuilt
+            with rebuild_interval_bars.
+    """
+    with transaction.atomic():
+        if not IntervalBar.objects.filter(ticker=ticker).exists():
+            return False
+        IntervalBar.objects.filter(ticker=ticker, date__gte=first_day).delete()
+        _save_levels(ticker, build_interval_bars(tail))
+    return True
+
+
+def rebuild_interval_bars(ticker, data):
+    """
+    Replace the pyramid of a ticker with one built from all of its stored bars.
+    """
+    with transaction.atomic():
+        IntervalBar.objects.filter(ticker=ticker).delete()
+        _save_levels(ticker, build_interval_bars(data))
+
+
+def _read_level(ticker, level, start_date, end_date):
+    rows = list(IntervalBar.objects.filter(ticker=ticker, interval=level, date__range=[start_date, end_date])
+                .order_by('start').values_list('start', 'date', 'market', 'open', 'high', 'low', 'close',
+                                               'volume', 'bar_count'))
+    frame = pd.DataFrame(rows, columns=['start', 'date', 'market', 'open', 'high', 'low', 'close',
+                                        'volume', 'bar_count'])
+    frame['start'] = market_time_index(pd.DatetimeIndex(frame['start'], tz='UTC') if rows else frame['start'])
+    frame['date'] = pd.to_datetime(frame['date'])
+    frame['session'] = frame['market'].map(SESSION_CODES).fillna(-1).astype(int)
+    frame['volume'] = frame['volume'].astype(float)
+    return frame[FRAME_COLUMNS]
+
+
+def get_interval_bars(ticker, start_date, end_date, interval):
+    """
+    Return the bars of a ticker at the given interval between two trading days (inclusive).
+
+    The stored level for the interval is read directly; other intervals are aggregated
+    from the coarsest level that divides them. Tickers stored before the pyramid existed
+    get it built from storage on first use.
+
+    Parameters:
+      ticker (str): The stock ticker symbol.
+      start_date (date): The first trading day.
+      end_date (date): The last trading day.
+      interval (str): e.g. '5m', '1h', '1d', or any multiple such as '10m' or '2h'.
+
+    Returns:
+      DataFrame: Open/High/Low/Close/Volume/Market columns with a naive market-time
+                 "Datetime" index (the day for 1d bars), in time order.
+    """
+    # Imported here because the storage module imports this one
+    from django.conf import settings
+    from core.data.storage import read_stored_frame
+
+    level = source_level(interval)
+    if level is None:
+        data = read_stored_frame(ticker, settings.CONFIG, start=start_date)
+        frame = _minute_frame(data) if data is not None and not data.empty else pd.DataFrame(columns=FRAME_COLUMNS)
+        frame = frame[frame['date'] <= pd.Timestamp(end_date)]
+    else:
+        if not IntervalBar.objects.filter(ticker=ticker).exists():
+            data = read_stored_frame(ticker, settings.CONFIG)
+            if data is not None and not data.empty:
+                rebuild_interval_bars(ticker, data)
+        frame = _read_level(ticker, level, start_date, end_date)
+    if level != interval:
+        frame = aggregate_bars(frame, interval)
+
+    sessions = frame['session'].to_numpy()
+    bars = pd.DataFrame({
+        'Open': frame['open'].to_numpy(dtype=float),
+        'High': frame['high'].to_numpy(dtype=float),
+        'Low': frame['low'].to_numpy(dtype=float),
+        'Close': frame['close'].to_numpy(dtype=float),
+        'Volume': frame['volume'].to_numpy(dtype=float),
+        'Market': np.where(sessions < 0, ALL_SESSIONS, np.asarray(MARKET_SESSIONS)[sessions.clip(0)]),
+    }, index=pd.DatetimeIndex(frame['start'], name='Datetime'))
+    return bars
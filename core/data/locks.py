@@ -0,0 +1,155 @@
+"""
+Module with per-ticker write locks and single-flight call coalescing.
+
+ticker_lock serializes the writers of a ticker across threads and processes (web workers,
+the job worker and management commands): threads of a process wait on an in-process lock,
+and processes on an advisory lock - a PostgreSQL advisory lock when the bars are stored in
+PostgreSQL, otherwise an flock on <data dir>/<TICKER>.lock.
+
+SingleFlight coalesces concurrent calls with the same key within a process: the first
+caller runs the call and the others wait for it and share its result, so a burst of
+refreshes of one ticker sends a single request upstream.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from django.db import connection
+
+try:
+    import fcntl
+except ImportError:  # Windows: only the threads of a process are serialized
+    fcntl = None
+
+LOCK_SUFFIX = ".lock"
+
+_locks = {}
+_locks_lock = threading.Lock()
+_held = threading.local()
+
+
+def lock_path(ticker, config):
+    """
+    Return the path of the lock file of a ticker, next to its stored bars.
+    """
+    method = config.get('storage_method', 'csv')
+    if method == 'csv':
+        lock_dir = config.get('csv_data_dir', 'csv_data')
+    elif method == 'parquet':
+        lock_dir = config.get('parquet_data_dir', 'parquet_data')
+    elif method == 'mmap':
+        lock_dir = config.get('mmap_data_dir', 'mmap_data')
+    else:
+        lock_dir = os.path.join(tempfile.gettempdir(), 'daytrade_locks')
+    return os.path.join(lock_dir, f"{ticker}{LOCK_SUFFIX}")
+
+
+def advisory_key(ticker):
+    """
+    Return the signed 64-bit PostgreSQL advisory lock key of a ticker.
+    """
+    digest = hashlib.sha1(f"ticker:{ticker}".encode()).digest()
+    return int.from_bytes(digest[:8], 'big', signed=True)
+
+
+@contextmanager
+def _process_lock(ticker, config):
+    if config.get('storage_method') == 'postgres' and connection.vendor == 'postgresql':
+        key = advisory_key(ticker)
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_lock(%s)", [key])
+        try:
+            yield
+        finally:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_unlock(%s)", [key])
+        return
+    if fcntl is None:
+        yield
+        return
+    path = lock_path(ticker, config)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'a') as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+@contextmanager
+def ticker_lock(ticker, config):
+    """
+    Hold the write lock of a ticker.
+
+    The lock is reentrant within a thread: nested calls (e.g. a refresh that stores the
+    bars it fetched) only take the process-wide lock once.
+
+    Parameters:
+      ticker (str): The stock ticker symbol.
+      config (dict): The configuration dictionary loaded from config.yaml.
+    """
+    with _locks_lock:
+        lock = _locks.setdefault(ticker, threading.RLock())
+    with lock:
+        held = getattr(_held, 'tickers', None)
+        if held is None:
+            held = _held.tickers = set()
+        if ticker in held:
+            yield
+            return
+        held.add(ticker)
+        try:
+            with _process_lock(ticker, config):
+                yield
+        finally:
+            held.discard(ticker)
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls with the same key.
+
+    do(key, func) runs func unless a call with the same key is in flight, in which case
+    it waits for that call and returns its result (or raises its exception). Calls made
+    after the in-flight one has finished run again.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+
+    def do(self, key, func):
+        """
+        Returns:
+          tuple: (result, shared), shared is True if the result came from another caller.
+        """
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = _Call()
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = func()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.done.set()
+        return call.result, False
@@ -0,0 +1,367 @@
+"""
+Module to store and read stock data as memory-mapped binary files.
+
+Each ticker gets a fixed-width binary file of minute bars and a small day index:
+
+    <mmap_data_dir>/<TICKER>.bars    header + one RECORD_DTYPE record per bar, in time order
+    <mmap_data_dir>/<TICKER>.days    header + one DAY_DTYPE record per trading day
+
+Timestamps are minutes since 1970-01-01 in naive market time (US/Eastern wall clock), so
+the trading day of a bar is t // 1440. Prices are float32 and volume uint64; the market
+session is derived from the timestamp when a frame is built.
+
+Readers map the file with np.memmap and slice the records of a date range through the day
+index, which gives zero-copy NumPy views: only the pages of the requested days are touched,
+nothing is parsed, and all web workers share the operating system's page cache instead of
+each holding its own DataFrame. New bars after the last stored one are appended in place;
+any other change rewrites the file to a temporary file that replaces it atomically.
+
+Each process keeps the mappings of the MAX_OPEN_MAPS most recently read files. A mapping
+that is replaced (its file was rewritten) or evicted is closed at once unless views of it
+are still in use; those are unmapped when the last view is released.
+"""
+import os
+import struct
+import sys
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from core.data.sessions import (classify_sessions, session_codes, SESSION_CODES, PRE_MARKET_START, INTRADAY_START,
+                                 INTRADAY_END, POST_MARKET_START, POST_MARKET_END)
+
+BARS_SUFFIX = ".bars"
+DAYS_SUFFIX = ".days"
+
+RECORD_DTYPE = np.dtype([
+    ('t', '<i8'),
+    ('Open', '<f4'),
+    ('High', '<f4'),
+    ('Low', '<f4'),
+    ('Close', '<f4'),
+    ('Volume', '<u8'),
+])
+DAY_DTYPE = np.dtype([('day', '<i8'), ('start', '<i8')])
+
+# Bars header: magic, version, record size, generation, row count (padded to HEADER_SIZE)
+BARS_MAGIC = b'DTABARS1'
+BARS_HEADER = struct.Struct('<8sIIQQ')
+HEADER_SIZE = 64
+ROW_COUNT_OFFSET = 24
+# Day index header: magic, generation and row count of the bars it describes, day count
+DAYS_MAGIC = b'DTADAYS1'
+DAYS_HEADER = struct.Struct('<8sQQQ')
+
+MINUTES_PER_DAY = 1440
+# First and last minute of the day (inclusive) of each session, see core/data/sessions.py
+SESSION_MINUTES = {
+    'pre-market': (PRE_MARKET_START // 60, INTRADAY_START // 60 - 1),
+    'intraday': (INTRADAY_START // 60, INTRADAY_END // 60),
+    'post-market': (POST_MARKET_START // 60, POST_MARKET_END // 60),
+}
+
+# Open mappings kept per process, least recently used first
+MAX_OPEN_MAPS = 128
+
+_maps = OrderedDict()  # path -> (file key, records, day_index)
+_lock = threading.Lock()
+
+
+def bars_path(ticker, data_dir):
+    return os.path.join(data_dir, f"{ticker}{BARS_SUFFIX}")
+
+
+def days_path(ticker, data_dir):
+    return os.path.join(data_dir, f"{ticker}{DAYS_SUFFIX}")
+
+
+def list_mmap_tickers(data_dir):
+    """
+    List the tickers that have a bars file.
+    """
+    if not os.path.isdir(data_dir):
+        return []
+    return sorted(f[:-len(BARS_SUFFIX)] for f in os.listdir(data_dir) if f.endswith(BARS_SUFFIX))
+
+
+def to_minutes(index):
+    """
+    Return naive market-time timestamps as epoch minutes (seconds are dropped).
+    """
+    return pd.DatetimeIndex(index).values.astype('datetime64[m]').astype(np.int64)
+
+
+def from_minutes(minutes):
+    """
+    Return epoch minutes as a naive market-time DatetimeIndex.
+    """
+    return pd.DatetimeIndex((np.asarray(minutes, dtype=np.int64) * 60).astype('datetime64[s]'), name='Datetime')
+
+
+def _day_number(day):
+    return int(np.datetime64(pd.Timestamp(day).date(), 'D').astype(np.int64))
+
+
+def build_day_index(records, offset=0):
+    """
+    Return the DAY_DTYPE index of records whose first row is at position offset.
+    """
+    days = np.asarray(records['t']) // MINUTES_PER_DAY
+    starts = np.flatnonzero(np.r_[True, days[1:] != days[:-1]]) if len(days) else np.array([], dtype=np.int64)
+    index = np.empty(len(starts), dtype=DAY_DTYPE)
+    index['day'] = days[starts]
+    index['start'] = starts + offset
+    return index
+
+
+def _read_header(path):
+    with open(path, 'rb') as f:
+        magic, version, record_size, generation, row_count = BARS_HEADER.unpack(f.read(BARS_HEADER.size))
+    if magic != BARS_MAGIC or record_size != RECORD_DTYPE.itemsize:
+        raise Exception(f"Not a bars file: {path}")
+    return generation, row_count
+
+
+def _read_day_index(path, generation, row_count):
+    try:
+        with open(path, 'rb') as f:
+            magic, index_generation, index_rows, day_count = DAYS_HEADER.unpack(f.read(DAYS_HEADER.size))
+            if magic != DAYS_MAGIC or (index_generation, index_rows) != (generation, row_count):
+                return None
+            return np.frombuffer(f.read(day_count * DAY_DTYPE.itemsize), dtype=DAY_DTYPE)
+    except (FileNotFoundError, struct.error):
+        return None
+
+
+def _write_day_index(path, index, generation, row_count):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(DAYS_HEADER.pack(DAYS_MAGIC, generation, row_count, len(index)))
+        f.write(index.tobytes())
+    os.replace(tmp_path, path)
+
+
+def _open(ticker, data_dir):
+    """
+    Return (records, day_index) of a ticker, or None if it has no bars file.
+
+    Mappings are cached per process (the MAX_OPEN_MAPS most recently used) and reopened
+    when the file changes. records is a read-only memmap; day_index is rebuilt from the
+    timestamps if the stored one does not describe this version of the file (e.g. while a
+    writer is between the two files).
+    """
+    path = bars_path(ticker, data_dir)
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    key = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+    with _lock:
+        cached = _maps.get(path)
+        if cached is not None and cached[0] == key:
+            _maps.move_to_end(path)
+            return cached[1], cached[2]
+    # Do not hold a reference to the stale mapping, so it can be closed below
+    cached = None
+    generation, row_count = _read_header(path)
+    if row_count:
+        records = np.memmap(path, dtype=RECORD_DTYPE, mode='r', offset=HEADER_SIZE, shape=(row_count,))
+    else:
+        records = np.empty(0, dtype=RECORD_DTYPE)
+    day_index = _read_day_index(days_path(ticker, data_dir), generation, row_count)
+    if day_index is None:
+        day_index = build_day_index(records)
+    with _lock:
+        released = [_maps.pop(path, None)]
+        _maps[path] = (key, records, day_index)
+        while len(_maps) > MAX_OPEN_MAPS:
+            released.append(_maps.popitem(last=False)[1])
+    for entry in released:
+        if entry is not None:
+            _close_records(entry[1])
+    return records, day_index
+
+
+def _close_records(records):
+    """
+    Unmap records unless views of them are still in use.
+
+    Every view (a slice, a field or an array made from one) references the memmap, so the
+    mapping is only closed when the caller's reference is the last one; closing it under a
+    live view would crash the reader. Otherwise it is unmapped with the last view.
+    """
+    mapping = getattr(records, '_mmap', None)
+    # References: the caller's, this function's argument and getrefcount's own
+    if mapping is not None and sys.getrefcount(records) <= 3:
+        mapping.close()
+
+
+def list_mmap_dates(ticker, data_dir):
+    """
+    List the trading days stored for the given ticker.
+
+    Returns:
+      list: Sorted list of datetime.date objects.
+    """
+    opened = _open(ticker, data_dir)
+    if opened is None:
+        return []
+    return [d.date() for d in pd.to_datetime(opened[1]['day'].astype('datetime64[D]'))]
+
+
+def read_mmap_bars(ticker, data_dir, start=None, end=None):
+    """
+    Return the bars of a ticker between two trading days (inclusive) as a zero-copy view.
+
+    Parameters:
+      ticker (str): The stock ticker symbol.
+      data_dir (str): The mmap data directory.
+      start (date, optional): First trading day to read (inclusive).
+      end (date, optional): Last trading day to read (inclusive).
+
+    Returns:
+      ndarray: Read-only RECORD_DTYPE records (fields t, Open, High, Low, Close, Volume),
+               or None if the ticker has no bars file.
+    """
+    opened = _open(ticker, data_dir)
+    if opened is None:
+        return None
+    records, day_index = opened
+    days = day_index['day']
+    first = int(np.searchsorted(days, _day_number(start), 'left')) if start is not None else 0
+    last = int(np.searchsorted(days, _day_number(end), 'right')) if end is not None else len(days)
+    if first >= last:
+        return records[:0]
+    stop = day_index['start'][last] if last < len(days) else len(records)
+    return records[day_index['start'][first]:stop]
+
+
+def session_bars(records, market):
+    """
+    Return the records of one market session of a single trading day.
+
+    Sessions are contiguous ranges of the day, so the result is a slice of records (still a
+    zero-copy view of the mapped file); only "unknown" bars are selected with a mask.
+    """
+    if market not in SESSION_MINUTES:
+        return records[session_codes(from_minutes(records['t'])) == SESSION_CODES.get(market, -1)]
+    minutes = np.asarray(records['t']) % MINUTES_PER_DAY
+    first, last = SESSION_MINUTES[market]
+    return records[int(np.searchsorted(minutes, first, 'left')):int(np.searchsorted(minutes, last, 'right'))]
+
+
+def bars_to_frame(records):
+    """
+    Build a minute-data frame (float64 prices, int64 volume, Market column) from records.
+    """
+    index = from_minutes(records['t'])
+    frame = pd.DataFrame({
+        'Open': np.asarray(records['Open'], dtype=np.float64),
+        'High': np.asarray(records['High'], dtype=np.float64),
+        'Low': np.asarray(records['Low'], dtype=np.float64),
+        'Close': np.asarray(records['Close'], dtype=np.float64),
+        'Volume': np.asarray(records['Volume'], dtype=np.int64),
+    }, index=index)
+    frame['Market'] = classify_sessions(index)
+    return frame
+
+
+def read_mmap_frame(ticker, data_dir, start=None, end=None):
+    """
+    Read the bars of a ticker between two trading days (inclusive) as a DataFrame.
+
+    Returns:
+      DataFrame: Minute data indexed by Datetime, or None if the ticker has no bars file.
+                 Prices are returned as float64 so callers see the same types as the CSV path.
+    """
+    records = read_mmap_bars(ticker, data_dir, start=start, end=end)
+    return None if records is None else bars_to_frame(records)
+
+
+def frame_to_records(data):
+    """
+    Convert adjusted minute data (naive market-time index) to RECORD_DTYPE records.
+    """
+    records = np.empty(len(data), dtype=RECORD_DTYPE)
+    records['t'] = to_minutes(data.index)
+    for column in ('Open', 'High', 'Low', 'Close'):
+        records[column] = data[column].to_numpy(dtype=np.float64)
+    records['Volume'] = np.nan_to_num(data['Volume'].to_numpy(dtype=np.float64)).clip(0)
+    return records
+
+
+def _rewrite(ticker, data_dir, records):
+    generation = int.from_bytes(os.urandom(8), 'little')
+    path = bars_path(ticker, data_dir)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(BARS_HEADER.pack(BARS_MAGIC, 1, RECORD_DTYPE.itemsize, generation, len(records)).ljust(HEADER_SIZE, b'\0'))
+        f.write(records.tobytes())
+    os.replace(tmp_path, path)
+    _write_day_index(days_path(ticker, data_dir), build_day_index(records), generation, len(records))
+
+
+def _append(ticker, data_dir, new_records, day_index):
+    path = bars_path(ticker, data_dir)
+    generation, row_count = _read_header(path)
+    with open(path, 'r+b') as f:
+        # Write the bars before the row count, so readers never see rows that are not there
+        f.seek(HEADER_SIZE + row_count * RECORD_DTYPE.itemsize)
+        f.write(new_records.tobytes())
+        f.truncate()
+        f.flush()
+        f.seek(ROW_COUNT_OFFSET)
+        f.write(struct.pack('<Q', row_count + len(new_records)))
+    new_days = build_day_index(new_records, offset=row_count)
+    if len(day_index) and len(new_days) and new_days['day'][0] == day_index['day'][-1]:
+        new_days = new_days[1:]
+    _write_day_index(days_path(ticker, data_dir), np.concatenate([day_index, new_days]),
+                     generation, row_count + len(new_records))
+
+
+def write_mmap_bars(ticker, data, data_dir):
+    """
+    Merge adjusted minute data into the ticker's bars file.
+
+    Bars are upserted at minute granularity: a fetched bar replaces the stored bar with
+    the same timestamp. Bars after the last stored one are appended when the stored bars
+    they overlap are unchanged; otherwise the file is rewritten.
+
+    Parameters:
+      ticker (str): The stock ticker symbol.
+      data (DataFrame): Adjusted data with a naive DatetimeIndex, sorted and without duplicates.
+      data_dir (str): The mmap data directory.
+
+    Returns:
+      DatetimeIndex: The timestamps of the rows that were not stored before.
+    """
+    os.makedirs(data_dir, exist_ok=True)
+    incoming = frame_to_records(data)
+    opened = _open(ticker, data_dir)
+    if opened is None or not len(opened[0]):
+        _rewrite(ticker, data_dir, incoming)
+        return from_minutes(incoming['t'])
+
+    records, day_index = opened
+    if not len(incoming):
+        return from_minutes([])
+    # Only the stored days from the first incoming day on can overlap
+    first_day = pd.Timestamp(int(incoming['t'][0]) // MINUTES_PER_DAY, unit='D')
+    tail = np.asarray(read_mmap_bars(ticker, data_dir, start=first_day))
+    overlap = np.isin(incoming['t'], tail['t'])
+    new_records = incoming[~overlap]
+    changed = False
+    if overlap.any():
+        stored = tail[np.isin(tail['t'], incoming['t'])]
+        fields = ['Open', 'High', 'Low', 'Close', 'Volume']
+        changed = any(not np.array_equal(stored[name], incoming[overlap][name], equal_nan=name != 'Volume')
+                      for name in fields)
+    if not changed and (not len(new_records) or new_records['t'][0] > records['t'][-1]):
+        if len(new_records):
+            _append(ticker, data_dir, new_records, day_index)
+        return from_minutes(new_records['t'])
+
+    kept = np.asarray(records)[~np.isin(records['t'], incoming['t'])]
+    merged = np.concatenate([kept, incoming])
+    _rewrite(ticker, data_dir, merged[np.argsort(merged['t'], kind='stable')])
+    return from_minutes(new_records['t'])
@@ -0,0 +1,143 @@
+"""
+Module to store and read stock data as day-partitioned Parquet files.
+
+Each ticker gets its own directory with one file per trading day:
+
+    <parquet_data_dir>/<TICKER>/<YYYY-MM-DD>.parquet
+
+A query for a date range only opens the partitions that fall inside the range,
+so a one-day read costs the same no matter how much history is stored.
+Prices are written as float32 and volume as int64 to keep the files small.
+"""
+import os
+import pandas as pd
+from datetime import datetime
+from core.data.sessions import as_session_category
+
+PARTITION_SUFFIX = ".parquet"
+
+# On-disk column types
+COLUMN_DTYPES = {
+    'Open': 'float32',
+    'High': 'float32',
+    'Low': 'float32',
+    'Close': 'float32',
+    'Volume': 'int64',
+}
+
+
+def ticker_dir(ticker, data_dir):
+    """
+    Return the partition directory for the given ticker.
+    """
+    return os.path.join(data_dir, ticker)
+
+
+def list_partition_dates(ticker, data_dir):
+    """
+    List the trading days stored for the given ticker.
+
+    Parameters:
+      ticker (str): The stock ticker symbol.
+      data_dir (str): The Parquet data directory.
+
+    Returns:
+      list: Sorted list of datetime.date objects, one per stored partition.
+    """
+    path = ticker_dir(ticker, data_dir)
+    if not os.path.isdir(path):
+        return []
+    dates = []
+    for filename in os.listdir(path):
+        if filename.endswith(PARTITION_SUFFIX):
+            try:
+                dates.append(datetime.strptime(filename[:-len(PARTITION_SUFFIX)], "%Y-%m-%d").date())
+            except ValueError:
+                # Ignore files that are not day partitions
+                continue
+    return sorted(dates)
+
+
+def _partition_path(ticker, data_dir, day):
+    return os.path.join(ticker_dir(ticker, data_dir), f"{day.strftime('%Y-%m-%d')}{PARTITION_SUFFIX}")
+
+
+def write_parquet_partitions(ticker, data, data_dir):
+    """
+    Merge adjusted minute data into per-day Parquet partitions.
+
+    Bars are upserted at minute granularity: a fetched bar replaces the stored bar with
+    the same timestamp and new bars are merged in timestamp order. Only the partitions
+    of days that actually change are rewritten.
+
+    Parameters:
+      ticker (str): The stock ticker symbol.
+      data (DataFrame): Adjusted data with a naive DatetimeIndex and a Market column.
+      data_dir (str): The Parquet data directory.
+
+    Returns:
+      DatetimeIndex: The timestamps of the rows that were not stored before.
+    """
+    path = ticker_dir(ticker, data_dir)
+    os.makedirs(path, exist_ok=True)
+    existing_dates = set(list_partition_dates(ticker, data_dir))
+
+    typed = data.astype(COLUMN_DTYPES)
+    typed['Market'] = as_session_category(typed['Market'])
+    typed.index.name = 'Datetime'
+
+    added = []
+    for day, day_data in typed.groupby(typed.index.date):
+        day_data = day_data[~day_data.index.duplicated(keep='last')].sort_index()
+        partition_path = _partition_path(ticker, data_dir, day)
+        if day in existing_dates:
+            stored = pd.read_parquet(partition_path, engine='pyarrow')
+            stored['Market'] = as_session_category(stored['Market'].astype(str))
+            new_rows = day_data[~day_data.index.isin(stored.index)]
+            overlap = day_data[day_data.index.isin(stored.index)]
+            changed = (stored.loc[overlap.index, list(COLUMN_DTYPES)].to_numpy()
+                       != overlap[list(COLUMN_DTYPES)].to_numpy()).any()
+            if new_rows.empty and not changed:
+                continue
+            day_data = pd.concat([stored[~stored.index.isin(day_data.index)], day_data]).sort_index(kind='stable')
+            day_data['Market'] = as_session_category(day_data['Market'])
+        else:
+            new_rows = day_data
+        # Write to a temporary file first so readers never see a half-written partition
+        tmp_path = partition_path + ".tmp"
+        day_data.to_parquet(tmp_path, engine='pyarrow', index=True)
+        os.replace(tmp_path, partition_path)
+        added.append(new_rows.index)
+    if not added:
+        return pd.DatetimeIndex([], name='Datetime')
+    return added[0].append(added[1:])
+
+
+def read_parquet_frame(ticker, data_dir, start=None, end=None):
+    """
+    Read the partitions of a ticker that fall inside [start, end].
+
+    Parameters:
+      ticker (str): The stock ticker symbol.
+      data_dir (str): The Parquet data directory.
+      start (date, optional): First trading day to read (inclusive).
+      end (date, optional): Last trading day to read (inclusive).
+
+    Returns:
+      DataFrame: Minute data indexed by Datetime, or None if the ticker has no partitions.
+                 Prices are returned as float64 so callers see the same types as the CSV path.
+    """
+    dates = list_partition_dates(ticker, data_dir)
+    if not dates:
+        return None
+    selected = [d for d in dates if (start is None or d >= start) and (end is None or d <= end)]
+    frames = [pd.read_parquet(_partition_path(ticker, data_dir, d), engine='pyarrow') for d in selected]
+    if not frames:
+        empty = pd.DataFrame(columns=['Open', 'High', 'Low', 'Close', 'Volume'],
+                             index=pd.DatetimeIndex([], name='Datetime'), dtype='float64')
+        empty['Market'] = as_session_category([])
+        return empty
+    df = pd.concat(frames)
+    df = df.astype({'Open': 'float64', 'High': 'float64', 'Low': 'float64', 'Close': 'float64'})
+    df['Market'] = as_session_category(df['Market'].astype(str))
+    return df
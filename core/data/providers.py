@@ -0,0 +1,90 @@
+"""
+Module with the market data providers used by the fetcher.
+
+A provider has a single method, history(), returning raw OHLCV bars with a tz-aware
+DatetimeIndex. The fetcher adds retries, rate limiting and post-processing on top,
+so a provider only has to talk to its source:
+  - YFinanceProvider: downloads data from Yahoo Finance (the default).
+  - FixtureProvider: serves bars from local CSV files or synthetic data, for tests,
+    benchmarks and offline development.
+
+The provider is selected with fetcher.provider in config.yaml.
+"""
+import os
+import time
+import zlib
+import pandas as pd
+from core.data.catalog import to_market_time
+from core.data.sessions import MARKET_TIMEZONE
+from core.data.synthetic import generate_minute_bars
+
+
+class YFinanceProvider:
+    name = "yfinance"
+
+    def history(self, ticker, period=None, interval="1m", start=None, end=None):
+        """
+        Download bars (including pre-market and post-market) from Yahoo Finance.
+
+        Either period (e.g. "7d") or start/end can be given.
+        """
+        import yfinance as yf
+        if start is not None:
+            return yf.Ticker(ticker).history(start=start, end=end, interval=interval, prepost=True)
+        return yf.Ticker(ticker).history(period=period, interval=interval, prepost=True)
+
+
+class FixtureProvider:
+    """
+    Serve bars from <fixture_dir>/<TICKER>.csv, or generate deterministic synthetic
+    bars when there is no fixture file for a ticker.
+
+    Parameters:
+      fixture_dir (str, optional): Directory with fixture CSV files (naive US/Eastern index).
+      days (int): Number of business days of synthetic data per ticker.
+      start_day (str): First business day of the synthetic data.
+      latency (float): Seconds to sleep per call, to imitate network round trips.
+      fail_tickers (iterable): Tickers for which every call raises an error.
+    """
+    name = "fixture"
+
+    def __init__(self, fixture_dir=None, days=5, start_day="2024-03-04", latency=0.0, fail_tickers=()):
+        self.fixture_dir = fixture_dir
+        self.days = days
+        self.start_day = start_day
+        self.latency = latency
+        self.fail_tickers = set(fail_tickers)
+
+    def history(self, ticker, period=None, interval="1m", start=None, end=None):
+        if self.latency:
+            time.sleep(self.latency)
+        if ticker in self.fail_tickers:
+            raise Exception(f"No fixture data for {ticker}")
+
+        path = os.path.join(self.fixture_dir, f"{ticker}.csv") if self.fixture_dir else None
+        if path and os.path.exists(path):
+            data = pd.read_csv(path, index_col=0, parse_dates=True)
+            data.index = pd.DatetimeIndex(data.index, name="Datetime").tz_localize(MARKET_TIMEZONE)
+            data = data[['Open', 'High', 'Low', 'Close', 'Volume']]
+        else:
+            # Seed by ticker so each ticker always gets the same series
+            data = generate_minute_bars(self.start_day, self.days, seed=zlib.crc32(ticker.encode()))
+
+        if start is not None:
+            data = data[data.index >= to_market_time(start)]
+        if end is not None:
+            data = data[data.index < to_market_time(end)]
+        return data
+
+
+def get_provider(config):
+    """
+    Return the provider selected in the configuration (fetcher.provider).
+    """
+    fetcher_config = config.get('fetcher') or {}
+    name = fetcher_config.get('provider', 'yfinance')
+    if name == 'yfinance':
+        return YFinanceProvider()
+    elif name == 'fixture':
+        return FixtureProvider(fixture_dir=fetcher_config.get('fixture_dir'))
+    raise Exception(f"Invalid fetcher provider in config: {name}")
@@ -10,6 +10,143 @@ import os
 import pandas as pd
 from django.conf import settings
 from datetime import datetime
+from core.data.parquet_store import list_partition_dates, read_parquet_frame
+from core.data.mmap_store import list_mmap_dates, read_mmap_bars, read_mmap_frame, session_bars
+from core.data.cache import get_frame_cache
+from core.data.sessions import as_session_category, session_mask, market_time_index
+from core.data.dayindex import slice_trading_day, get_previous_close, get_previous_closes
+from core.data.dailybars import get_session_bars
+from core.data.intervalbars import get_interval_bars, source_level
+
+
+def _csv_path(ticker):
+    """
+    Return the absolute path of the CSV file of a ticker.
+    """
+    csv_dir = os.path.join(settings.BASE_DIR, settings.CONFIG.get("csv_data_dir", "csv_data"))
+    return os.path.join(csv_dir, f"{ticker}.csv")
+
+
+def _load_csv_frame(ticker):
+    """
+    Return the parsed CSV data of a ticker from the process-wide cache.
+
+    The file is only parsed again when its mtime or size changed since the cached read.
+    The returned frame is shared and must not be modified in place.
+
+    Returns:
+      DataFrame or None: None if the ticker has no CSV file.
+    """
+    csv_path = _csv_path(ticker)
+    try:
+        stat = os.stat(csv_path)
+    except FileNotFoundError:
+        return None
+
+    def load():
+        df = pd.read_csv(csv_path, index_col=0, parse_dates=True)
+        df.index = pd.to_datetime(df.index)
+        # Keep sessions as small integer codes in memory
+        df['Market'] = as_session_category(df['Market'])
+        return df
+
+    return get_frame_cache().get(('csv', ticker), (stat.st_mtime_ns, stat.st_size), load)
+
+
+def _load_postgres_frame(ticker):
+    """
+    Return the StockData rows of a ticker as a DataFrame from the process-wide cache.
+
+    The cache version is the row count, last timestamp and highest row id of the ticker
+    (replaced bars are inserted again with a new id), which costs one aggregate query
+    instead of transferring every row.
+    """
+    from core.models import StockData
+    from django.db.models import Count, Max
+    qs = StockData.objects.filter(ticker=ticker)
+    version = tuple(qs.aggregate(rows=Count('id'), last=Max('date'), last_id=Max('id')).values())
+
+    def load():
+        # Convert the QuerySet to a DataFrame shaped like the CSV data
+        df = pd.DataFrame(list(qs.order_by("date", "id").values_list(
+            "date", "open", "high", "low", "close", "volume", "market")),
+            columns=["Datetime", "Open", "High", "Low", "Close", "Volume", "Market"])
+        # Tables created without the unique (ticker, date) index may hold a bar more than once
+        df = df[~df["Datetime"].duplicated(keep="last")]
+        # Bars are stored as UTC; use naive market time like the file-based storage
+        df["Datetime"] = market_time_index(pd.to_datetime(df["Datetime"], utc=True))
+        df.set_index("Datetime", inplace=True)
+        df["Market"] = as_session_category(df["Market"])
+        return df
+
+    return get_frame_cache().get(('postgres', ticker), version, load)
+
+
+def _parquet_dir():
+    """
+    Return the absolute Parquet data directory from the configuration.
+    """
+    return os.path.join(settings.BASE_DIR, settings.CONFIG.get("parquet_data_dir", "parquet_data"))
+
+
+def _mmap_dir():
+    """
+    Return the absolute directory of the memory-mapped bars files from the configuration.
+    """
+    return os.path.join(settings.BASE_DIR, settings.CONFIG.get("mmap_data_dir", "mmap_data"))
+
+
+def _read_file_frame(ticker, storage_method, start_date, end_date):
+    """
+    Read minute data for a ticker from file-based storage (CSV, Parquet or mmap).
+
+    For Parquet only the partitions between start_date and end_date are read, for mmap
+    only the mapped bars of those days. The CSV file is read in full through the frame
+    cache. Callers still apply their own exact filters and must not modify the returned
+    frame in place.
+
+    Returns:
+      DataFrame or None: None if the ticker has no stored data.
+    """
+    if storage_method == "parquet":
+        return read_parquet_frame(ticker, _parquet_dir(), start=start_date.date(), end=end_date.date())
+    if storage_method == "mmap":
+        return read_mmap_frame(ticker, _mmap_dir(), start=start_date.date(), end=end_date.date())
+    return _load_csv_frame(ticker)
+
+
+def get_bars(ticker, start_date, end_date, interval='1m'):
+    """
+    Return the bars of a ticker between two trading days (inclusive).
+
+    Minute bars are read from storage (only the needed days for Parquet and mmap); other
+    intervals come from the bar pyramid (see get_interval_bars).
+
+    Parameters:
+      ticker (str): The stock ticker symbol.
+      start_date, end_date (date, datetime or str): The date range.
+      interval (str): '1m' or an interval supported by get_interval_bars.
+
+    Returns:
+      DataFrame: Open/High/Low/Close/Volume/Market columns with a naive market-time index.
+    """
+    start_day = pd.Timestamp(start_date).date()
+    end_day = pd.Timestamp(end_date).date()
+    if interval != '1m':
+        return get_interval_bars(ticker, start_day, end_day, interval)
+
+    columns = ['Open', 'High', 'Low', 'Close', 'Volume', 'Market']
+    storage_method = settings.CONFIG.get('storage_method', 'csv')
+    if storage_method in ('csv', 'parquet', 'mmap'):
+        data = _read_file_frame(ticker, storage_method, pd.Timestamp(start_day), pd.Timestamp(end_day))
+    elif storage_method == 'postgres':
+        data = _load_postgres_frame(ticker)
+    else:
+        raise Exception("Invalid storage_method in config.")
+    if data is None or data.empty:
+        return pd.DataFrame(columns=columns, index=pd.DatetimeIndex([], name='Datetime'))
+    days = market_time_index(data.index).date
+    return data.loc[(days >= start_day) & (days <= end_day), columns]
 
 
 def get_local_data(ticker, date=None, market=None):
@@ -30,122 +167,132 @@ def get_local_data(ticker, date=None, market=None):
     """
     storage_method = settings.CONFIG.get('storage_method', 'csv')
 
+    try:
+        # Convert the date string to a date object.
+        target_date = datetime.strptime(date, "%Y-%m-%d").date() if date is not None else None
+    except Exception as e:
+        raise Exception(f"Error processing the date parameter: {e}")
+
     if storage_method == 'csv':
-        # Construct the CSV file path
-        csv_dir = settings.CONFIG.get("csv_data_dir", "csv_data")
-        csv_path = os.path.join(settings.BASE_DIR, csv_dir, f"{ticker}.csv")
         try:
-            local_data = pd.read_csv(csv_path, index_col=0, parse_dates=True)
-            if market != None:
-                # 过滤 market 列为 'intraday' 的数据
-                local_data = local_data[local_data['Market'] == market]
+            local_data = _load_csv_frame(ticker)
+            if local_data is None:
+                raise FileNotFoundError(f"No CSV file for {ticker}")
         except Exception as e:
             raise Exception(f"Error reading CSV file: {e}")
+    elif storage_method == 'parquet':
+        try:
+            # Only the partition of the requested day is read when a date is given
+            local_data = read_parquet_frame(ticker, _parquet_dir(), start=target_date, end=target_date)
+            if local_data is None:
+                raise FileNotFoundError(f"No Parquet partitions for {ticker}")
+        except Exception as e:
+            raise Exception(f"Error reading Parquet partitions: {e}")
+    elif storage_method == 'mmap':
+        try:
+            # Only the mapped bars of the requested day are read when a date is given
+            local_data = read_mmap_frame(ticker, _mmap_dir(), start=target_date, end=target_date)
+            if local_data is None:
+                raise FileNotFoundError(f"No bars file for {ticker}")
+        except Exception as e:
+            raise Exception(f"Error reading bars file: {e}")
     elif storage_method == 'postgres':
         try:
-            from core.models import StockData
-            # Query the StockData model for records with the given ticker
-            qs = StockData.objects.filter(ticker=ticker).order_by("date")
-            # Convert the QuerySet to a DataFrame
-            local_data = pd.DataFrame(list(qs.values("date", "open", "high", "low", "close", "volume")))
-            # Convert the 'date' column to datetime and set it as index
-            local_data["date"] = pd.to_datetime(local_data["date"])
-            local_data.set_index("date", inplace=True)
+            local_data = _load_postgres_frame(ticker)
         except Exception as e:
             raise Exception(f"Error retrieving data from PostgreSQL: {e}")
     else:
         raise Exception("Invalid storage_method in config.")
 
-    # Ensure the index is in datetime format.
-    local_data.index = pd.to_datetime(local_data.index)
+    if target_date is not None and storage_method not in ('parquet', 'mmap'):
+        # Slice the day out of the full history using the trading-day index
+        local_data = slice_trading_day(ticker, local_data, target_date)
+    else:
+        # The cached frame is shared, work on a shallow copy
+        local_data = local_data.copy(deep=False)
 
-    # If a specific date is provided, filter the data to include only that day.
-    if date is not None:
-        try:
-            # Convert the date string to a date object.
-            target_date = datetime.strptime(date, "%Y-%m-%d").date()
-            # Filter local_data: compare the date portion of the index
-            local_data = local_data[local_data.index.date == target_date]
-        except Exception as e:
-            raise Exception(f"Error processing the date parameter: {e}")
+    if market != None:
+        # 过滤 market 列为 'intraday' 的数据
+        local_data = local_data[session_mask(local_data, market)]
 
     return local_data
 
 
+def get_simulation_bars(ticker, date, market=None):
+    """
+    Retrieve the bars of a ticker and day for the trade simulator (see core/trading/simulator.py).
+
+    With the "mmap" storage method, the mapped records of the day are returned as they are
+    (a zero-copy view, see core/data/mmap_store.py), so no DataFrame is built. Other storage
+    methods return the DataFrame of get_local_data.
+
+    Parameters:
+      ticker (str): The stock ticker symbol.
+      date (str): A date string in "YYYY-MM-DD" format.
+      market (str, optional): Only return the bars of this session, e.g. "intraday".
+
+    Raises:
+      Exception: If the data cannot be retrieved.
+    """
+    if settings.CONFIG.get('storage_method', 'csv') != 'mmap':
+        return get_local_data(ticker, date=date, market=market)
+    try:
+        target_date = datetime.strptime(date, "%Y-%m-%d").date()
+    except Exception as e:
+        raise Exception(f"Error processing the date parameter: {e}")
+    records = read_mmap_bars(ticker, _mmap_dir(), start=target_date, end=target_date)
+    if records is None:
+        raise Exception(f"Error reading bars file: No bars file for {ticker}")
+    return records if market is None else session_bars(records, market)
+
+
 def get_all_stock_list():
     """
     Retrieve a list of stocks that have local data stored.
 
+    The list is read from the stock catalog that store_stock_data maintains, so it costs
+    one small query however many tickers and bars are stored. If the catalog is empty
+    (data stored before the catalog existed), it is rebuilt once from storage.
+
     For each stock, this function returns a dictionary with:
-      - 'ticker': the stock ticker (extracted from CSV filename or from the database)
+      - 'ticker': the stock ticker
       - 'start_date': the earliest date in the stored data (as a string, e.g., "YYYY-MM-DD")
       - 'end_date': the latest date in the stored data (as a string)
+      - 'row_count', 'trading_day_count' and 'last_refreshed' from the catalog
 
     Returns:
       List[dict]: A list of dictionaries, one for each stock.
     """
-    stock_list = []
-    storage_method = settings.CONFIG.get('storage_method', 'csv')
+    from core.models import StockCatalog
+    from core.data.catalog import rebuild_stock_catalog, to_market_time
 
-    if storage_method == 'csv':
-        # Get the CSV directory from config
-        csv_dir = os.path.join(settings.BASE_DIR, settings.CONFIG.get("csv_data_dir", "csv_data"))
-        if os.path.exists(csv_dir):
-            # Iterate over files ending with .csv in the directory
-            for filename in os.listdir(csv_dir):
-                if filename.endswith(".csv"):
-                    ticker = filename[:-4]  # remove '.csv'
-                    try:
-                        data = pd.read_csv(os.path.join(csv_dir, filename), index_col=0, parse_dates=True)
-                        data.index = pd.to_datetime(data.index)
-                        if not data.empty:
-                            start_date = data.index.min().strftime("%Y-%m-%d")
-                            end_date = data.index.max().strftime("%Y-%m-%d")
-                            stock_list.append({
-                                "ticker": ticker,
-                                "stock_name": ticker,
-                                "start_date": start_date,
-                                "end_date": end_date
-                            })
-                    except Exception as e:
-                        print(f"Error processing file {filename}: {e}")
-    elif storage_method == 'postgres':
+    entries = list(StockCatalog.objects.all())
+    if not entries:
         try:
-            from core.models import StockData
-
-            # 查询所有不同的 ticker
-            tickers = set(StockData.objects.values_list('ticker', flat=True))
-            print('---------------ticker_list:', tickers)
-            # 用来存储最终的合并结果
-            stock_list = []
-
-            for ticker in tickers:
-
-                # 获取所有与 ticker 相关的记录，并按日期排序
-                qs = StockData.objects.filter(ticker=ticker).order_by('date')
-
-                if qs.exists():
-                    # 获取最早的日期（start_date）和最晚的日期（end_date）
-                    start_date = qs.first().date.strftime("%Y-%m-%d")  # 最早的日期
-                    end_date = qs.last().date.strftime("%Y-%m-%d")  # 最晚的日期
-
-                    # 添加到 stock_list 中
-                    stock_list.append({
-                        "ticker": ticker,
-                        "stock_name": ticker,  # 这里假设股票名称就是 ticker，具体根据需求调整
-                        "start_date": start_date,
-                        "end_date": end_date
-                    })
-
+            if rebuild_stock_catalog():
+                entries = list(StockCatalog.objects.all())
         except Exception as e:
-            print(f"Error retrieving stocks from PostgreSQL: {e}")
+            print(f"Error rebuilding the stock catalog: {e}")
+
+    stock_list = []
+    for entry in entries:
+        stock_list.append({
+            "ticker": entry.ticker,
+            "stock_name": entry.ticker,
+            "start_date": to_market_time(entry.first_timestamp).strftime("%Y-%m-%d"),
+            "end_date": to_market_time(entry.last_timestamp).strftime("%Y-%m-%d"),
+            "row_count": entry.row_count,
+            "trading_day_count": entry.trading_day_count,
+            "last_refreshed": entry.last_refreshed,
+        })
     return stock_list
 
 
 def query_local_stock_data(ticker, start_date, end_date, interval='1d'):
     """
-    Fetches local stock data from CSV or PostgreSQL based on the ticker, start_date,
-    end_date, and interval provided. The function supports intervals like '1d' and '1m'.
+    Fetches local stock data from CSV, Parquet or PostgreSQL based on the ticker, start_date,
+    end_date, and interval provided. The function supports '1d', '1m' and the chart
+    intervals of the bar pyramid ('5m', '15m', '30m', '1h' and multiples of them).
 
     Args:
       ticker (str): The stock ticker symbol (e.g., 'AAPL').
@@ -154,10 +301,12 @@ def query_local_stock_data(ticker, start_date, end_date, interval='1d'):
       interval (str): The data interval. Possible values are '1d', '1m', etc.
 
     Returns:
-      list: A list of dictionaries with keys ['date', 'open', 'close', 'high', 'low', 'volume'].
+      list: For '1d', one dictionary per trading day with the bars of each market session
+            (see get_session_bars); for '1m', the minute bars as dictionaries; for other
+            intervals, the aggregated bars with their Datetime (see get_interval_bars).
     """
 
-    # Determine the storage method (CSV or PostgreSQL)
+    # Determine the storage method (CSV, Parquet or PostgreSQL)
     storage_method = settings.CONFIG.get("storage_method", "csv")
 
     # Convert string dates to datetime objects
@@ -165,96 +314,16 @@ def query_local_stock_data(ticker, start_date, end_date, interval='1d'):
     end_date = datetime.strptime(end_date, '%Y-%m-%d')
 
     if interval == '1d':
-        # For "1d" interval, process minute-level data to calculate daily open, close, high, low, volume
-        stock_data = []
-        if storage_method == "csv":
-            # Load CSV file if data is stored in CSV format
-            csv_dir = os.path.join(settings.BASE_DIR, settings.CONFIG.get("csv_data_dir", "csv_data"))
-            csv_path = os.path.join(csv_dir, f"{ticker}.csv")
-            if os.path.exists(csv_path):
-                df = pd.read_csv(csv_path, index_col=0, parse_dates=True)
-                # set end_date to be next day, make sure it works when start_date = end_date
-                end_date = end_date + pd.Timedelta(days=1)
-                df = df[(df.index >= start_date) & (df.index < end_date)]
-                if df.empty:
-                    return []
-                # Group by day and calculate Open, Close, High, Low, and Volume
-                daily_data = df.groupby('Market').resample('D').agg({
-                    'Open': 'first',  # First minute's open
-                    'Close': 'last',  # Last minute's close
-                    'High': 'max',  # Highest price
-                    'Low': 'min',  # Lowest price
-                    'Volume': 'sum'  # Sum of volumes
-                })
-
-                # 重新调整索引，将 Market 和 Date 重置为列
-                daily_data = daily_data.reset_index()
-
-                # 获取所有独特的日期
-                unique_dates = daily_data['Datetime'].unique()
-
-                for date in unique_dates:
-                    # 过滤出该日期的数据
-                    day_data = daily_data[daily_data['Datetime'] == date]
-                    # 将 numpy.datetime64 转换为 pandas Timestamp 并格式化为字符串（去掉时分秒）
-                    formatted_date = pd.to_datetime(date).strftime('%Y-%m-%d')
-
-                    # 将同一天的不同市场数据合并成一个字典对象
-                    day_dict = {
-                        'date': formatted_date,
-                        'markets': {}
-                    }
-                    # 遍历该天的不同 Market 数据
-                    for _, row in day_data.iterrows():
-                        market = row['Market']
-                        day_dict['markets'][market] = {
-                            'Open': round(row['Open'], 2),
-                            'Close': round(row['Close'], 2),
-                            'High': round(row['High'], 2),
-                            'Low': round(row['Low'], 2),
-                            'Volume': row['Volume']
-                        }
-
-                    # Convert the daily data to a list of dictionaries
-                    stock_data.append(day_dict)
-
-        elif storage_method == "postgres":
-            # Use PostgreSQL if data is stored in PostgreSQL
-            from core.models import StockData
-            from django.db.models import Q
-            stock_data_query = StockData.objects.filter(
-                Q(ticker=ticker) & Q(date__range=[start_date, end_date])).order_by('date')
-
-            # Convert query result to pandas DataFrame
-            df = pd.DataFrame(list(stock_data_query.values('date', 'open', 'high', 'low', 'close', 'volume')))
-            print('--------------df：', df)
-            # Resample data by day and calculate daily statistics
-            df['date'] = pd.to_datetime(df['date'])
-            df.set_index('date', inplace=True)
-            daily_data = df.resample('D').agg({
-                'open': 'first',  # First minute's open
-                'close': 'last',  # Last minute's close
-                'high': 'max',  # Highest price
-                'low': 'min',  # Lowest price
-                'volume': 'sum'  # Sum of volumes
-            })
-
-            # Convert to dictionary
-            stock_data = daily_data.reset_index().to_dict(orient='records')
-
-        else:
-            raise ValueError("Invalid storage method specified.")
-
-        return stock_data
+        # Daily bars are aggregated per session at ingest time (see core/data/dailybars.py),
+        # whatever the storage method
+        return get_session_bars(ticker, start_date.date(), end_date.date())
 
     elif interval == '1m':
         # For "1m" interval, we return minute-level data as is
-        if storage_method == "csv":
-            # Load CSV data for minute-level data
-            csv_dir = os.path.join(settings.BASE_DIR, settings.CONFIG.get("csv_data_dir", "csv_data"))
-            csv_path = os.path.join(csv_dir, f"{ticker}.csv")
-            if os.path.exists(csv_path):
-                df = pd.read_csv(csv_path, index_col=0, parse_dates=True)
+        if storage_method in ("csv", "parquet", "mmap"):
+            # Load minute-level data from the CSV file, the Parquet partitions or the bars file
+            df = _read_file_frame(ticker, storage_method, start_date, end_date)
+            if df is not None:
                 df = df[(df.index >= start_date) & (df.index <= end_date)]
                 if df.empty:
                     return []
@@ -274,7 +343,13 @@ def query_local_stock_data(ticker, start_date, end_date, interval='1d'):
             raise ValueError("Invalid storage method specified.")
 
     else:
-        raise ValueError(f"Unsupported interval: {interval}")
+        # Other intervals are read from the bar pyramid (see core/data/intervalbars.py)
+        try:
+            source_level(interval)
+        except Exception:
+            raise ValueError(f"Unsupported interval: {interval}")
+        bars = get_interval_bars(ticker, start_date.date(), end_date.date(), interval)
+        return bars.reset_index().to_dict(orient='records')
 
 def get_previous_intraday_close(ticker, curent_date):
         """
@@ -284,18 +359,35 @@ def get_previous_intraday_close(ticker, curent_date):
         :param csv_path: 数据文件的路径
         :param start_date: 查询的起始日期，格式为 datetime 对象
         :return: 上一个交易日的日期或错误消息
-        """
-        # Load CSV file if data is stored in CSV format
-        csv_dir = os.path.join(settings.BASE_DIR, settings.CONFIG.get("csv_data_dir", "csv_data"))
-        csv_path = os.path.join(csv_dir, f"{ticker}.csv")
-        if os.path.exists(csv_path):
-            df = pd.read_csv(csv_path, index_col=0, parse_dates=True)
-            if df.empty:
-                return {}
 
+        The trading-day index answers this with one lookup and returns {'Close': prev_close}.
+        Data without an index falls back to scanning the stored bars, which returns the whole
+        16:00 bar.
+        """
         # 确保 start_date 是 datetime 对象
         current_date = pd.to_datetime(curent_date)
 
+        found, prev_close = get_previous_close(ticker, current_date.date())
+        if found:
+            return {} if prev_close is None else {'Close': prev_close}
+
+        storage_method = settings.CONFIG.get('storage_method', 'csv')
+        if storage_method in ('parquet', 'mmap'):
+            # Only the days of the previous trading day and current_date are read
+            if storage_method == 'parquet':
+                list_dates, read_frame, data_dir = list_partition_dates, read_parquet_frame, _parquet_dir()
+            else:
+                list_dates, read_frame, data_dir = list_mmap_dates, read_mmap_frame, _mmap_dir()
+            dates = [d for d in list_dates(ticker, data_dir) if d <= current_date.date()]
+            if not dates or dates[-1] != current_date.date():
+                return {}
+            df = read_frame(ticker, data_dir, start=dates[max(len(dates) - 2, 0)], end=dates[-1])
+        else:
+            # Load CSV file if data is stored in CSV format
+            df = _load_csv_frame(ticker)
+            if df is None or df.empty:
+                return {}
+
         # 获取 start_date 对应日期的所有数据
         day_data = df[df.index.date == current_date.date()]
 
@@ -346,7 +438,9 @@ def add_stock(new_stock):
 
 def get_stock_info_by_date(ticker, date):
 
-    stock_data = query_local_stock_data(ticker, date, date, '1d')
+    # Read the day's session bars directly
+    day = pd.Timestamp(date).date()
+    stock_data = get_session_bars(ticker, day, day)
     if not stock_data:
         print('date:', date, ' has no data.')
         return {}
@@ -375,4 +469,58 @@ def get_stock_info_by_date(ticker, date):
             'pre_market_change': pre_market_change,
             'intraday_open': intraday_open,
             'intraday_close': intraday_close,
-            'intraday_change:': intraday_change}
\ No newline at end of file
+            'intraday_change:': intraday_change}
+
+
+def get_stock_info_by_range(ticker, start_date, end_date):
+    """
+    Range variant of get_stock_info_by_date for every trading day from start_date to end_date.
+
+    The session bars of the whole window are read with one query, the previous closes with
+    another, and the changes are computed for all days at once. Days that are not in the
+    trading-day index fall back to get_previous_intraday_close.
+
+    Parameters:
+      ticker (str): The stock ticker symbol.
+      start_date, end_date (date, datetime or str): The date range (inclusive).
+
+    Returns:
+      list: One dictionary per trading day with date ('YYYY-MM-DD'), pre_market_open,
+            pre_market_close, pre_market_change, intraday_open, intraday_close,
+            intraday_change and prev_close. Days without intraday bars are skipped;
+            changes whose base price is 0 are 0.
+    """
+    start = pd.Timestamp(start_date).date()
+    end = pd.Timestamp(end_date).date()
+    days = [day for day in get_session_bars(ticker, start, end) if 'intraday' in day['markets']]
+    if not days:
+        return []
+    prev_closes = get_previous_closes(ticker, start, end)
+
+    frame = pd.DataFrame({
+        'date': [day['date'] for day in days],
+        'pre_market_open': [day['markets'].get('pre-market', {}).get('Open', 0) for day in days],
+        'pre_market_close': [day['markets'].get('pre-market', {}).get('Close', 0) for day in days],
+        'intraday_open': [day['markets']['intraday']['Open'] for day in days],
+        'intraday_close': [day['markets']['intraday']['Close'] for day in days],
+    }, dtype=object).astype({'pre_market_open': float, 'pre_market_close': float,
+                             'intraday_open': float, 'intraday_close': float})
+    prev_close = []
+    for date_str in frame['date']:
+        day = datetime.strptime(date_str, "%Y-%m-%d").date()
+        if day in prev_closes:
+            prev_close.append(prev_closes[day])
+        else:
+            prev_close.append(get_previous_intraday_close(ticker, date_str).get('Close'))
+    frame['prev_close'] = pd.Series(prev_close, dtype=float)
+
+    # 盘前的涨跌幅是根据前一天盘中的收盘价为基准计算的
+    base = frame['prev_close'].fillna(frame['pre_market_open'])
+    frame['pre_market_change'] = ((frame['pre_market_close'] - base) / base * 100).where(base != 0, 0.0)
+    frame['intraday_change'] = ((frame['intraday_close'] - frame['intraday_open'])
+                                / frame['intraday_open'] * 100).where(frame['intraday_open'] != 0, 0.0)
+    records = frame.to_dict('records')
+    for record in records:
+        if pd.isna(record['prev_close']):
+            record['prev_close'] = None
+    return records
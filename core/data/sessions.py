@@ -0,0 +1,88 @@
+"""
+Module to classify bars into market sessions.
+
+Sessions are derived from the time of day of each bar (US/Eastern wall-clock time):
+  - From 04:00:00 (inclusive) to 09:30:00 (exclusive): "pre-market"
+  - From 09:30:00 (inclusive) to 16:00:00 (inclusive): "intraday"
+  - From 16:01:00 (inclusive) to 19:59:59 (inclusive): "post-market"
+  - Otherwise: "unknown"
+
+The classification is computed on whole index arrays (seconds since midnight) instead
+of per row, and the result is a categorical with fixed categories. The position of a
+session in MARKET_SESSIONS is its integer code, so filters can compare small integers.
+"""
+import numpy as np
+import pandas as pd
+
+# Bars are stored in market time (naive in CSV/Parquet, tz-aware in PostgreSQL)
+MARKET_TIMEZONE = 'US/Eastern'
+
+# Session names; the list position is the session code
+MARKET_SESSIONS = ['unknown', 'pre-market', 'intraday', 'post-market']
+SESSION_CODES = {name: code for code, name in enumerate(MARKET_SESSIONS)}
+SESSION_DTYPE = pd.CategoricalDtype(categories=MARKET_SESSIONS)
+
+# Session boundaries in seconds since midnight
+PRE_MARKET_START = 4 * 3600
+INTRADAY_START = 9 * 3600 + 30 * 60
+INTRADAY_END = 16 * 3600
+POST_MARKET_START = 16 * 3600 + 60
+POST_MARKET_END = 19 * 3600 + 59 * 60 + 59
+
+
+def session_codes(index):
+    """
+    Return the session code of every timestamp in a DatetimeIndex.
+
+    Parameters:
+      index (DatetimeIndex): Bar timestamps in market time (naive or tz-aware).
+
+    Returns:
+      ndarray: int8 session codes, see MARKET_SESSIONS.
+    """
+    index = pd.DatetimeIndex(index)
+    seconds = (index.hour.to_numpy() * 3600 + index.minute.to_numpy() * 60 + index.second.to_numpy())
+    conditions = [
+        (seconds >= PRE_MARKET_START) & (seconds < INTRADAY_START),
+        (seconds >= INTRADAY_START) & (seconds <= INTRADAY_END),
+        (seconds >= POST_MARKET_START) & (seconds <= POST_MARKET_END),
+    ]
+    choices = [SESSION_CODES['pre-market'], SESSION_CODES['intraday'], SESSION_CODES['post-market']]
+    return np.select(conditions, choices, default=SESSION_CODES['unknown']).astype(np.int8)
+
+
+def classify_sessions(index):
+    """
+    Return the market session of every timestamp as a categorical.
+    """
+    return pd.Categorical.from_codes(session_codes(index), dtype=SESSION_DTYPE)
+
+
+def as_session_category(values):
+    """
+    Convert stored session names (e.g. strings read from a CSV file) to the session categorical.
+    """
+    return pd.Categorical(values, dtype=SESSION_DTYPE)
+
+
+def session_mask(data, market):
+    """
+    Return a boolean mask selecting the rows of data that belong to the given session.
+
+    Categorical Market columns are compared by integer code; other columns fall back
+    to comparing strings.
+    """
+    column = data['Market']
+    if isinstance(column.dtype, pd.CategoricalDtype) and column.dtype == SESSION_DTYPE:
+        return column.cat.codes.to_numpy() == SESSION_CODES.get(market, -1)
+    return (column == market).to_numpy()
+
+
+def market_time_index(index):
+    """
+    Return index as naive market-time timestamps (tz-aware indexes are converted first).
+    """
+    index = pd.DatetimeIndex(index)
+    if index.tz is not None:
+        index = index.tz_convert(MARKET_TIMEZONE).tz_localize(None)
+    return index
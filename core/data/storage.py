@@ -1,33 +1,70 @@
 """
 Module to store stock data.
-Depending on the configuration, data is stored either in CSV files or in PostgreSQL via Django models.
+Depending on the configuration, data is stored in CSV files, in day-partitioned Parquet files,
+or in PostgreSQL via Django models.
 """
+import io
 import os
 import pandas as pd
 from core.models import StockData, StockInfo, AnalystRecommendation
-from datetime import time as dtime, datetime
-from django.db import IntegrityError
+from datetime import datetime
+from django.db import IntegrityError, connection, transaction
+from core.data.cache import invalidate_ticker
+from core.data.catalog import update_stock_catalog, catalog_entry_from_frame
+from core.data.dayindex import update_day_index, rebuild_day_index
+from core.data.dailybars import update_session_bars, rebuild_session_bars
+from core.data.intervalbars import update_interval_bars, rebuild_interval_bars
+from core.data.locks import ticker_lock
+from core.analysis.online import update_online_indicators, rebuild_online_indicators
+from core.data.sessions import classify_sessions, market_time_index
+
+# Number of rows sent per INSERT statement when bulk storing into the database
+BULK_BATCH_SIZE = 1000
+# Bytes read per step when reading a CSV file backwards from its end
+CSV_TAIL_BLOCK_SIZE = 64 * 1024
 
 
 def store_stock_data(ticker, data, config):
     """
     Store the fetched stock data after adjusting it.
 
-    If storage_method is "csv", the function reads any existing CSV file for the ticker.
-    It then determines which dates are not already stored and appends only new data.
+    Bars are merged at minute granularity (upsert): a fetched bar replaces the stored bar
+    with the same timestamp, new bars are added, and the stored bars stay in timestamp order.
 
-    If storage_method is "postgres", it uses get_or_create to avoid duplicate entries.
+    If storage_method is "csv", only the end of the ticker's CSV file from the first fetched
+    trading day on is read. New bars after the last stored bar are appended to it; any
+    other change reads the whole file and rewrites it (to a temporary file first).
+
+    If storage_method is "parquet", only the partitions of the days that change are rewritten.
+
+    If storage_method is "mmap", new bars after the last stored bar are appended to the
+    ticker's binary bars file; any other change rewrites the file.
+
+    If storage_method is "postgres", new rows are inserted in chunked bulk inserts within a
+    single transaction, and stored rows whose values changed are replaced.
 
     Parameters:
       ticker (str): The stock ticker symbol.
       data (DataFrame): The stock data.
       config (dict): The configuration dictionary loaded from config.yaml.
 
+    Writers of a ticker are serialized with its write lock (see core/data/locks.py).
+
     Raises:
       Exception: If storage fails.
     """
+    with ticker_lock(ticker, config):
+        _store_stock_data(ticker, data, config)
+
+
+def _store_stock_data(ticker, data, config):
     # Adjust the data (remove timezone info and add MarketSession column)
     adjusted_data = adjust_data(data)
+    adjusted_data = adjusted_data[~adjusted_data.index.duplicated(keep='last')].sort_index()
+    # First trading day touched by the merge; stored bars before it keep their positions
+    first_day = market_time_index(adjusted_data.index).min().date() if not adjusted_data.empty else None
+    # Stored bars from first_day on, or None if the whole day index has to be rebuilt
+    tail = None
 
     method = config.get('storage_method', 'csv')
     if method == 'csv':
@@ -36,68 +73,324 @@ def store_stock_data(ticker, data, config):
             adjusted_data.index = adjusted_data.index.tz_localize(None)
         # CSV storage
         csv_path = os.path.join(config.get('csv_data_dir', 'csv_data'), f"{ticker}.csv")
-        # If the CSV file exists, read it and then append only new data.
-        if os.path.exists(csv_path):
+        had_rows = os.path.exists(csv_path)
+        if had_rows:
             try:
-                existing_data = pd.read_csv(csv_path, index_col=0, parse_dates=True)
+                # Stored bars before the first fetched day cannot overlap the fetched ones
+                existing_data = read_csv_tail(csv_path, first_day) if first_day is not None else None
+                if existing_data is not None:
+                    merged, new_data, rewrite = merge_bars(existing_data, adjusted_data)
+                if existing_data is None or rewrite:
+                    existing_data = pd.read_csv(csv_path, index_col=0, parse_dates=True, float_precision='round_trip')
+                    merged, new_data, rewrite = merge_bars(existing_data, adjusted_data)
             except Exception as e:
                 raise Exception(f"Error reading existing CSV file: {e}")
-
-            # Determine which dates are already stored.
-            # We'll compare date strings (YYYY-MM-DD).
-            existing_dates = set(existing_data.index.strftime("%Y-%m-%d"))
-
-            # Filter adjusted_data to include only rows with dates not already stored.
-            new_data = adjusted_data[~adjusted_data.index.strftime("%Y-%m-%d").isin(existing_dates)]
-
-            if new_data.empty:
-                # No new data to append; do nothing.
-                return
-            else:
-                # Append new data to the CSV file.
-                try:
-                    # Append without writing header.
+            try:
+                if rewrite:
+                    # Write to a temporary file first so readers never see a half-written file
+                    tmp_path = csv_path + ".tmp"
+                    merged.to_csv(tmp_path, index=True)
+                    os.replace(tmp_path, csv_path)
+                elif not new_data.empty:
+                    # All new bars come after the stored ones; append without writing header.
                     new_data.to_csv(csv_path, mode='a', header=False)
-                except Exception as e:
-                    raise Exception(f"Error appending new data to CSV: {e}")
+            except Exception as e:
+                raise Exception(f"Error writing new data to CSV: {e}")
+            if existing_data.index.is_monotonic_increasing and first_day is not None:
+                tail = merged[merged.index >= pd.Timestamp(first_day)]
+            added_days = len(set(new_data.index.date) - set(existing_data.index.date))
         else:
             # CSV file does not exist; create a new one.
+            new_data = adjusted_data
             try:
                 adjusted_data.to_csv(csv_path, index=True)
             except Exception as e:
                 raise Exception(f"Error writing CSV: {e}")
+            added_days = new_data.index.normalize().nunique()
+        added_index = new_data.index
+    elif method == 'parquet':
+        from core.data.parquet_store import write_parquet_partitions, list_partition_dates, read_parquet_frame
+        # Partitions are keyed by the local (US/Eastern) trading day
+        if adjusted_data.index.tz is not None:
+            adjusted_data.index = adjusted_data.index.tz_localize(None)
+        parquet_dir = config.get('parquet_data_dir', 'parquet_data')
+        stored_dates = set(list_partition_dates(ticker, parquet_dir))
+        had_rows = bool(stored_dates)
+        try:
+            added_index = write_parquet_partitions(ticker, adjusted_data, parquet_dir)
+        except Exception as e:
+            raise Exception(f"Error writing Parquet partitions: {e}")
+        added_days = len(set(added_index.date) - stored_dates)
+        if had_rows and first_day is not None:
+            tail = read_parquet_frame(ticker, parquet_dir, start=first_day)
+    elif method == 'mmap':
+        from core.data.mmap_store import write_mmap_bars, list_mmap_dates, read_mmap_frame
+        if adjusted_data.index.tz is not None:
+            adjusted_data.index = adjusted_data.index.tz_localize(None)
+        mmap_dir = config.get('mmap_data_dir', 'mmap_data')
+        stored_dates = set(list_mmap_dates(ticker, mmap_dir))
+        had_rows = bool(stored_dates)
+        try:
+            added_index = write_mmap_bars(ticker, adjusted_data, mmap_dir)
+        except Exception as e:
+            raise Exception(f"Error writing bars file: {e}")
+        added_days = len(set(added_index.date) - stored_dates)
+        if had_rows and first_day is not None:
+            tail = read_mmap_frame(ticker, mmap_dir, start=first_day)
     elif method == 'postgres':
         print('In store_stock_data postgres')
         # PostgreSQL storage using the StockData model
         try:
-            for index, row in adjusted_data.iterrows():
-                # Ensure index is datetime
-                #dt = index.to_pydatetime() if hasattr(index, 'to_pydatetime') else index
-
-                StockData.objects.get_or_create(
-                    ticker=ticker,
-                    date=index,
-                    defaults={
-                        'open': row['Open'],
-                        'high': row['High'],
-                        'low': row['Low'],
-                        'close': row['Close'],
-                        'volume': int(row['Volume']),
-                        'market': row['Market']
-                    }
-                )
+            had_rows = StockData.objects.filter(ticker=ticker).exists()
+            added_index, added_days = bulk_store_stock_rows(ticker, adjusted_data)
         except Exception as e:
             raise Exception(f"Error storing in PostgreSQL: {e}")
+        if had_rows and first_day is not None:
+            tail = read_stored_frame(ticker, config, start=first_day)
     else:
         raise Exception("Invalid storage_method in config.")
 
+    if not had_rows:
+        # Nothing was stored before, the catalog, day index, session bars, pyramid and online indicators describe just these rows
+        added_data = adjusted_data[adjusted_data.index.isin(added_index)]
+        catalog_entry_from_frame(ticker, added_data)
+        rebuild_day_index(ticker, added_data)
+        rebuild_session_bars(ticker, added_data)
+        rebuild_interval_bars(ticker, added_data)
+        rebuild_online_indicators(ticker, added_data)
+    else:
+        stored_data = None
+        if not update_stock_catalog(ticker, added_index, added_days):
+            # Data stored before the catalog existed
+            stored_data = read_stored_frame(ticker, config)
+            catalog_entry_from_frame(ticker, stored_data)
+        if first_day is not None and (tail is None or not update_day_index(ticker, tail, first_day)):
+            # The stored bars were out of order (or there is no index yet)
+            if stored_data is None:
+                stored_data = read_stored_frame(ticker, config)
+            rebuild_day_index(ticker, stored_data)
+        if first_day is not None and (tail is None or not update_session_bars(ticker, tail, first_day)):
+            if stored_data is None:
+                stored_data = read_stored_frame(ticker, config)
+            rebuild_session_bars(ticker, stored_data)
+        if first_day is not None and (tail is None or not update_interval_bars(ticker, tail, first_day)):
+            if stored_data is None:
+                stored_data = read_stored_frame(ticker, config)
+            rebuild_interval_bars(ticker, stored_data)
+        if first_day is not None and (tail is None or not update_online_indicators(ticker, tail, first_day)):
+            if stored_data is None:
+                stored_data = read_stored_frame(ticker, config)
+            rebuild_online_indicators(ticker, stored_data)
+    # Cached frames of this ticker are stale now
+    invalidate_ticker(ticker)
+
+
+def merge_bars(existing, incoming):
+    """
+    Merge fetched bars into stored bars at minute granularity.
+
+    Parameters:
+      existing (DataFrame): The stored bars, in stored order.
+      incoming (DataFrame): The adjusted fetched bars, sorted and without duplicate timestamps.
+
+    Returns:
+      tuple: (merged, new_data, rewrite). merged holds all bars in timestamp order, new_data
+             the incoming bars that were not stored before, and rewrite is False if the stored
+             bars are unchanged and new_data can simply be appended after them.
+    """
+    overlap = incoming.index.isin(existing.index)
+    new_data = incoming[~overlap]
+    rewrite = not (existing.index.is_monotonic_increasing and existing.index.is_unique)
+    if overlap.any() and not rewrite:
+        columns = ['Open', 'High', 'Low', 'Close', 'Volume']
+        stored = existing.loc[incoming.index[overlap], columns].to_numpy(dtype=float)
+        rewrite = bool((stored != incoming.loc[overlap, columns].to_numpy(dtype=float)).any())
+    if not new_data.empty and len(existing) and new_data.index.min() <= existing.index.max():
+        rewrite = True
+    if not rewrite:
+        return pd.concat([existing, new_data]), new_data, False
+
+    existing = existing[~existing.index.duplicated(keep='last')]
+    merged = pd.concat([existing[~existing.index.isin(incoming.index)], incoming]).sort_index(kind='stable')
+    return merged, new_data, True
+
+
+def read_csv_tail(csv_path, start):
+    """
+    Read the rows of a CSV file from the trading day start on, without parsing the rows
+    before it.
+
+    The file is read backwards in blocks of CSV_TAIL_BLOCK_SIZE bytes until a row before
+    start is found, so the cost depends on the size of the tail, not of the file.
+
+    Parameters:
+      csv_path (str): A CSV file written by store_stock_data (timestamp index first).
+      start (date): The first trading day to read.
+
+    Returns:
+      DataFrame or None: The rows from start on (possibly empty), or None if the rows read
+                         are not in timestamp order, in which case the file has to be read
+                         in full.
+    """
+    start = pd.Timestamp(start)
+    with open(csv_path, 'rb') as f:
+        header = f.readline()
+        data_start = f.tell()
+        position = f.seek(0, os.SEEK_END)
+        body = b''
+        while position > data_start:
+            block_start = max(data_start, position - CSV_TAIL_BLOCK_SIZE)
+            f.seek(block_start)
+            body = f.read(position - block_start) + body
+            position = block_start
+            # The first line of the block may be cut; decide on the first complete one
+            lines = body.split(b'\n', 2)
+            if position > data_start and len(lines) > 2:
+                try:
+                    before_start = pd.Timestamp(lines[1].split(b',', 1)[0].decode()) < start
+                except (ValueError, TypeError):
+                    return None
+                if before_start:
+                    body = body[len(lines[0]) + 1:]
+                    break
+    # Parsed exactly, so that re-fetched bars compare equal to the stored ones
+    tail = pd.read_csv(io.BytesIO(header + body), index_col=0, parse_dates=True, float_precision='round_trip')
+    tail.index = pd.to_datetime(tail.index)
+    if tail.index.tz is not None or not tail.index.is_monotonic_increasing:
+        return None
+    return tail[tail.index >= start]
+
+
+def read_stored_frame(ticker, config, start=None):
+    """
+    Read the stored bars of a ticker, in stored order, for the given configuration.
+
+    Parameters:
+      ticker (str): The stock ticker symbol.
+      config (dict): The configuration dictionary loaded from config.yaml.
+      start (date, optional): Only return bars from this trading day on.
+
+    Returns:
+      DataFrame or None: None if nothing is stored for the ticker.
+    """
+    method = config.get('storage_method', 'csv')
+    if method == 'csv':
+        csv_path = os.path.join(config.get('csv_data_dir', 'csv_data'), f"{ticker}.csv")
+        if not os.path.exists(csv_path):
+            return None
+        data = pd.read_csv(csv_path, index_col=0, parse_dates=True)
+        return data if start is None else data[data.index >= pd.Timestamp(start)]
+    elif method == 'parquet':
+        from core.data.parquet_store import read_parquet_frame
+        return read_parquet_frame(ticker, config.get('parquet_data_dir', 'parquet_data'), start=start)
+    elif method == 'mmap':
+        from core.data.mmap_store import read_mmap_frame
+        return read_mmap_frame(ticker, config.get('mmap_data_dir', 'mmap_data'), start=start)
+    elif method == 'postgres':
+        from core.data.querier import _load_postgres_frame
+        data = _load_postgres_frame(ticker)
+        return data if start is None else data[data.index >= pd.Timestamp(start)]
+    raise Exception("Invalid storage_method in config.")
+
+
+def bulk_store_stock_rows(ticker, data, batch_size=BULK_BATCH_SIZE):
+    """
+    Upsert adjusted stock data into the StockData table with chunked bulk inserts.
+
+    All chunks are written in one transaction. The rows already stored in the fetched
+    range are read with one query: unchanged rows are skipped, and rows whose values
+    changed are deleted and inserted again. The unique (ticker, date) index guards against
+    rows written concurrently; tables created before it was added get it from
+    "python manage.py add_stock_data_unique_index" (see ensure_stock_data_unique_index).
+
+    Parameters:
+      ticker (str): The stock ticker symbol.
+      data (DataFrame): The adjusted stock data (with the Market column, tz-aware index).
+      batch_size (int): The number of rows per INSERT statement.
+
+    Returns:
+      tuple: (DatetimeIndex of the added rows, number of trading days that had no rows before)
+    """
+    if data.empty:
+        return data.index, 0
+    columns = ['Open', 'High', 'Low', 'Close', 'Volume']
+    with transaction.atomic():
+        # Read from the start of the first fetched day so partially stored days are recognised
+        stored = pd.DataFrame(list(StockData.objects.filter(
+            ticker=ticker, date__gte=data.index.min().normalize(), date__lte=data.index.max()
+        ).order_by('date', 'id').values_list('date', 'open', 'high', 'low', 'close', 'volume')),
+            columns=['Datetime'] + columns)
+        existing = pd.DatetimeIndex(pd.to_datetime(stored['Datetime'], utc=True))
+        if len(existing):
+            existing = existing.tz_convert(data.index.tz)
+        stored.index = existing
+        # Tables created without the unique index may hold a bar more than once
+        stored = stored[~stored.index.duplicated(keep='last')]
+        overlap = data.index.isin(existing)
+        new_data = data[~overlap]
+
+        # Stored rows whose values differ from the fetched bars are replaced
+        fetched = data[overlap]
+        changed = (stored.loc[fetched.index, columns].to_numpy(dtype=float)
+                   != fetched[columns].to_numpy(dtype=float)).any(axis=1)
+        replaced = fetched[changed]
+        for i in range(0, len(replaced), batch_size):
+            StockData.objects.filter(
+                ticker=ticker, date__in=list(replaced.index[i:i + batch_size].to_pydatetime())).delete()
+        write_data = pd.concat([new_data, replaced])
+
+        # Build the model instances from column arrays instead of iterating over rows
+        rows = [
+            StockData(ticker=ticker, date=dt, open=o, high=h, low=l, close=c, volume=int(v), market=m)
+            for dt, o, h, l, c, v, m in zip(
+                write_data.index.to_pydatetime(),
+                write_data['Open'].to_numpy(dtype=float).tolist(),
+                write_data['High'].to_numpy(dtype=float).tolist(),
+                write_data['Low'].to_numpy(dtype=float).tolist(),
+                write_data['Close'].to_numpy(dtype=float).tolist(),
+                write_data['Volume'].tolist(),
+                write_data['Market'].tolist(),
+            )
+        ]
+        StockData.objects.bulk_create(rows, batch_size=batch_size, ignore_conflicts=True)
+    added_days = len(set(new_data.index.date) - set(existing.date))
+    return new_data.index, added_days
+
+
+def ensure_stock_data_unique_index():
+    """
+    Add the unique (ticker, date) index to a StockData table created without it.
+
+    The app has no migrations, so "migrate --run-syncdb" does not change tables that already
+    exist. Duplicate bars are deleted first, keeping the last written row of each
+    (ticker, date); nothing is changed if a unique constraint on the columns exists.
+
+    Returns:
+      tuple: (number of duplicate rows deleted, True if the index was created)
+    """
+    table = StockData._meta.db_table
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(cursor, table)
+    if any(c['unique'] and c['columns'] == ['ticker', 'date'] for c in constraints.values()):
+        return 0, False
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {quote(table)} WHERE {quote('id')} NOT IN "
+            f"(SELECT MAX({quote('id')}) FROM {quote(table)} GROUP BY {quote('ticker')}, {quote('date')})")
+        deleted = cursor.rowcount
+        cursor.execute(f"CREATE UNIQUE INDEX {quote(f'{table}_ticker_date_uniq')} "
+                       f"ON {quote(table)} ({quote('ticker')}, {quote('date')})")
+    return deleted, True
+
 
 def adjust_data(data):
     """
     Adjust the fetched stock data before writing to storage.
 
     1. Remove any timezone information from the index.
-    2. Add a new column "MarketSession" based on the time of day:
+    2. Add a new column "Market" with the market session of each bar
+       (see core.data.sessions for the session boundaries):
          - From 04:00:00 (inclusive) to 09:30:00 (exclusive): "pre-market"
          - From 09:30:00 (inclusive) to 16:00:00 (inclusive): "intraday"
          - From 16:01:00 (inclusive) to 19:59:59 (inclusive): "post-market"
@@ -109,21 +402,8 @@ def adjust_data(data):
     Returns:
       DataFrame: The adjusted DataFrame.
     """
-
-    # Define a helper function to determine the market session based on time.
-    def get_market_session(dt):
-        t = dt.time()
-        if dtime(4, 0, 0) <= t < dtime(9, 30, 0):
-            return "pre-market"
-        elif dtime(9, 30, 0) <= t <= dtime(16, 0, 0):
-            return "intraday"
-        elif dtime(16, 1, 0) <= t <= dtime(19, 59, 59):
-            return "post-market"
-        else:
-            return "unknown"
-
-    # Add a new column "MarketSession" by applying the helper function to the index.
-    data["Market"] = data.index.map(get_market_session)
+    # Classify all bars at once; the column is a categorical with fixed session codes
+    data["Market"] = classify_sessions(data.index)
     return data
 
 
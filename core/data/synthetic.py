@@ -0,0 +1,43 @@
+"""
+Module to generate synthetic minute-level stock data.
+
+The generated frames have the same shape as the data returned by fetch_stock_data
+(US/Eastern DatetimeIndex named "Datetime", 04:00-19:59 extended hours, Open/High/Low/Close/Volume),
+so they can be used in tests and benchmarks without network access.
+"""
+import numpy as np
+import pandas as pd
+
+# Number of 1-minute bars between 04:00 and 19:59
+BARS_PER_DAY = 960
+
+
+def generate_minute_bars(start_day="2024-03-04", days=5, seed=0, start_price=100.0):
+    """
+    Generate 1-minute extended-hours bars for consecutive business days.
+
+    Parameters:
+      start_day (str): The first business day in "YYYY-MM-DD" format.
+      days (int): The number of business days to generate.
+      seed (int): The random seed, so the same arguments always give the same data.
+      start_price (float): The price the random walk starts from.
+
+    Returns:
+      DataFrame: The generated stock data.
+    """
+    rng = np.random.default_rng(seed)
+    index = []
+    for day in pd.bdate_range(start_day, periods=days):
+        index.extend(pd.date_range(day + pd.Timedelta(hours=4), periods=BARS_PER_DAY, freq="1min"))
+    index = pd.DatetimeIndex(index, name="Datetime").tz_localize("US/Eastern")
+
+    close = start_price + np.cumsum(rng.normal(0, 0.05, len(index)))
+    open_ = np.r_[close[0], close[:-1]]
+    spread = rng.uniform(0, 0.05, len(index))
+    return pd.DataFrame({
+        "Open": open_,
+        "High": np.maximum(open_, close) + spread,
+        "Low": np.minimum(open_, close) - spread,
+        "Close": close,
+        "Volume": rng.integers(100, 10000, len(index)),
+    }, index=index)
@@ -0,0 +1,57 @@
+"""
+Module with the trading calendar.
+
+Date-range loops (backtests, price queries) used to step through every calendar day and
+probe storage for each one, so weekends and holidays cost a read before the code found
+out they had no data. The calendar lists the sessions of a range up front:
+  - For stocks with a trading-day index (see core/data/dayindex.py), the sessions are the
+    days that have stored bars, read with a single query.
+  - Otherwise they are the weekdays that are not in calendar.holidays in config.yaml.
+"""
+import pandas as pd
+from django.conf import settings
+from core.models import TradingDay
+
+
+def get_holidays():
+    """
+    Return the market holidays configured in calendar.holidays as a set of dates.
+    """
+    holidays = (settings.CONFIG.get('calendar') or {}).get('holidays') or []
+    # YAML turns unquoted YYYY-MM-DD into dates, quoted ones stay strings
+    return {pd.Timestamp(str(day)).date() for day in holidays}
+
+
+def weekday_sessions(start, end):
+    """
+    Return the weekdays from start to end (inclusive) that are not configured holidays.
+    """
+    holidays = get_holidays()
+    return [day.date() for day in pd.bdate_range(pd.Timestamp(start).normalize(), pd.Timestamp(end).normalize())
+            if day.date() not in holidays]
+
+
+def trading_sessions(start, end, tickers=None):
+    """
+    Return the trading sessions from start to end (inclusive).
+
+    Parameters:
+      start, end (date, datetime or str): The date range.
+      tickers (list, optional): The stocks the caller is going to read. The sessions are
+                                the days on which any of them has stored bars. Without
+                                tickers, or if none of them is indexed, the weekday
+                                calendar minus the configured holidays is used.
+
+    Returns:
+      list: The session dates, in ascending order.
+    """
+    start_day = pd.Timestamp(start).date()
+    end_day = pd.Timestamp(end).date()
+    if start_day > end_day:
+        return []
+    if tickers:
+        tickers = list(dict.fromkeys(tickers))
+        if TradingDay.objects.filter(ticker__in=tickers).exists():
+            return list(TradingDay.objects.filter(ticker__in=tickers, date__range=(start_day, end_day))
+                        .order_by('date').values_list('date', flat=True).distinct())
+    return weekday_sessions(start_day, end_day)
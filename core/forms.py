@@ -135,4 +135,53 @@ class TradingOpeningForm(forms.Form):
     buy_price_up_ratio = forms.FloatField()
     quantity = forms.IntegerField(initial=10)
     take_profit = forms.FloatField()
-    stop_loss = forms.FloatField()
\ No newline at end of file
+    stop_loss = forms.FloatField()
+    # Stream one NDJSON record per day instead of a single JSON response
+    stream = forms.BooleanField(required=False)
+
+class OpeningSweepForm(forms.Form):
+    """
+    Form for a parameter sweep of the opening buy strategy.
+
+    buy_price_up_ratio, take_profit and stop_loss are given as ranges (start, stop, step);
+    without a step (or with stop <= start) only the start value is used.
+    """
+    start_date = forms.DateField(widget=forms.DateInput(attrs={'type': 'date'}))
+    end_date = forms.DateField(widget=forms.DateInput(attrs={'type': 'date'}))
+    pc_code = forms.CharField(max_length=10)
+    strategy = forms.ChoiceField(choices=TradingOpeningForm.strategy_choices)
+    buy_code1 = forms.CharField(max_length=10)
+    buy_code2 = forms.CharField(max_length=10)
+    quantity = forms.IntegerField(initial=10)
+    buy_price_up_ratio_start = forms.FloatField(initial=0)
+    buy_price_up_ratio_stop = forms.FloatField(required=False)
+    buy_price_up_ratio_step = forms.FloatField(required=False)
+    take_profit_start = forms.FloatField(initial=0.5)
+    take_profit_stop = forms.FloatField(required=False)
+    take_profit_step = forms.FloatField(required=False)
+    stop_loss_start = forms.FloatField(initial=0.5)
+    stop_loss_stop = forms.FloatField(required=False)
+    stop_loss_step = forms.FloatField(required=False)
+    top = forms.IntegerField(initial=50, min_value=1, required=False)
+
+class MACDStrategyForm(forms.Form):
+    """
+    Form for a backtest of the MACD strategy.
+    Intraday intervals only: positions are opened and closed within the intraday session.
+    """
+    ticker = forms.CharField(max_length=10)
+    start_date = forms.DateField(widget=forms.DateInput(attrs={'type': 'date'}))
+    end_date = forms.DateField(widget=forms.DateInput(attrs={'type': 'date'}))
+    interval = forms.ChoiceField(
+        choices=[("1m", "1m"), ("5m", "5m"), ("15m", "15m"), ("30m", "30m")], initial="5m")
+    fast = forms.IntegerField(initial=12, min_value=1)
+    slow = forms.IntegerField(initial=26, min_value=2)
+    signal = forms.IntegerField(initial=9, min_value=1)
+    quantity = forms.IntegerField(initial=10, min_value=1)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        fast, slow = cleaned_data.get('fast'), cleaned_data.get('slow')
+        if fast and slow and fast >= slow:
+            raise forms.ValidationError("The fast period must be shorter than the slow period.")
+        return cleaned_data
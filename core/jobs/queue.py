@@ -0,0 +1,181 @@
+"""
+Module with the database-backed fetch job queue.
+
+The dashboard only enqueues jobs (enqueue_fetch) and returns at once; the run_jobs
+management command claims queued jobs and runs them in a thread pool. Each job fetches
+the bars of one ticker since its last stored bar and stores them. All jobs of a worker
+share the fetcher's rate limiter, and their stores run one at a time.
+
+A job is claimed with a conditional UPDATE (queued -> running), so several workers can
+poll the same table without running a job twice.
+"""
+import re
+import threading
+import time
+import traceback
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+from core.models import FetchJob
+
+# Defaults for the jobs section of config.yaml
+DEFAULT_WORKERS = 4
+DEFAULT_POLL_INTERVAL = 1.0
+DEFAULT_STALE_MINUTES = 30
+
+# Jobs fetch concurrently but store one at a time: fetching is the slow, network-bound
+# part, and SQLite (the default database) allows only one writer
+_store_lock = threading.Lock()
+
+# Ticker symbols as used by the providers, e.g. AAPL, BRK-B, BRK.B, ^GSPC or EURUSD=X
+TICKER_PATTERN = re.compile(r'^[A-Z0-9^][A-Z0-9.\-=]{0,9}$')
+
+
+def is_valid_ticker(ticker):
+    """
+    Return whether ticker is an upper-case ticker symbol that fits FetchJob.ticker.
+    """
+    return bool(TICKER_PATTERN.match(ticker or ''))
+
+
+def enqueue_fetch(ticker, action='update'):
+    """
+    Queue a fetch of the given ticker, unless one is already queued or running.
+
+    Parameters:
+      ticker (str): The stock ticker symbol.
+      action (str): "add" for a new ticker, "update" for a stored one.
+
+    Returns:
+      tuple: (FetchJob, created). created is False if an active job was reused.
+
+    Raises:
+      Exception: If ticker is not a valid ticker symbol.
+    """
+    if not is_valid_ticker(ticker):
+        raise Exception(f"Invalid ticker: {ticker!r}")
+    active = FetchJob.objects.filter(ticker=ticker, status__in=FetchJob.ACTIVE_STATUSES).first()
+    if active is not None:
+        return active, False
+    try:
+        with transaction.atomic():
+            return FetchJob.objects.create(ticker=ticker, action=action), True
+    except IntegrityError:
+        # Another request queued the same ticker in the meantime
+        return FetchJob.objects.get(ticker=ticker, status__in=FetchJob.ACTIVE_STATUSES), False
+
+
+def job_to_dict(job):
+    """
+    Return the fields of a job shown by the polling endpoint.
+    """
+    return {
+        'id': job.id,
+        'ticker': job.ticker,
+        'action': job.action,
+        'status': job.status,
+        'progress': job.progress,
+        'message': job.message,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+def _set_progress(job, progress, message):
+    FetchJob.objects.filter(id=job.id).update(progress=progress, message=message)
+
+
+def claim_jobs(limit):
+    """
+    Claim up to limit queued jobs, oldest first.
+
+    Returns:
+      list: The claimed jobs, now in the running state.
+    """
+    claimed = []
+    candidates = FetchJob.objects.filter(status=FetchJob.STATUS_QUEUED).order_by('created_at')[:limit]
+    for job in candidates:
+        now = timezone.now()
+        # Only one worker wins the update from queued to running
+        if FetchJob.objects.filter(id=job.id, status=FetchJob.STATUS_QUEUED).update(
+                status=FetchJob.STATUS_RUNNING, started_at=now, progress=0, message='Started'):
+            job.status, job.started_at = FetchJob.STATUS_RUNNING, now
+            claimed.append(job)
+    return claimed
+
+
+def requeue_stale_jobs(minutes=DEFAULT_STALE_MINUTES):
+    """
+    Put running jobs that started more than minutes ago back in the queue
+    (their worker has stopped). Returns the number of requeued jobs.
+    """
+    limit = timezone.now() - timedelta(minutes=minutes)
+    return FetchJob.objects.filter(status=FetchJob.STATUS_RUNNING, started_at__lt=limit).update(
+        status=FetchJob.STATUS_QUEUED, progress=0, message='Requeued after the worker stopped')
+
+
+def run_job(job):
+    """
+    Fetch and store the bars of a claimed job and record the result.
+    """
+    # Imported here so the queue can be imported without the fetcher's dependencies
+    from core.data.fetcher import fetch_and_store
+    try:
+        _set_progress(job, 10, 'Fetching')
+        count = fetch_and_store(job.ticker, period="7d", interval="1m", store_lock=_store_lock,
+                                on_fetched=lambda n: _set_progress(job, 60, f'Storing {n} bars'))
+        FetchJob.objects.filter(id=job.id).update(
+            status=FetchJob.STATUS_DONE, progress=100, finished_at=timezone.now(),
+            message=f'{count} bars fetched and stored')
+    except Exception as e:
+        print(f"Error running job {job.id} ({job.ticker}): {e}")
+        traceback.print_exc()
+        FetchJob.objects.filter(id=job.id).update(
+            status=FetchJob.STATUS_FAILED, finished_at=timezone.now(), message=str(e))
+    finally:
+        # Worker threads open their own database connection
+        if not connection.in_atomic_block:
+            connection.close()
+
+
+def run_pending_jobs(limit=DEFAULT_WORKERS):
+    """
+    Claim up to limit queued jobs and run them one after another in this thread.
+
+    Returns:
+      int: The number of jobs run.
+    """
+    jobs = claim_jobs(limit)
+    for job in jobs:
+        run_job(job)
+    return len(jobs)
+
+
+def run_worker(workers=None, poll_interval=None, once=False):
+    """
+    Run queued jobs in a thread pool until interrupted.
+
+    Parameters:
+      workers (int, optional): The number of jobs run at the same time (default: jobs.workers).
+      poll_interval (float, optional): Seconds to wait when the queue is empty (default: jobs.poll_interval).
+      once (bool): Stop as soon as the queue is empty.
+    """
+    jobs_config = settings.CONFIG.get('jobs') or {}
+    workers = workers or jobs_config.get('workers', DEFAULT_WORKERS)
+    poll_interval = poll_interval or jobs_config.get('poll_interval', DEFAULT_POLL_INTERVAL)
+    requeue_stale_jobs(jobs_config.get('stale_minutes', DEFAULT_STALE_MINUTES))
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        running = set()
+        while True:
+            running = {future for future in running if not future.done()}
+            free = workers - len(running)
+            jobs = claim_jobs(free) if free > 0 else []
+            running.update(executor.submit(run_job, job) for job in jobs)
+            if not jobs:
+                if once and not running:
+                    return
+                time.sleep(poll_interval)
@@ -0,0 +1,20 @@
+"""
+Management command to add the unique (ticker, date) index to a StockData table created
+before it was declared (migrate --run-syncdb does not change existing tables).
+
+Usage:
+    python manage.py add_stock_data_unique_index
+"""
+from django.core.management.base import BaseCommand
+from core.data.storage import ensure_stock_data_unique_index
+
+
+class Command(BaseCommand):
+    help = "Delete duplicate StockData bars and add the unique (ticker, date) index if it is missing."
+
+    def handle(self, *args, **options):
+        deleted, created = ensure_stock_data_unique_index()
+        if created:
+            self.stdout.write(f"Deleted {deleted} duplicate bars and added the unique (ticker, date) index.")
+        else:
+            self.stdout.write("The unique (ticker, date) index already exists.")
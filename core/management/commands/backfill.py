@@ -0,0 +1,43 @@
+"""
+Management command to backfill minute bars of tickers beyond the 7-day fetch window
+(see core/data/backfill.py).
+
+Usage:
+    python manage.py backfill AAPL MSFT --start 2024-03-01 --end 2024-03-29 [--window-days 7] [--workers 8] [--retries 3]
+"""
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from core.data.backfill import backfill
+
+
+class Command(BaseCommand):
+    help = "Fetch the minute bars of tickers between two days in concurrent windows and store them."
+
+    def add_arguments(self, parser):
+        parser.add_argument("tickers", nargs="+", help="Stock ticker symbols.")
+        parser.add_argument("--start", type=date.fromisoformat, required=True, help="First day (YYYY-MM-DD).")
+        parser.add_argument("--end", type=date.fromisoformat, default=None, help="Last day (default: today).")
+        parser.add_argument("--interval", default="1m", help="Bar interval.")
+        parser.add_argument("--window-days", type=int, default=None, help="Days fetched per request.")
+        parser.add_argument("--workers", type=int, default=None, help="Windows fetched at the same time.")
+        parser.add_argument("--retries", type=int, default=3, help="Attempts per window.")
+
+    def handle(self, *args, **options):
+        end = options["end"] or date.today()
+        if end < options["start"]:
+            raise CommandError("--end is before --start")
+        failed = False
+        for ticker in options["tickers"]:
+            ticker = ticker.upper()
+            result = backfill(ticker, options["start"], end, interval=options["interval"],
+                              window_days=options["window_days"], max_workers=options["workers"],
+                              retries=options["retries"])
+            self.stdout.write(
+                f"{ticker}: {result['bars']} bars from {result['windows']} windows, fetched in "
+                f"{result['fetch_seconds']:.2f}s and stored in {result['store_seconds']:.2f}s "
+                f"({result['bars_per_second']:,.0f} bars/sec)")
+            for window, error in result['errors'].items():
+                failed = True
+                self.stderr.write(f"{ticker}: window {window} failed: {error}")
+        if failed:
+            raise CommandError("Some windows could not be fetched; run the backfill again to fill them.")
@@ -0,0 +1,71 @@
+"""
+Management command to benchmark storing minute bars into the StockData table.
+
+It runs against the configured database (SQLite by default, PostgreSQL when
+storage_method is "postgres") and rolls everything back at the end, so no
+benchmark rows are left behind.
+
+Usage:
+    python manage.py benchmark_ingest --days 7
+"""
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from core.models import StockData
+from core.data.storage import adjust_data, bulk_store_stock_rows
+from core.data.synthetic import generate_minute_bars
+
+
+class Command(BaseCommand):
+    help = "Benchmark per-row get_or_create against bulk ingest into the StockData table."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=7, help="Number of trading days of 1m bars to ingest.")
+        parser.add_argument("--ticker", default="BENCH", help="Ticker symbol used for the benchmark rows.")
+        parser.add_argument("--skip-legacy", action="store_true", help="Do not run the per-row get_or_create path.")
+
+    def handle(self, *args, **options):
+        data = adjust_data(generate_minute_bars(days=options["days"]))
+        ticker = options["ticker"]
+        self.stdout.write(f"Database: {connection.vendor}, rows per fetch: {len(data)}")
+
+        with transaction.atomic():
+            if not options["skip_legacy"]:
+                elapsed = self._timed(lambda: self._store_one_by_one(f"{ticker}_L", data))
+                self._report("get_or_create (per row)", len(data), elapsed)
+
+            elapsed = self._timed(lambda: bulk_store_stock_rows(ticker, data))
+            self._report("bulk_create (first fetch)", len(data), elapsed)
+
+            # A refresh sends the same bars again, all of them hit the unique constraint
+            elapsed = self._timed(lambda: bulk_store_stock_rows(ticker, data))
+            self._report("bulk_create (refresh)", len(data), elapsed)
+
+            # Leave the database as it was
+            transaction.set_rollback(True)
+
+    @staticmethod
+    def _timed(func):
+        start = time.perf_counter()
+        func()
+        return time.perf_counter() - start
+
+    def _report(self, label, rows, elapsed):
+        self.stdout.write(f"{label:<28} {rows} rows in {elapsed:.3f}s ({rows / elapsed:,.0f} rows/sec)")
+
+    @staticmethod
+    def _store_one_by_one(ticker, data):
+        # The ingest path used before bulk storing, kept here as the baseline
+        for index, row in data.iterrows():
+            StockData.objects.get_or_create(
+                ticker=ticker,
+                date=index,
+                defaults={
+                    'open': row['Open'],
+                    'high': row['High'],
+                    'low': row['Low'],
+                    'close': row['Close'],
+                    'volume': int(row['Volume']),
+                    'market': row['Market']
+                }
+            )
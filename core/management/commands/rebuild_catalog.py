@@ -0,0 +1,16 @@
+"""
+Management command to rebuild the stock catalog, trading-day index and session bars from the configured storage.
+
+Usage:
+    python manage.py rebuild_catalog
+"""
+from django.core.management.base import BaseCommand
+from core.data.catalog import rebuild_stock_catalog
+
+
+class Command(BaseCommand):
+    help = "Rebuild the stock catalog, trading-day index and session bars by scanning every stored ticker."
+
+    def handle(self, *args, **options):
+        count = rebuild_stock_catalog()
+        self.stdout.write(f"Stock catalog rebuilt with {count} tickers.")
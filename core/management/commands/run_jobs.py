@@ -0,0 +1,25 @@
+"""
+Management command to run the queued fetch jobs (see core/jobs/queue.py).
+
+Usage:
+    python manage.py run_jobs [--workers 4] [--poll-interval 1] [--once]
+"""
+from django.core.management.base import BaseCommand
+from core.jobs.queue import run_worker
+
+
+class Command(BaseCommand):
+    help = "Run queued stock fetch jobs in a thread pool."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=None, help="Number of jobs run at the same time.")
+        parser.add_argument("--poll-interval", type=float, default=None,
+                            help="Seconds to wait when the queue is empty.")
+        parser.add_argument("--once", action="store_true", help="Exit when the queue is empty.")
+
+    def handle(self, *args, **options):
+        self.stdout.write("Job worker started.")
+        try:
+            run_worker(options["workers"], options["poll_interval"], options["once"])
+        except KeyboardInterrupt:
+            self.stdout.write("Job worker stopped.")
@@ -20,11 +20,182 @@ class StockData(models.Model):
     class Meta:
         # Ensure that records are ordered by date and ticker code
         ordering = ['ticker', 'date']
+        # One bar per ticker and minute, so bulk ingest can skip rows that are already stored
+        unique_together = ('ticker', 'date')
         # Add an index for faster querying by ticker_code and date
         indexes = [
             models.Index(fields=['ticker', 'date']),
         ]
 
+class StockCatalog(models.Model):
+    """
+    One row per stored ticker, maintained by store_stock_data so the dashboard
+    does not have to scan the stored bars.
+    """
+    ticker = models.CharField(max_length=10, unique=True)
+    first_timestamp = models.DateTimeField()  # First stored bar
+    last_timestamp = models.DateTimeField()  # Last stored bar
+    row_count = models.BigIntegerField(default=0)
+    trading_day_count = models.IntegerField(default=0)
+    last_refreshed = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.ticker} ({self.first_timestamp:%Y-%m-%d} - {self.last_timestamp:%Y-%m-%d})"
+
+    class Meta:
+        ordering = ['ticker']
+
+class TradingDay(models.Model):
+    """
+    Per-ticker index of stored trading days, maintained by store_stock_data.
+
+    first_row/last_row are the positions of the day's bars in the ticker's stored
+    order, so a day can be sliced without scanning the history. close is the close
+    of the day's 16:00 bar; prev_date/prev_close point at the previous trading day.
+    """
+    ticker = models.CharField(max_length=10)
+    date = models.DateField()
+    first_row = models.BigIntegerField()
+    last_row = models.BigIntegerField()
+    close = models.FloatField(null=True, blank=True)
+    prev_date = models.DateField(null=True, blank=True)
+    prev_close = models.FloatField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.ticker} - {self.date}"
+
+    class Meta:
+        ordering = ['ticker', 'date']
+        unique_together = ('ticker', 'date')
+
+class DailySessionBar(models.Model):
+    """
+    One bar per ticker, trading day and market session, aggregated from the minute bars
+    by store_stock_data. Daily queries read these rows instead of resampling minute data.
+    """
+    ticker = models.CharField(max_length=10)
+    date = models.DateField()
+    market = models.CharField(max_length=12)  # Session name, see core.data.sessions
+    open = models.FloatField()
+    high = models.FloatField()
+    low = models.FloatField()
+    close = models.FloatField()
+    volume = models.BigIntegerField()
+    vwap = models.FloatField(null=True, blank=True)  # Volume-weighted typical price, None without volume
+    bar_count = models.IntegerField()
+
+    def __str__(self):
+        return f"{self.ticker} - {self.date} {self.market}"
+
+    class Meta:
+        ordering = ['ticker', 'date']
+        unique_together = ('ticker', 'date', 'market')
+
+class IntervalBar(models.Model):
+    """
+    Pre-aggregated bars of the chart intervals (5m, 15m, 30m, 1h and 1d), maintained by
+    store_stock_data. Intraday bars never span two market sessions; start is the time of
+    the first minute bar in the bar (the day itself for 1d bars).
+    """
+    ticker = models.CharField(max_length=10)
+    interval = models.CharField(max_length=4)
+    start = models.DateTimeField()
+    date = models.DateField()
+    market = models.CharField(max_length=12)  # Session name, "all" for 1d bars
+    open = models.FloatField()
+    high = models.FloatField()
+    low = models.FloatField()
+    close = models.FloatField()
+    volume = models.BigIntegerField()
+    bar_count = models.IntegerField()
+
+    def __str__(self):
+        return f"{self.ticker} - {self.interval} {self.start}"
+
+    class Meta:
+        ordering = ['ticker', 'interval', 'start']
+        unique_together = ('ticker', 'interval', 'start')
+        indexes = [
+            models.Index(fields=['ticker', 'interval', 'date']),
+        ]
+
+class IndicatorCheckpoint(models.Model):
+    """
+    State of the online indicators of a ticker after its last stored minute bar, so that
+    store_stock_data only feeds them the bars it adds (see core.analysis.online).
+    """
+    ticker = models.CharField(max_length=10, unique=True)
+    specs = models.JSONField()  # Indicator specs the state belongs to, e.g. ["sma:5", "vwap"]
+    last_bar = models.DateTimeField()
+    state = models.JSONField()  # State after last_bar
+    day = models.DateField()  # Trading day of last_bar
+    day_state = models.JSONField()  # State before the first bar of day
+    day_digest = models.CharField(max_length=40)  # Digest of the bars of day up to last_bar
+    latest = models.JSONField()  # Indicator values at last_bar
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.ticker} - {self.last_bar}"
+
+class IndicatorValue(models.Model):
+    """
+    Online indicator values of one minute bar, appended by store_stock_data.
+    """
+    ticker = models.CharField(max_length=10)
+    start = models.DateTimeField()
+    date = models.DateField()
+    values = models.JSONField()  # Column name -> value, None while an indicator warms up
+
+    def __str__(self):
+        return f"{self.ticker} - {self.start}"
+
+    class Meta:
+        ordering = ['ticker', 'start']
+        unique_together = ('ticker', 'start')
+        indexes = [
+            models.Index(fields=['ticker', 'date']),
+        ]
+
+class FetchJob(models.Model):
+    """
+    A queued fetch-and-store of a ticker's bars, run by the run_jobs worker command.
+
+    At most one job per ticker can be queued or running; enqueueing another returns it.
+    """
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+    ACTIVE_STATUSES = (STATUS_QUEUED, STATUS_RUNNING)
+
+    ticker = models.CharField(max_length=10)
+    action = models.CharField(max_length=10, default='update')  # "add" or "update"
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    progress = models.IntegerField(default=0)  # 0 - 100
+    message = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.action} {self.ticker} ({self.status})"
+
+    class Meta:
+        ordering = ['-created_at']
+        constraints = [
+            models.UniqueConstraint(fields=['ticker'], condition=models.Q(status__in=['queued', 'running']),
+                                    name='unique_active_fetch_job'),
+        ]
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+
 class StockInfo(models.Model):
     ticker = models.CharField(max_length=10, unique=True)  # Stock ticker symbol
     website = models.URLField(blank=True, null=True)
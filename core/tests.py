@@ -1,9 +1,87 @@
 """
 Define tests for the core app.
-For brevity, only a simple test is provided.
 """
-from django.test import TestCase
-from .models import StockData
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as RenderTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date, time as dtime
+from io import StringIO
+from unittest import mock
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Sum
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from .analysis import chartcache, online
+from .analysis.chartcache import ChartCache
+from .analysis.indicators import compute_indicators, get_indicators
+from .analysis.online import OnlineIndicator, OnlineSMA
+from .data import mmap_store, storage
+from .data.backfill import backfill, backfill_windows
+from .data.cache import FrameCache, get_frame_cache
+from .data.dayindex import build_day_index
+from .data.fetcher import TokenBucket, fetch_and_store, fetch_stock_data
+from .data.intervalbars import _minute_frame, aggregate_bars, get_interval_bars
+from .data.locks import SingleFlight, ticker_lock
+from .data.mmap_store import bars_path, read_mmap_bars
+from .data.providers import FixtureProvider
+from .data.querier import (get_all_stock_list, get_bars, get_local_data, get_previous_intraday_close,
+                           get_simulation_bars, get_stock_info_by_date, get_stock_info_by_range,
+                           query_local_stock_data)
+from .data.sessions import classify_sessions, session_mask
+from .data.storage import adjust_data, read_stored_frame, store_stock_data
+from .data.synthetic import generate_minute_bars
+from .data.trading_calendar import trading_sessions
+from .jobs.queue import enqueue_fetch, is_valid_ticker, run_pending_jobs
+from .models import FetchJob, IndicatorValue, IntervalBar, StockCatalog, StockData, TradingDay
+from .trading import opening
+from .trading.macd import crossover_trades
+from .trading.opening import prepare_opening_days
+from .trading.simulator import price_path, simulate_trade
+from .trading.sweep import parameter_range, run_sweep
+
+
+class DataDirMixin:
+    """
+    Give each test a temporary data directory, removed after the test.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.data_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.data_dir)
+
+    def config(self, method, **settings):
+        """
+        Return a config storing the bars with the given storage method in the data directory,
+        updated with the given top-level settings (e.g. fetcher={...}).
+        """
+        config = {"storage_method": method}
+        if method in ("csv", "parquet", "mmap"):
+            config[f"{method}_data_dir"] = self.data_dir
+        config.update(settings)
+        return config
+
+    def login(self):
+        self.client.force_login(get_user_model().objects.create_user("tester", "tester@example.com", "pw"))
+
+
+class DataTestCase(DataDirMixin, TestCase):
+    pass
+
 
 class StockDataModelTest(TestCase):
     def test_str(self):
@@ -18,3 +96,981 @@ class StockDataModelTest(TestCase):
             volume=1000000
         )
         self.assertIn("AAPL", str(data))
+
+
+class ParquetStorageTest(DataTestCase):
+    def test_round_trip_reads_only_requested_partition(self):
+        config = self.config("parquet")
+        store_stock_data("TEST", generate_minute_bars(days=3), config)
+
+        files = sorted(os.listdir(os.path.join(self.data_dir, "TEST")))
+        self.assertEqual(files, ["2024-03-04.parquet", "2024-03-05.parquet", "2024-03-06.parquet"])
+        with override_settings(CONFIG=config):
+            day = get_local_data("TEST", date="2024-03-05", market="intraday")
+            stocks = get_all_stock_list()
+        self.assertEqual(len(day), 391)
+        self.assertTrue((day.index.date == pd.Timestamp("2024-03-05").date()).all())
+        self.assertEqual(day["Close"].dtype, np.float64)
+        self.assertEqual(stocks[0]["start_date"], "2024-03-04")
+        self.assertEqual(stocks[0]["end_date"], "2024-03-06")
+
+
+class MmapStorageTest(DataTestCase):
+    def test_append_rewrite_and_zero_copy_reads(self):
+        config = self.config("mmap")
+        bars = generate_minute_bars(days=3, seed=12)
+        store_stock_data("TEST", bars.iloc[:1000], config)
+        inode = os.stat(bars_path("TEST", self.data_dir)).st_ino
+        # Re-sent bars plus new ones are appended in place
+        store_stock_data("TEST", bars.iloc[900:2000], config)
+        self.assertEqual(os.stat(bars_path("TEST", self.data_dir)).st_ino, inode)
+        # A corrected bar and a missing bar rewrite the file
+        corrected = bars.iloc[[10]].copy()
+        corrected["Close"] += 1
+        store_stock_data("TEST", pd.concat([corrected, bars.iloc[2000:]]), config)
+        self.assertNotEqual(os.stat(bars_path("TEST", self.data_dir)).st_ino, inode)
+
+        expected = adjust_data(bars.copy())
+        expected.index = expected.index.tz_localize(None)
+        expected.iloc[10, expected.columns.get_loc("Close")] += 1
+        stored = read_stored_frame("TEST", config)
+        self.assertTrue(stored.index.equals(expected.index))
+        for column in ("Open", "High", "Low", "Close"):
+            np.testing.assert_allclose(stored[column], expected[column].astype(np.float32))
+        self.assertEqual(list(stored["Market"].astype(str)), list(expected["Market"].astype(str)))
+
+        records = read_mmap_bars("TEST", self.data_dir, start=pd.Timestamp("2024-03-05"),
+                                 end=pd.Timestamp("2024-03-05"))
+        self.assertIsInstance(records.base, np.memmap)
+        self.assertFalse(records.flags.writeable)
+        self.assertEqual(len(records), 960)
+        with override_settings(CONFIG=config):
+            day = get_local_data("TEST", date="2024-03-05")
+            stocks = get_all_stock_list()
+        np.testing.assert_array_equal(day["Close"], records["Close"].astype(np.float64))
+        self.assertEqual((stocks[0]["start_date"], stocks[0]["end_date"]), ("2024-03-04", "2024-03-06"))
+        buy_price = float(day["Open"].iloc[400])
+        self.assertEqual(simulate_trade(buy_price, 0.3, 0.3, records[400:]),
+                         simulate_trade(buy_price, 0.3, 0.3, day.iloc[400:]))
+
+    def test_simulator_reads_mapped_records(self):
+        config = self.config("mmap")
+        for seed, ticker in enumerate(["PC", "BUYA"]):
+            store_stock_data(ticker, generate_minute_bars(days=2, seed=seed), config)
+        self.login()
+
+        with override_settings(CONFIG=config):
+            frame = get_local_data("BUYA", date="2024-03-05", market="intraday")
+            records = get_simulation_bars("BUYA", "2024-03-05", market="intraday")
+            days = prepare_opening_days("PC", "Pre-market Close", "BUYA", "BUYA", "2024-03-04", "2024-03-05")
+            trade = {"date": "2024-03-05", "precon_code": "PC", "strategy": "Pre-market Close", "buy_code": "BUYA",
+                     "buy_price": str(frame["Open"].iloc[0]), "quantity": 10, "take_profit": "0.3", "stop_loss": "0.3"}
+            response = json.loads(self.client.post(
+                reverse("calculate_profitloss"), {"trade_data": json.dumps([trade])}).json())
+
+        # A slice of the mapped day, not a copy
+        day = read_mmap_bars("BUYA", self.data_dir, start=pd.Timestamp("2024-03-05"), end=pd.Timestamp("2024-03-05"))
+        self.assertTrue(np.shares_memory(records, day))
+        np.testing.assert_array_equal(records["Close"].astype(np.float64), frame["Close"])
+        self.assertEqual(len(days), 2)
+        self.assertTrue(all(np.shares_memory(d["minute_data"], read_mmap_bars("BUYA", self.data_dir)) for d in days))
+        expected = simulate_trade(float(trade["buy_price"]), 0.3, 0.3, frame)
+        self.assertNotEqual(expected["sell_time"], 0)
+        self.assertEqual(response["simulate"][0]["result"], expected)
+
+    def test_replaced_and_evicted_mappings_are_closed(self):
+        config = self.config("mmap")
+        bars = generate_minute_bars(days=2, seed=4)
+        for ticker in ("AAA", "BBB"):
+            store_stock_data(ticker, bars, config)
+        corrected = bars.iloc[[10]].copy()
+
+        with mock.patch.object(mmap_store, "MAX_OPEN_MAPS", 1), mock.patch.object(mmap_store, "_maps", OrderedDict()):
+            held = read_mmap_bars("AAA", self.data_dir)
+            first = held.base._mmap
+            # Rewritten while a view is in use: the old mapping stays readable until released
+            corrected["Close"] += 1
+            store_stock_data("AAA", corrected, config)
+            second = read_mmap_bars("AAA", self.data_dir).base._mmap
+            self.assertIsNot(second, first)
+            self.assertFalse(first.closed)
+            self.assertEqual(len(held), 2 * 960)
+            # Unused mappings are closed when replaced or evicted
+            corrected["Close"] += 1
+            store_stock_data("AAA", corrected, config)
+            read_mmap_bars("AAA", self.data_dir)
+            self.assertTrue(second.closed)
+            third = mmap_store._maps[bars_path("AAA", self.data_dir)][1]._mmap
+            read_mmap_bars("BBB", self.data_dir)
+            self.assertEqual(list(mmap_store._maps), [bars_path("BBB", self.data_dir)])
+            self.assertTrue(third.closed)
+
+
+class BulkStoreTest(DataTestCase):
+    def test_refresh_does_not_duplicate_rows(self):
+        config = self.config("postgres")
+        store_stock_data("TEST", generate_minute_bars(days=2), config)
+        # A second fetch overlaps the first by one day
+        store_stock_data("TEST", generate_minute_bars(start_day="2024-03-05", days=2, seed=1), config)
+        self.assertEqual(StockData.objects.filter(ticker="TEST").count(), 3 * 960)
+
+
+class StockDataUniqueIndexTest(DataDirMixin, TransactionTestCase):
+    def test_command_deduplicates_tables_created_without_the_index(self):
+        # A table created before unique_together was declared
+        with connection.schema_editor() as editor:
+            editor.alter_unique_together(StockData, [("ticker", "date")], [])
+        self.addCleanup(self._restore_unique_together)
+        config = self.config("postgres")
+        bars = generate_minute_bars(days=1)
+        store_stock_data("TEST", bars, config)
+        StockData.objects.bulk_create([StockData(ticker=r.ticker, date=r.date, open=r.open, high=r.high, low=r.low,
+                                                 close=r.close, volume=r.volume, market=r.market)
+                                       for r in StockData.objects.filter(ticker="TEST")[:10]])
+        # Duplicated bars are compared once
+        store_stock_data("TEST", bars, config)
+        self.assertEqual(StockData.objects.filter(ticker="TEST").count(), 970)
+
+        out = StringIO()
+        call_command("add_stock_data_unique_index", stdout=out)
+        self.assertIn("Deleted 10 duplicate bars", out.getvalue())
+        self.assertEqual(StockData.objects.filter(ticker="TEST").count(), 960)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            StockData.objects.create(ticker="TEST", date=bars.index[0], open=1, high=1, low=1, close=1, volume=1)
+        call_command("add_stock_data_unique_index", stdout=out)
+        self.assertIn("already exists", out.getvalue())
+
+    def _restore_unique_together(self):
+        with connection.schema_editor() as editor:
+            editor.alter_unique_together(StockData, [], [("ticker", "date")])
+
+
+class FrameCacheTest(DataTestCase):
+    def test_lru_eviction_and_versioning(self):
+        frame = generate_minute_bars(days=1)
+        nbytes = int(frame.memory_usage(index=True, deep=True).sum())
+        cache = FrameCache(max_bytes=2 * nbytes)
+        loads = []
+
+        def loader():
+            loads.append(1)
+            return frame
+
+        cache.get(("csv", "A"), 1, loader)
+        cache.get(("csv", "A"), 1, loader)
+        cache.get(("csv", "B"), 1, loader)
+        cache.get(("csv", "C"), 1, loader)  # evicts A
+        cache.get(("csv", "C"), 2, loader)  # new version reloads
+        stats = cache.stats()
+        self.assertEqual(len(loads), 4)
+        self.assertEqual((stats["hits"], stats["misses"], stats["evictions"]), (1, 4, 1))
+        self.assertEqual(stats["entries"], 2)
+
+    def test_store_invalidates_cached_csv(self):
+        config = self.config("csv")
+        with override_settings(CONFIG=config):
+            store_stock_data("TEST", generate_minute_bars(days=1), config)
+            self.assertEqual(len(get_local_data("TEST")), 960)
+            hits = get_frame_cache().stats()["hits"]
+            get_local_data("TEST", date="2024-03-04")
+            self.assertEqual(get_frame_cache().stats()["hits"], hits + 1)
+            store_stock_data("TEST", generate_minute_bars(start_day="2024-03-05", days=1), config)
+            self.assertEqual(len(get_local_data("TEST")), 2 * 960)
+
+
+class StockCatalogTest(DataTestCase):
+    def test_catalog_updated_incrementally(self):
+        config = self.config("postgres")
+        store_stock_data("TEST", generate_minute_bars(days=2), config)
+        store_stock_data("TEST", generate_minute_bars(start_day="2024-03-05", days=2, seed=1), config)
+        with override_settings(CONFIG=config):
+            stocks = get_all_stock_list()
+        self.assertEqual(len(stocks), 1)
+        self.assertEqual((stocks[0]["start_date"], stocks[0]["end_date"]), ("2024-03-04", "2024-03-06"))
+        self.assertEqual((stocks[0]["row_count"], stocks[0]["trading_day_count"]), (3 * 960, 3))
+
+    def test_rebuild_skips_sidecar_files(self):
+        adjust_data(generate_minute_bars(days=2)).tz_localize(None).to_csv(os.path.join(self.data_dir, "TEST.csv"))
+        pd.DataFrame({"Property": ["sector"], "Value": ["Tech"]}).to_csv(
+            os.path.join(self.data_dir, "TEST_info.csv"), index=False)
+        with override_settings(CONFIG=self.config("csv")):
+            stocks = get_all_stock_list()
+        self.assertEqual([s["ticker"] for s in stocks], ["TEST"])
+        self.assertEqual(stocks[0]["trading_day_count"], 2)
+
+
+class MarketSessionTest(TestCase):
+    def test_matches_per_row_classification(self):
+
+        def get_market_session(dt):
+            t = dt.time()
+            if dtime(4, 0, 0) <= t < dtime(9, 30, 0):
+                return "pre-market"
+            elif dtime(9, 30, 0) <= t <= dtime(16, 0, 0):
+                return "intraday"
+            elif dtime(16, 1, 0) <= t <= dtime(19, 59, 59):
+                return "post-market"
+            return "unknown"
+
+        index = pd.date_range("2024-03-04", periods=24 * 120, freq="30s", tz="US/Eastern")
+        sessions = classify_sessions(index)
+        self.assertEqual(list(sessions.astype(str)), [get_market_session(dt) for dt in index])
+        frame = pd.DataFrame({"Market": sessions}, index=index)
+        self.assertEqual(session_mask(frame, "intraday").sum(), 2 * 390 + 1)
+
+
+class TradingDayIndexTest(DataTestCase):
+    def test_day_slice_and_previous_close(self):
+        config = self.config("csv")
+        data = generate_minute_bars(days=3)
+        store_stock_data("TEST", data.iloc[:960].copy(), config)
+        store_stock_data("TEST", data.iloc[960:].copy(), config)
+
+        days = list(TradingDay.objects.filter(ticker="TEST").values_list("first_row", "last_row"))
+        self.assertEqual(days, [(0, 959), (960, 1919), (1920, 2879)])
+        with override_settings(CONFIG=config):
+            day = get_local_data("TEST", date="2024-03-05", market="intraday")
+            previous = get_previous_intraday_close("TEST", "2024-03-05")
+            first = get_previous_intraday_close("TEST", "2024-03-04")
+        self.assertEqual(len(day), 391)
+        self.assertEqual(day.index[0], pd.Timestamp("2024-03-05 09:30"))
+        self.assertAlmostEqual(previous["Close"], data["Close"].iloc[12 * 60])
+        self.assertEqual(first, {})
+
+
+class ConcurrentFetchTest(TestCase):
+    def test_fetch_retries_and_reports_errors(self):
+
+        class FlakyProvider(FixtureProvider):
+            calls = {}
+
+            def history(self, ticker, **kwargs):
+                self.calls[ticker] = self.calls.get(ticker, 0) + 1
+                if self.calls[ticker] == 1:
+                    raise Exception("temporary error")
+                return super().history(ticker, **kwargs)
+
+        provider = FlakyProvider(days=1, fail_tickers=["BAD"])
+        rate_limiter = TokenBucket(1000, 1000)
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            futures = {ticker: executor.submit(fetch_stock_data, ticker, retries=3, delay=0, provider=provider,
+                                               rate_limiter=rate_limiter)
+                       for ticker in ["AAA", "BBB", "BAD"]}
+        self.assertEqual(len(futures["AAA"].result()), 960)
+        self.assertEqual(str(futures["AAA"].result().index.tz), "US/Eastern")
+        with self.assertRaisesRegex(Exception, "No fixture data for BAD"):
+            futures["BAD"].result()
+        self.assertEqual(provider.calls, {"AAA": 2, "BBB": 2, "BAD": 3})
+
+    def test_rate_limiter_rejects_invalid_config(self):
+        for rate, burst in [(0, 4), (-1, 4), (2, 0.5), (float("nan"), 4)]:
+            with self.assertRaises(Exception):
+                TokenBucket(rate, burst)
+        TokenBucket(0.5, 1).acquire()
+
+
+class IncrementalMergeTest(DataTestCase):
+    def test_partial_day_upsert(self):
+        data = generate_minute_bars(days=2)
+        # 11:00 on the second day: the last stored bar is still incomplete
+        cut = 960 + 7 * 60
+        revised = data.iloc[cut - 1:].copy()
+        revised.iloc[0, revised.columns.get_loc("Close")] += 1.0
+        expected = data.copy()
+        expected.iloc[cut - 1, expected.columns.get_loc("Close")] += 1.0
+
+        for method in ("csv", "parquet", "postgres"):
+            config = self.config(method, parquet_data_dir=os.path.join(self.data_dir, "parquet"))
+            ticker = f"T{method.upper()}"
+            with override_settings(CONFIG=config):
+                store_stock_data(ticker, data.iloc[:cut].copy(), config)
+                store_stock_data(ticker, revised, config)
+                stored = read_stored_frame(ticker, config)
+            self.assertEqual(len(stored), 2 * 960, method)
+            np.testing.assert_allclose(stored["Close"].to_numpy(), expected["Close"].to_numpy(), rtol=1e-6)
+            entry = StockCatalog.objects.get(ticker=ticker)
+            self.assertEqual((entry.row_count, entry.trading_day_count), (2 * 960, 2))
+            days = list(TradingDay.objects.filter(ticker=ticker).order_by("date").values_list("first_row", "last_row"))
+            self.assertEqual(days, [tuple(r) for r in build_day_index(stored)[["first_row", "last_row"]].to_numpy()])
+
+
+class CsvTailMergeTest(DataTestCase):
+    def test_refresh_reads_only_the_tail(self):
+        config = self.config("csv")
+        csv_path = os.path.join(self.data_dir, "TEST.csv")
+        data = generate_minute_bars(days=4, seed=13)
+        cut = 3 * 960 + 300
+        storage.store_stock_data("TEST", data.iloc[:cut].copy(), config)
+        inode = os.stat(csv_path).st_ino
+
+        with mock.patch.object(storage, "CSV_TAIL_BLOCK_SIZE", 4096), \
+                mock.patch.object(storage.pd, "read_csv", wraps=pd.read_csv) as read_csv:
+            # The current day is fetched again with new bars: appended after reading the tail
+            storage.store_stock_data("TEST", data.iloc[3 * 960:cut + 100].copy(), config)
+            self.assertFalse([c for c in read_csv.call_args_list if c.args[0] == csv_path])
+            self.assertEqual(os.stat(csv_path).st_ino, inode)
+            # A bar missing in an earlier day rewrites the whole file
+            storage.store_stock_data("TEST", data.iloc[cut + 100:].copy(), config)
+            self.assertEqual(storage.read_csv_tail(csv_path, "2024-03-06").index[0], pd.Timestamp("2024-03-06 04:00"))
+            gap = data.drop(data.index[500])
+            os.remove(csv_path)
+            storage.store_stock_data("TEST", gap.copy(), config)
+            inode = os.stat(csv_path).st_ino
+            storage.store_stock_data("TEST", data.iloc[[500]].copy(), config)
+            self.assertTrue([c for c in read_csv.call_args_list if c.args[0] == csv_path])
+
+        self.assertNotEqual(os.stat(csv_path).st_ino, inode)
+        self.assertFalse(os.path.exists(csv_path + ".tmp"))
+        stored = storage.read_stored_frame("TEST", config)
+        self.assertTrue(stored.index.equals(data.index.tz_localize(None)))
+        np.testing.assert_allclose(stored["Close"], data["Close"])
+
+
+class FetchJobQueueTest(DataTestCase):
+    def test_enqueue_coalesces_and_worker_stores(self):
+        config = self.config("csv", fetcher={"provider": "fixture", "requests_per_second": 1000, "burst": 1000})
+        with override_settings(CONFIG=config):
+            job, created = enqueue_fetch("AAA", action="add")
+            again, created_again = enqueue_fetch("AAA")
+            self.assertTrue(created)
+            self.assertEqual((again.id, created_again), (job.id, False))
+
+            self.login()
+            status = self.client.get(reverse("job_status", args=[job.id])).json()
+            self.assertEqual((status["status"], status["progress"]), ("queued", 0))
+            self.assertEqual(run_pending_jobs(), 1)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.progress), (FetchJob.STATUS_DONE, 100))
+        self.assertEqual(StockCatalog.objects.get(ticker="AAA").row_count, 5 * 960)
+        self.assertTrue(enqueue_fetch("AAA")[1])
+
+    def test_invalid_tickers_are_not_queued(self):
+        self.assertTrue(all(map(is_valid_ticker, ["AAPL", "BRK-B", "BRK.B", "^GSPC", "EURUSD=X"])))
+        self.assertFalse(any(map(is_valid_ticker, ["", "aapl", "<IMG SRC=X>", "A" * 11, "A B"])))
+        with self.assertRaises(Exception):
+            enqueue_fetch("<SCRIPT>")
+
+        self.login()
+        self.client.post(reverse("index"), {"new_stock": "<img src=x onerror=alert(1)>"})
+        self.assertFalse(FetchJob.objects.exists())
+
+
+class DailySessionBarTest(DataTestCase):
+    def test_session_bars_follow_incremental_merges(self):
+        config = self.config("csv")
+        data = generate_minute_bars(days=2)
+        with override_settings(CONFIG=config):
+            store_stock_data("TEST", data.iloc[:1200].copy(), config)
+            store_stock_data("TEST", data.iloc[1199:].copy(), config)
+            days = query_local_stock_data("TEST", "2024-03-04", "2024-03-06", "1d")
+            info = get_stock_info_by_date("TEST", "2024-03-05")
+
+        self.assertEqual([day["date"] for day in days], ["2024-03-04", "2024-03-05"])
+        self.assertEqual(list(days[1]["markets"]), ["pre-market", "intraday", "post-market"])
+        bars = data[data.index.normalize() == pd.Timestamp("2024-03-05").tz_localize("US/Eastern")]
+        intraday = bars.between_time("09:30", "16:00")
+        expected = {"Open": round(intraday["Open"].iloc[0], 2), "Close": round(intraday["Close"].iloc[-1], 2),
+                    "High": round(intraday["High"].max(), 2), "Low": round(intraday["Low"].min(), 2),
+                    "Volume": int(intraday["Volume"].sum()), "Bars": 391}
+        typical = (intraday["High"] + intraday["Low"] + intraday["Close"]) / 3
+        expected["VWAP"] = round((typical * intraday["Volume"]).sum() / intraday["Volume"].sum(), 2)
+        self.assertEqual(days[1]["markets"]["intraday"], expected)
+        self.assertEqual(info["intraday_open"], expected["Open"])
+
+
+def _simulate_trade_reference(buy_price, stop_loss, take_profit, minute_data):
+    # The original per-row implementation, kept as the reference for the vectorized engine
+    for idx, row in minute_data.iterrows():
+        prices = [row['Open'], row['Low'], row['High'], row['Close']]
+        for price in prices:
+            sell_time = 0
+            if price < buy_price:
+                loss_pct = (buy_price - price) / buy_price * 100.0
+                if loss_pct > stop_loss:
+                    result_value = -round(stop_loss, 2)
+                    sell_time = idx.strftime('%Y-%m-%d %H:%M:%S')
+                    return {'profit_loss': result_value, 'sell_time': sell_time, 'buy_price': buy_price,
+                            'sell_price': round(price, 2)}
+            elif price > buy_price:
+                profit_pct = (price - buy_price) / buy_price * 100.0
+                if profit_pct > take_profit:
+                    result_value = round(profit_pct, 2)
+                    sell_time = idx.strftime('%Y-%m-%d %H:%M:%S')
+                    return {'profit_loss': result_value, 'sell_time': sell_time, 'buy_price': buy_price,
+                            'sell_price': round(price, 2)}
+    return {'profit_loss': 0, 'sell_time': 0, 'buy_price': 0, 'sell_price': 0}
+
+
+class SimulateTradeEquivalenceTest(TestCase):
+    def setUp(self):
+        data = adjust_data(generate_minute_bars(days=3, seed=7))
+        data.index = data.index.tz_localize(None)
+        self.days = [day for _, day in data.groupby(data.index.date)]
+
+    def assertSameResult(self, buy_price, stop_loss, take_profit, minute_data):
+        expected = _simulate_trade_reference(buy_price, stop_loss, take_profit, minute_data)
+        result = simulate_trade(buy_price, stop_loss, take_profit, minute_data)
+        self.assertEqual(result, expected)
+        self.assertEqual({k: type(v) for k, v in result.items()}, {k: type(v) for k, v in expected.items()})
+
+    def test_random_parameters(self):
+        rng = np.random.default_rng(11)
+        for day in self.days:
+            intraday = day[day["Market"] == "intraday"]
+            for _ in range(200):
+                buy_price = round(float(rng.choice(intraday["Close"])) * rng.uniform(0.97, 1.03), 2)
+                stop_loss = float(rng.choice([0, 0.1, 0.5, 1, 2.5, 50]))
+                take_profit = float(rng.choice([0, 0.1, 0.5, 1, 2.5, 50]))
+                self.assertSameResult(buy_price, stop_loss, take_profit, intraday)
+
+    def test_edge_cases(self):
+        day = self.days[0].iloc[570:600].copy()
+        open_price = float(day["Open"].iloc[0])
+        # Integer parameters, a price exactly on the buy price, no hit and an empty frame
+        self.assertSameResult(int(open_price), 1, 1, day)
+        self.assertSameResult(open_price, 0, 0, day)
+        self.assertSameResult(open_price, 100, 100, day)
+        self.assertSameResult(open_price, 1, 1, day.iloc[:0])
+        # Missing prices are never a hit
+        day.iloc[0:5, day.columns.get_loc("Low")] = np.nan
+        self.assertSameResult(open_price, 0.01, 0.01, day)
+        # A zero buy price fails like the original loop
+        with self.assertRaises(ZeroDivisionError):
+            simulate_trade(0, 1, 1, day)
+        with self.assertRaises(ZeroDivisionError):
+            _simulate_trade_reference(0, 1, 1, day)
+
+
+class TradingCalendarTest(DataTestCase):
+    def test_sessions_from_stored_days_and_holidays(self):
+        config = self.config("csv", calendar={"holidays": [date(2024, 3, 11), "2024-03-13"]})
+        store_stock_data("BUYA", generate_minute_bars("2024-03-04", days=3, seed=1), config)
+
+        with override_settings(CONFIG=config):
+            stored = [date(2024, 3, 4), date(2024, 3, 5), date(2024, 3, 6)]
+            self.assertEqual(trading_sessions("2024-03-01", "2024-03-15", ["BUYA", "UNKNOWN"]), stored)
+            self.assertEqual(trading_sessions(date(2024, 3, 5), date(2024, 3, 5), ["BUYA"]), stored[1:2])
+            # Without an index: weekdays minus the configured holidays
+            self.assertEqual(trading_sessions("2024-03-08", "2024-03-15", ["UNKNOWN"]),
+                             [date(2024, 3, 8), date(2024, 3, 12), date(2024, 3, 14), date(2024, 3, 15)])
+            self.assertEqual(trading_sessions("2024-03-15", "2024-03-08"), [])
+
+            with mock.patch.object(opening, "resolve_opening_day", return_value=None) as resolve:
+                list(opening.iter_opening_days("BUYA", "Pre-market Close", "BUYA", "BUYA",
+                                               date(2024, 3, 1), date(2024, 3, 31)))
+            self.assertEqual([c.args[-1] for c in resolve.call_args_list], ["2024-03-04", "2024-03-05", "2024-03-06"])
+
+
+class StockInfoRangeTest(DataTestCase):
+    def test_range_matches_per_day_info(self):
+        config = self.config("csv")
+        store_stock_data("AAPL", generate_minute_bars(days=4, seed=5), config)
+
+        with override_settings(CONFIG=config):
+            infos = get_stock_info_by_range("AAPL", "2024-03-01", "2024-03-10")
+            self.assertEqual([info["date"] for info in infos], ["2024-03-04", "2024-03-05", "2024-03-06", "2024-03-07"])
+            for info in infos:
+                expected = get_stock_info_by_date("AAPL", info["date"])
+                self.assertEqual(info["pre_market_open"], expected["pre_market_open"])
+                self.assertEqual(info["pre_market_close"], expected["pre_market_close"])
+                self.assertAlmostEqual(info["pre_market_change"], expected["pre_market_change"], places=9)
+                self.assertAlmostEqual(info["intraday_change"], expected["intraday_change:"], places=9)
+            self.assertIsNone(infos[0]["prev_close"])
+
+            # Days missing from the trading-day index fall back to the stored bars
+            TradingDay.objects.filter(ticker="AAPL", date__gte="2024-03-06").delete()
+            fallback = get_stock_info_by_range("AAPL", "2024-03-04", "2024-03-07")
+            self.assertEqual([info["date"] for info in fallback], [info["date"] for info in infos])
+            for info, expected in zip(fallback[1:], infos[1:]):
+                self.assertAlmostEqual(info["prev_close"], expected["prev_close"], places=6)
+                self.assertAlmostEqual(info["pre_market_change"], expected["pre_market_change"], places=6)
+
+            self.login()
+            price_data = json.loads(self.client.post(reverse("query_stock_data"), {
+                "query_stock_code": "AAPL", "start_date": "2024-03-05", "end_date": "2024-03-06"}).json())
+        self.assertEqual([row["date"] for row in price_data], ["2024-03-05", "2024-03-06"])
+        self.assertEqual(price_data[0]["pre_market_change"], f"{infos[1]['pre_market_change']:.2f}%")
+
+
+class IntervalBarPyramidTest(DataTestCase):
+    def test_incremental_pyramid_matches_minute_bars(self):
+        config = self.config("csv")
+        bars = generate_minute_bars(days=3, seed=4)
+        store_stock_data("AAPL", bars.iloc[:1200], config)
+        # Overlapping incremental store with revised prices
+        update = bars.iloc[1000:].copy()
+        update["Close"] += 0.5
+        store_stock_data("AAPL", update, config)
+
+        with override_settings(CONFIG=config):
+            minutes = _minute_frame(read_stored_frame("AAPL", config))
+            for interval in ("5m", "1h", "1d", "10m", "2h", "3m"):
+                result = get_interval_bars("AAPL", date(2024, 3, 4), date(2024, 3, 6), interval)
+                expected = aggregate_bars(minutes, interval)
+                np.testing.assert_allclose(result[["Open", "High", "Low", "Close", "Volume"]].to_numpy(),
+                                           expected[["open", "high", "low", "close", "volume"]].to_numpy())
+                self.assertTrue((result.index == pd.DatetimeIndex(expected["start"])).all())
+            # Bars never span two sessions
+            hourly = get_interval_bars("AAPL", date(2024, 3, 4), date(2024, 3, 4), "1h")
+            self.assertEqual(list(hourly.loc["2024-03-04 09:00":"2024-03-04 10:00", "Market"]),
+                             ["pre-market", "intraday", "intraday"])
+            records = query_local_stock_data("AAPL", "2024-03-05", "2024-03-05", "30m")
+            self.assertEqual(records[0]["Datetime"], pd.Timestamp("2024-03-05 04:00"))
+            self.assertEqual(sum(IntervalBar.objects.filter(ticker="AAPL", interval=i).aggregate(
+                n=Sum("bar_count"))["n"] for i in ("5m", "1d")), 2 * len(minutes))
+
+
+class ChartCacheTest(DataTestCase):
+    def test_chart_served_from_disk_cache(self):
+        config = self.config("csv", charts={"cache_dir": os.path.join(self.data_dir, "charts"), "render_workers": 0,
+                                            "max_age": 60})
+        bars = generate_minute_bars(days=2, seed=3)
+        store_stock_data("AAPL", bars.iloc[:1000], config)
+        self.login()
+        url = reverse("chart_image", args=["AAPL"]) + "?start_date=2024-03-04&end_date=2024-03-05&interval=1h"
+
+        with override_settings(CONFIG=config), mock.patch.object(chartcache, "_chart_cache", None), \
+                mock.patch.object(chartcache, "render_chart", wraps=chartcache.render_chart) as render:
+            first = self.client.get(url)
+            self.assertEqual((first.status_code, first["Content-Type"]), (200, "image/png"))
+            self.assertTrue(first.content.startswith(b"\x89PNG"))
+            self.assertEqual(first["Cache-Control"], "private, max-age=60")
+            self.assertEqual(self.client.get(url).content, first.content)
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"]).status_code, 304)
+            self.assertEqual(render.call_count, 1)
+            # An evicted chart is still revalidated without loading bars or rendering
+            shutil.rmtree(os.path.join(self.data_dir, "charts"))
+            with mock.patch.object(chartcache, "get_bars") as load:
+                revalidated = self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+            self.assertEqual((revalidated.status_code, revalidated["ETag"]), (304, first["ETag"]))
+            load.assert_not_called()
+            self.assertEqual(render.call_count, 1)
+
+            # New bars change the data version and the chart is rendered again
+            store_stock_data("AAPL", bars.iloc[1000:], config)
+            second = self.client.get(url)
+            self.assertNotEqual(second["ETag"], first["ETag"])
+            self.assertEqual(render.call_count, 2)
+            self.assertEqual(self.client.get(url.replace("1h", "7x")).status_code, 400)
+
+    def test_failed_renders_answer_503(self):
+        config = self.config("csv", charts={"cache_dir": os.path.join(self.data_dir, "charts"), "render_workers": 1})
+        store_stock_data("AAPL", generate_minute_bars(days=1, seed=3), config)
+        self.login()
+        url = reverse("chart_image", args=["AAPL"]) + "?start_date=2024-03-04&end_date=2024-03-04&interval=1h"
+        broken = mock.Mock()
+        broken.submit.return_value.result.side_effect = BrokenProcessPool()
+        stuck = mock.Mock()
+        stuck.submit.return_value.result.side_effect = RenderTimeoutError()
+
+        with override_settings(CONFIG=config), mock.patch.object(chartcache, "_chart_cache", None):
+            with mock.patch.object(chartcache, "_render_pool", stuck):
+                self.assertEqual(self.client.get(url).status_code, 503)
+                self.assertIs(chartcache._render_pool, stuck)
+            with mock.patch.object(chartcache, "_render_pool", broken):
+                self.assertEqual(self.client.get(url).status_code, 503)
+                # The broken pool is dropped so the next render starts a new one
+                self.assertIsNone(chartcache._render_pool)
+        broken.shutdown.assert_called_once_with(wait=False)
+
+    def test_chart_page_links_the_chart_image(self):
+        config = self.config("csv", charts={"cache_dir": os.path.join(self.data_dir, "charts"), "render_workers": 0})
+        store_stock_data("AAPL", generate_minute_bars(days=6, seed=3), config)
+        self.login()
+        page_url = reverse("stock_chart", args=["AAPL"])
+
+        with override_settings(CONFIG=config), mock.patch.object(chartcache, "_chart_cache", None), \
+                mock.patch("core.analysis.views.get_local_data") as load:
+            # The last 5 stored days at 5m by default
+            page = self.client.get(page_url)
+            self.assertEqual(page.context["chart_url"], reverse("chart_image", args=["AAPL"])
+                             + "?start_date=2024-03-05&end_date=2024-03-11&interval=5m")
+            self.assertContains(page, 'src="%s"' % page.context["chart_url"].replace("&", "&amp;"))
+            self.assertEqual(self.client.get(page.context["chart_url"])["Content-Type"], "image/png")
+
+            daily = self.client.get(page_url, {"start_date": "2024-03-04", "end_date": "2024-03-05",
+                                               "interval": "1d"})
+            self.assertEqual([p["date"] for p in daily.context["price_list"]], ["2024-03-04", "2024-03-05"])
+            # The page never loads the minute bars itself
+            load.assert_not_called()
+
+    def test_size_based_eviction(self):
+        cache = ChartCache(self.data_dir, max_bytes=350)
+        for i, key in enumerate(["a", "b", "c"]):
+            cache.put(key, b"x" * 100)
+            os.utime(cache.path(key), (i, i))
+        cache.get("a")
+        cache.put("d", b"x" * 100)
+        self.assertEqual(sorted(os.listdir(cache.directory)), ["a.png", "c.png", "d.png"])
+
+
+class BarsApiTest(DataTestCase):
+    def test_columnar_json_and_arrow(self):
+        config = self.config("csv")
+        bars = generate_minute_bars(days=2, seed=6)
+        store_stock_data("AAPL", bars.iloc[:1500], config)
+        self.login()
+        url = reverse("bars_api", args=["AAPL"]) + "?start_date=2024-03-04&end_date=2024-03-05"
+
+        with override_settings(CONFIG=config):
+            expected = get_bars("AAPL", "2024-03-04", "2024-03-05")
+            response = self.client.get(url)
+            payload = json.loads(response.content)
+            self.assertEqual(payload["count"], len(expected))
+            self.assertEqual(payload["t"][:2], [int(pd.Timestamp(ts, tz="US/Eastern").timestamp())
+                                                for ts in expected.index[:2]])
+            np.testing.assert_allclose(payload["c"], expected["Close"], atol=1e-4)
+            self.assertEqual(payload["sessions"][payload["m"][0]], expected["Market"].iloc[0])
+            # Several times smaller than one JSON object per bar
+            records = json.dumps(expected.reset_index().astype({"Datetime": str, "Market": str}).to_dict("records"))
+            self.assertLess(len(response.content) * 2, len(records))
+
+            compressed = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip")
+            self.assertEqual(compressed["Content-Encoding"], "gzip")
+            self.assertEqual(gzip.decompress(compressed.content), response.content)
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=compressed["ETag"]).status_code, 304)
+
+            arrow = self.client.get(url + "&format=arrow&interval=1h")
+            table = pa.ipc.open_stream(arrow.content).read_all()
+            hourly = get_bars("AAPL", "2024-03-04", "2024-03-05", "1h")
+            np.testing.assert_allclose(table.column("o").to_numpy(), hourly["Open"], atol=1e-4)
+            self.assertEqual(table.schema.metadata[b"interval"], b"1h")
+
+            store_stock_data("AAPL", bars.iloc[1500:], config)
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 200)
+            self.assertEqual(self.client.get(url + "&interval=7x").status_code, 400)
+
+
+class IndicatorEngineTest(DataTestCase):
+    def test_indicators_match_pandas(self):
+        bars = adjust_data(generate_minute_bars(days=2, seed=8))
+        bars.index = bars.index.tz_localize(None)
+        result = compute_indicators(bars, ["sma:5", "ema:12", "macd:12,26,9", "rsi:14", "bbands:20,2", "atr:14", "vwap"])
+        close = bars["Close"]
+        np.testing.assert_allclose(result["SMA_5"], close.rolling(5).mean())
+        ema = lambda s, n: s.ewm(span=n, adjust=False, min_periods=n).mean()
+        macd = ema(close, 12) - ema(close, 26)
+        np.testing.assert_allclose(result["EMA_12"], ema(close, 12))
+        np.testing.assert_allclose(result["MACD_SIGNAL_12_26_9"], ema(macd, 9))
+        np.testing.assert_allclose(result["BB_UPPER_20_2"], close.rolling(20).mean() + 2 * close.rolling(20).std(ddof=0))
+        change = close.diff()
+        gain = change.clip(lower=0).iloc[1:].ewm(alpha=1 / 14, adjust=False, min_periods=14).mean()
+        loss = (-change.clip(upper=0)).iloc[1:].ewm(alpha=1 / 14, adjust=False, min_periods=14).mean()
+        np.testing.assert_allclose(result["RSI_14"].iloc[1:], 100 - 100 / (1 + gain / loss))
+        # VWAP restarts with every session of every day
+        first = result.groupby([result.index.date, result["Market"]]).head(1)
+        np.testing.assert_allclose(first["VWAP"], (first["High"] + first["Low"] + first["Close"]) / 3)
+        self.assertNotIn("SMA_5", bars)
+
+    def test_memoized_indicators_and_macd_backtest(self):
+        config = self.config("csv")
+        bars = generate_minute_bars(days=3, seed=9)
+        store_stock_data("AAPL", bars.iloc[:2000], config)
+        self.login()
+
+        with override_settings(CONFIG=config):
+            first = get_indicators("AAPL", "2024-03-04", "2024-03-06", "5m", ["macd:12,26,9"])
+            self.assertIs(get_indicators("AAPL", "2024-03-04", "2024-03-06", "5m", ["macd:12,26,9"]), first)
+            store_stock_data("AAPL", bars.iloc[2000:], config)
+            indicators = get_indicators("AAPL", "2024-03-04", "2024-03-06", "5m", ["macd:12,26,9"])
+            self.assertIsNot(indicators, first)
+            response = self.client.post(reverse("macd_strategy"), {
+                "ticker": "AAPL", "start_date": "2024-03-04", "end_date": "2024-03-06", "interval": "5m",
+                "fast": 12, "slow": 26, "signal": 9, "quantity": 10}).json()
+            invalid = self.client.post(reverse("macd_strategy"), {
+                "ticker": "AAPL", "start_date": "2024-03-04", "end_date": "2024-03-06", "interval": "5m",
+                "fast": 26, "slow": 12, "signal": 9, "quantity": 10})
+            page = self.client.get(reverse("macd_strategy"))
+        self.assertEqual(invalid.status_code, 400)
+        self.assertContains(page, "RUN BACKTEST")
+
+        # Walk the intraday bars one by one
+        intraday = indicators[indicators["Market"] == "intraday"]
+        expected, entry = [], None
+        for i, (ts, row) in enumerate(intraday.iterrows()):
+            last = i == len(intraday) - 1 or intraday.index[i + 1].date() != ts.date()
+            prev = intraday.iloc[i - 1] if i and intraday.index[i - 1].date() == ts.date() else None
+            above = row["MACD_12_26_9"] > row["MACD_SIGNAL_12_26_9"]
+            prev_above = prev is not None and prev["MACD_12_26_9"] > prev["MACD_SIGNAL_12_26_9"]
+            if entry is None and above and prev is not None and not prev_above and not last:
+                entry = ts
+            elif entry is not None and ((not above and prev_above) or last):
+                expected.append((entry.strftime("%Y-%m-%d %H:%M:%S"), ts.strftime("%Y-%m-%d %H:%M:%S")))
+                entry = None
+        self.assertGreater(len(expected), 0)
+        self.assertEqual([(r["buy_time"], r["sell_time"]) for r in response["results"]], expected)
+        summary = response["summary"]
+        self.assertEqual((summary["days"], summary["trades"]), (3, len(expected)))
+        self.assertAlmostEqual(summary["profit_loss"], sum(r["profit_loss"] for r in response["results"]), places=6)
+        self.assertEqual([len(a) for a in crossover_trades(np.array([]), np.array([]), np.array([]))], [0, 0])
+
+
+class OnlineIndicatorTest(DataTestCase):
+    def test_incremental_updates_match_batch(self):
+        specs = ["sma:5", "ema:20", "rsi:14", "atr:14", "vwap"]
+        config = self.config("csv", indicators={"online": specs})
+        bars = generate_minute_bars(days=3, seed=10)
+        expected = compute_indicators(adjust_data(bars), specs)
+        expected.index = expected.index.tz_localize(None)
+        columns = ["SMA_5", "EMA_20", "RSI_14", "ATR_14", "VWAP"]
+
+        with override_settings(CONFIG=config), mock.patch.object(
+                online, "run_indicators", wraps=online.run_indicators) as run:
+            store_stock_data("AAPL", bars.iloc[:1000], config)
+            # Re-sent bars of the current day plus new ones: only the new bars are processed
+            store_stock_data("AAPL", bars.iloc[980:1010], config)
+            self.assertEqual(len(run.call_args[0][1]), 10)
+            store_stock_data("AAPL", bars.iloc[1010:2000], config)
+            self.assertEqual(len(run.call_args[0][1]), 990)
+            # A corrected bar earlier in the day replays the day
+            corrected = bars.iloc[[1950]].copy()
+            corrected["Close"] += 0.5
+            store_stock_data("AAPL", corrected, config)
+            self.assertEqual(len(run.call_args[0][1]), 2000 - 1920)
+            store_stock_data("AAPL", bars.iloc[[1950]], config)
+            store_stock_data("AAPL", bars.iloc[2000:], config)
+            values = online.get_online_indicators("AAPL", "2024-03-04", "2024-03-06")
+            latest = online.get_latest_indicators("AAPL")
+
+        self.assertEqual(IndicatorValue.objects.filter(ticker="AAPL").count(), len(bars))
+        np.testing.assert_allclose(values[columns], expected[columns], rtol=1e-9)
+        self.assertEqual(latest["Datetime"], expected.index[-1])
+        self.assertAlmostEqual(latest["VWAP"], expected["VWAP"].iloc[-1])
+        with self.assertRaises(Exception):
+            online.create_indicators(["macd"])
+
+    def test_sma_keeps_a_running_sum(self):
+        closes = np.random.default_rng(0).normal(100, 5, 5000)
+        sma = OnlineSMA(20)
+        values = [sma.update(c, c, c, 0, 0)["SMA_20"] for c in closes]
+        np.testing.assert_allclose(values, pd.Series(closes).rolling(20).mean(), rtol=1e-9)
+        with self.assertRaises(TypeError):
+            OnlineIndicator()
+
+
+class OpeningStreamTest(DataTestCase):
+    def test_stream_matches_json_response(self):
+        config = self.config("csv")
+        for seed, ticker in enumerate(["PC", "BUYA", "BUYB"]):
+            store_stock_data(ticker, generate_minute_bars(days=3, seed=seed), config)
+        self.login()
+        params = {"start_date": "2024-03-02", "end_date": "2024-03-08", "pc_code": "PC",
+                  "strategy": "Pre-market Close", "buy_code1": "BUYA", "buy_code2": "BUYB", "quantity": 10,
+                  "buy_price_up_ratio": 0.001, "take_profit": 0.5, "stop_loss": 0.3}
+        with override_settings(CONFIG=config):
+            expected = self.client.post(reverse("opening_auto_simulation"), params).json()["results"]
+            response = self.client.post(reverse("opening_auto_simulation"), dict(params, stream="true"))
+            self.assertEqual(response["Content-Type"], "application/x-ndjson")
+            records = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+
+        self.assertEqual([r["result"] for r in records[:-1]], expected)
+        self.assertEqual({r["type"] for r in records[:-1]}, {"day"})
+        summary = records[-1]
+        self.assertEqual((summary["type"], summary["days"]), ("summary", 3))
+        self.assertAlmostEqual(summary["profit_loss"], sum(r["profit_loss"] for r in expected), places=6)
+        self.assertEqual(summary["wins"] + summary["losses"], sum(r["profit_loss_ratio"] != 0 for r in expected))
+
+
+class BatchProfitLossTest(DataTestCase):
+    def test_trades_grouped_by_stock_day(self):
+        config = self.config("csv")
+        store_stock_data("BUYA", generate_minute_bars(days=2, seed=1), config)
+        store_stock_data("BUYB", generate_minute_bars(days=2, seed=2), config)
+        trades = [
+            {"date": date, "precon_code": "PC", "strategy": "Pre-market Close", "buy_code": code,
+             "buy_price": price, "quantity": 10, "take_profit": take_profit, "stop_loss": 0.5}
+            for code in ("BUYA", "BUYB") for date in ("2024-03-04", "2024-03-05")
+            for price in ("100", "101.5") for take_profit in ("0.3", "1")
+        ]
+        trades.append(dict(trades[0], buy_price="0"))
+        trades.append(dict(trades[0], buy_code="MISSING"))
+        trades.append(dict(trades[0], quantity="ten"))
+        self.login()
+        with override_settings(CONFIG=config):
+            response = json.loads(self.client.post(
+                reverse("calculate_profitloss"), {"trade_data": json.dumps(trades)}).json())
+            expected = [simulate_trade(float(t["buy_price"]), 0.5, float(t["take_profit"]),
+                                       get_local_data(t["buy_code"], date=t["date"], market="intraday"))
+                        for t in trades[:-3]]
+
+        self.assertEqual(response["status"], "success")
+        self.assertEqual([r["result"] for r in response["simulate"][:-3]], expected)
+        self.assertEqual(response["simulate"][-3], {"result": 0, "result_type": "neutral"})
+        self.assertEqual(response["simulate"][-2:], [{"result": None, "result_type": "neutral"}] * 2)
+        self.assertEqual((response["timing"]["trades"], response["timing"]["groups"]), (19, 5))
+
+
+class ParameterSweepTest(DataTestCase):
+    def test_grid_matches_simulate_trade(self):
+        data = adjust_data(generate_minute_bars(days=4, seed=3))
+        data.index = data.index.tz_localize(None)
+        days = [day[day["Market"] == "intraday"] for _, day in data.groupby(data.index.date)]
+        refer_prices = [float(day["Open"].iloc[0]) for day in days]
+        ratios = parameter_range(-0.01, 0.01, 0.01)
+        take_profits = parameter_range(0.2, 2, 0.3)
+        stop_losses = parameter_range(0.2, 2, 0.6)
+        quantity = 7
+
+        inline = run_sweep([price_path(d) for d in days], refer_prices, ratios, take_profits, stop_losses, quantity)
+        pooled = run_sweep([price_path(d) for d in days], refer_prices, ratios, take_profits, stop_losses, quantity,
+                           max_workers=2, chunk_days=1)
+        for r, ratio in enumerate(ratios):
+            for t, take_profit in enumerate(take_profits):
+                for s, stop_loss in enumerate(stop_losses):
+                    total, trades = 0.0, 0
+                    for day, refer_price in zip(days, refer_prices):
+                        buy_price = round(refer_price * (1 + ratio), 2)
+                        result = simulate_trade(buy_price, stop_loss, take_profit, day)
+                        total += round(round(result["profit_loss"], 2) * buy_price * quantity / 100, 2)
+                        trades += result["sell_time"] != 0
+                    self.assertAlmostEqual(inline["profit_loss"][r, t, s], total, places=6)
+                    self.assertEqual(inline["trades"][r, t, s], trades)
+        for name in ("profit_loss", "profit_loss_ratio", "trades", "wins", "losses"):
+            np.testing.assert_allclose(pooled[name], inline[name])
+        self.assertEqual((inline["days"], pooled["days"]), (4, 4))
+
+    def test_sweep_endpoint_matches_auto_simulation(self):
+        config = self.config("csv")
+        for seed, ticker in enumerate(["PC", "BUYA", "BUYB"]):
+            store_stock_data(ticker, generate_minute_bars(days=3, seed=seed), config)
+        self.login()
+        params = {"start_date": "2024-03-04", "end_date": "2024-03-08", "pc_code": "PC",
+                  "strategy": "Pre-market Close", "buy_code1": "BUYA", "buy_code2": "BUYB", "quantity": 10}
+        with override_settings(CONFIG=config):
+            auto = self.client.post(reverse("opening_auto_simulation"), dict(
+                params, buy_price_up_ratio=0.001, take_profit=0.5, stop_loss=0.5)).json()
+            swept = self.client.post(reverse("opening_sweep_simulation"), dict(
+                params, buy_price_up_ratio_start=0, buy_price_up_ratio_stop=0.002, buy_price_up_ratio_step=0.001,
+                take_profit_start=0.5, take_profit_stop=1, take_profit_step=0.5,
+                stop_loss_start=0.5, top=100)).json()
+
+        self.assertEqual(swept["days"], len(auto["results"]))
+        self.assertEqual(swept["combinations"], 6)
+        row = [r for r in swept["results"] if (r["buy_price_up_ratio"], r["take_profit"]) == (0.001, 0.5)][0]
+        self.assertAlmostEqual(row["profit_loss"], sum(r["profit_loss"] for r in auto["results"]), places=6)
+        self.assertEqual(len(swept["heatmap"]["matrices"]), 3)
+
+
+class RefreshCoalescingTest(DataDirMixin, TransactionTestCase):
+    def test_concurrent_refreshes_share_one_fetch(self):
+
+        class CountingProvider(FixtureProvider):
+            calls = 0
+
+            def history(self, ticker, **kwargs):
+                CountingProvider.calls += 1
+                return super().history(ticker, **kwargs)
+        config = self.config("csv", fetcher={"requests_per_second": 1000, "burst": 1000})
+        provider = CountingProvider(days=2, latency=0.5)
+        counts = []
+        with override_settings(CONFIG=config):
+            threads = [threading.Thread(target=lambda: counts.append(fetch_and_store("AAA", provider=provider)))
+                       for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(CountingProvider.calls, 1)
+            self.assertEqual(counts, [2 * 960] * 8)
+            self.assertEqual(StockCatalog.objects.get(ticker="AAA").row_count, 2 * 960)
+
+            # A refresh made after the stored one fetches again (the whole period: the
+            # fixture bars are older than it) and upserts the same rows
+            self.assertEqual(fetch_and_store("AAA", provider=provider), 2 * 960)
+            self.assertEqual(CountingProvider.calls, 2)
+            self.assertEqual(StockCatalog.objects.get(ticker="AAA").row_count, 2 * 960)
+
+    def test_ticker_lock_serializes_writers(self):
+        config = self.config("csv")
+        events = []
+
+        def writer(name):
+            with ticker_lock("AAA", config):
+                # Reentrant within a thread
+                with ticker_lock("AAA", config):
+                    events.append(f"{name} start")
+                    time.sleep(0.05)
+                    events.append(f"{name} end")
+
+        threads = [threading.Thread(target=writer, args=(name,)) for name in "abc"]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual([e.split()[1] for e in events], ["start", "end"] * 3)
+        self.assertTrue(os.path.exists(os.path.join(self.data_dir, "AAA.lock")))
+
+        flight = SingleFlight()
+        with self.assertRaises(ZeroDivisionError):
+            flight.do("x", lambda: 1 / 0)
+        self.assertEqual(flight.do("x", lambda: 42), (42, False))
+
+
+class BackfillTest(DataTestCase):
+    def test_windows_are_fetched_concurrently_and_stitched(self):
+
+        class EdgeProvider(FixtureProvider):
+            # Returns one bar before each window as well, like providers with inclusive edges
+            active = 0
+            peak = 0
+            lock = threading.Lock()
+
+            def history(self, ticker, start=None, end=None, **kwargs):
+                with self.lock:
+                    EdgeProvider.active += 1
+                    EdgeProvider.peak = max(EdgeProvider.peak, EdgeProvider.active)
+                try:
+                    return super().history(ticker, start=start - pd.Timedelta(hours=6), end=end, **kwargs)
+                finally:
+                    with self.lock:
+                        EdgeProvider.active -= 1
+
+        windows = backfill_windows("2024-03-04", "2024-03-22", 7)
+        self.assertEqual([(s.strftime("%m-%d"), e.strftime("%m-%d")) for s, e in windows],
+                         [("03-04", "03-11"), ("03-11", "03-18"), ("03-18", "03-23")])
+        self.assertEqual(str(windows[1][0].tz), "US/Eastern")
+        self.assertEqual(windows[1][0].hour, 0)  # across the DST change of 2024-03-10
+        config = self.config("csv", fetcher={"requests_per_second": 1000, "burst": 1000})
+        provider = EdgeProvider(days=15, latency=0.2)
+        with override_settings(CONFIG=config):
+            result = backfill("AAA", "2024-03-04", "2024-03-22", window_days=2, max_workers=4, provider=provider)
+            stored = get_local_data("AAA")
+
+        self.assertEqual((result["windows"], result["errors"]), (10, {}))
+        self.assertEqual(EdgeProvider.peak, 4)
+        self.assertEqual(result["bars"], 15 * 960)
+        self.assertGreater(result["bars_per_second"], 0)
+        self.assertEqual(StockCatalog.objects.get(ticker="AAA").row_count, 15 * 960)
+        expected = generate_minute_bars(days=15, seed=zlib.crc32(b"AAA"))
+        np.testing.assert_allclose(stored["Close"].to_numpy(), expected["Close"].to_numpy())
+
+    def test_command_reports_throughput_and_failed_windows(self):
+
+        class GapProvider(FixtureProvider):
+            def history(self, ticker, start=None, end=None, **kwargs):
+                if start.date() == pd.Timestamp("2024-03-06").date():
+                    raise Exception("window not available")
+                return super().history(ticker, start=start, end=end, **kwargs)
+        config = self.config("csv", fetcher={"provider": "fixture", "requests_per_second": 1000, "burst": 1000})
+        out = StringIO()
+        with override_settings(CONFIG=config):
+            call_command("backfill", "aaa", "--start", "2024-03-04", "--end", "2024-03-08", "--window-days", "2",
+                         stdout=out)
+            self.assertIn("AAA: 4800 bars from 3 windows", out.getvalue())
+            self.assertIn("bars/sec", out.getvalue())
+            with self.assertRaises(CommandError):
+                call_command("backfill", "AAA", "--start", "2024-03-08", "--end", "2024-03-04")
+
+            # The other windows are stored; the failed one is reported
+            result = backfill("BBB", "2024-03-04", "2024-03-08", window_days=2, retries=1, provider=GapProvider())
+            self.assertEqual(result["errors"], {"2024-03-06 - 2024-03-07": "Failed to fetch data after multiple "
+                                                                         "attempts: window not available"})
+            self.assertEqual((result["bars"], StockCatalog.objects.get(ticker="BBB").row_count), (3 * 960, 3 * 960))
+
+            err = StringIO()
+            with mock.patch("core.data.backfill.get_provider", return_value=GapProvider()), \
+                    self.assertRaises(CommandError):
+                call_command("backfill", "CCC", "--start", "2024-03-04", "--end", "2024-03-08", "--window-days", "2",
+                             "--retries", "1", stdout=StringIO(), stderr=err)
+            self.assertIn("CCC: window 2024-03-06 - 2024-03-07 failed", err.getvalue())
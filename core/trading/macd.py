@@ -0,0 +1,99 @@
+"""
+Module to backtest the MACD strategy.
+
+The strategy trades the intraday session only and is flat overnight:
+  - Buy at the close of the bar where the MACD line crosses above its signal line.
+  - Sell at the close of the bar where it crosses back below, or at the last intraday bar.
+MACD is computed on all bars of the range (see core/analysis/indicators.py), so it is
+warmed up by the pre-market before the first intraday trade of a day. Entries and exits
+are found with array operations over the whole range instead of walking the bars.
+"""
+import numpy as np
+import pandas as pd
+from core.analysis.indicators import get_indicators
+
+
+def crossover_trades(macd, signal, days):
+    """
+    Return the entry and exit positions of the trades of a MACD crossover series.
+
+    Parameters:
+      macd, signal (ndarray): The MACD and signal lines of the tradable bars.
+      days (ndarray): The trading day of every bar; positions are closed at the last bar of a day.
+
+    Returns:
+      tuple: (entries, exits), int arrays of equal length with entries[i] < exits[i].
+    """
+    n = len(macd)
+    if n == 0:
+        return np.array([], dtype=int), np.array([], dtype=int)
+    above = macd > signal  # False where either line is NaN
+    day_start = np.r_[True, days[1:] != days[:-1]]
+    day_end = np.r_[days[1:] != days[:-1], True]
+    prev_above = np.r_[False, above[:-1]]
+    # Crossings are only counted within a day
+    cross_up = above & ~prev_above & ~day_start
+    cross_down = ~above & prev_above & ~day_start
+
+    # Position after each bar: 1 after a cross up, 0 after a cross down, carried forward within the day
+    state = np.where(cross_up, 1.0, np.where(cross_down | day_start, 0.0, np.nan))
+    position = pd.Series(state).ffill().to_numpy(copy=True)
+    # Positions opened at the last bar of a day are never held
+    position[day_end] = 0.0
+    change = np.diff(np.r_[0.0, position])
+    entries = np.flatnonzero(change > 0)
+    exits = np.flatnonzero(change < 0)
+    return entries, exits
+
+
+def run_macd_backtest(ticker, start_date, end_date, interval='5m', fast=12, slow=26, signal=9, quantity=10):
+    """
+    Backtest the MACD strategy on a ticker.
+
+    Parameters:
+      ticker (str): The stock ticker symbol.
+      start_date, end_date (date): The date range (inclusive).
+      interval (str): The bar interval, e.g. '1m' or '5m'.
+      fast, slow, signal (int): The MACD periods.
+      quantity (int): The number of shares per trade.
+
+    Returns:
+      dict: results (one dictionary per trade with date, buy_time, buy_price, sell_time,
+            sell_price, quantity, profit_loss_ratio and profit_loss) and summary (days,
+            trades, wins, losses, profit_loss and profit_loss_ratio totals).
+    """
+    spec = f"macd:{fast},{slow},{signal}"
+    bars = get_indicators(ticker, start_date, end_date, interval, [spec])
+    suffix = f"{fast}_{slow}_{signal}"
+    intraday = bars[bars['Market'].astype(str) == 'intraday']
+    days = intraday.index.normalize().to_numpy()
+    entries, exits = crossover_trades(intraday[f"MACD_{suffix}"].to_numpy(dtype=float),
+                                      intraday[f"MACD_SIGNAL_{suffix}"].to_numpy(dtype=float), days)
+
+    close = intraday['Close'].to_numpy(dtype=float)
+    times = intraday.index
+    results = []
+    for entry, exit_ in zip(entries.tolist(), exits.tolist()):
+        buy_price = round(float(close[entry]), 2)
+        sell_price = round(float(close[exit_]), 2)
+        profit_loss_ratio = round((sell_price - buy_price) / buy_price * 100.0, 2) if buy_price else 0
+        results.append({
+            'date': times[entry].strftime('%Y-%m-%d'),
+            'buy_time': times[entry].strftime('%Y-%m-%d %H:%M:%S'),
+            'buy_price': buy_price,
+            'sell_time': times[exit_].strftime('%Y-%m-%d %H:%M:%S'),
+            'sell_price': sell_price,
+            'quantity': quantity,
+            'profit_loss_ratio': profit_loss_ratio,
+            'profit_loss': round(profit_loss_ratio * buy_price * quantity / 100, 2),
+        })
+
+    summary = {
+        'days': int(len(np.unique(days))),
+        'trades': len(results),
+        'wins': sum(r['profit_loss'] > 0 for r in results),
+        'losses': sum(r['profit_loss'] < 0 for r in results),
+        'profit_loss': round(sum(r['profit_loss'] for r in results), 2),
+        'profit_loss_ratio': round(sum(r['profit_loss_ratio'] for r in results), 2),
+    }
+    return {'results': results, 'summary': summary}
@@ -0,0 +1,81 @@
+"""
+Module to prepare the trading days of the opening buy strategy.
+
+For every day in a date range the strategy picks the stock to buy and its reference price
+from the pre-condition stock, and loads the buy stock's intraday minute bars.
+opening_auto_simulation and the parameter sweep both work on these prepared days,
+so the bars of a day are loaded once however many parameter combinations are simulated.
+"""
+from core.data.querier import get_simulation_bars, query_local_stock_data, get_stock_info_by_date
+from core.data.trading_calendar import trading_sessions
+
+
+def resolve_opening_day(pc_code, strategy, buy_code1, buy_code2, date_str):
+    """
+    Pick the buy stock and reference price of one day.
+
+    Parameters:
+      pc_code (str): The pre-condition stock ticker.
+      strategy (str): The reference price strategy (see TradingOpeningForm).
+      buy_code1 (str): The stock bought when the pre-condition stock's pre-market change is >= 0.
+      buy_code2 (str): The stock bought otherwise.
+      date_str (str): The day, 'YYYY-MM-DD'.
+
+    Returns:
+      dict or None: buy_code, refer_ratio (the pre-market change in %, None if the strategy
+                    does not use it) and refer_price; None if the day has no data.
+    """
+    buy_code = buy_code1
+    refer_ratio = None
+    if strategy == 'Pre-market Close':
+        info = get_stock_info_by_date(pc_code, date_str)
+        if not info:  # current_date取不到数据，说明此非交易日
+            return None
+        refer_ratio = round(info['pre_market_change'], 2)
+        buy_code = buy_code1 if refer_ratio >= 0 else buy_code2
+        bars = query_local_stock_data(buy_code, date_str, date_str, '1d')
+        if not bars:
+            return None
+        refer_price = bars[0]['markets']['pre-market']['Close']
+    elif strategy == 'Pre-market Avg':
+        # 获取盘前平均价格
+        refer_price = 0
+    elif strategy == 'Pre-market Weighted':
+        # 获取加权平均价格
+        refer_price = 0
+    elif strategy == 'Intraday Open':
+        refer_price = get_stock_info_by_date(pc_code, date_str)['intraday_Open']
+    else:
+        refer_price = 0  # 默认参考价格
+    return {'buy_code': buy_code, 'refer_ratio': refer_ratio, 'refer_price': refer_price}
+
+
+def iter_opening_days(pc_code, strategy, buy_code1, buy_code2, start_date, end_date):
+    """
+    Yield the prepared days from start_date to end_date (inclusive) that have data, one at a time,
+    so only the bars of the current day are held in memory. Only the trading sessions of the
+    range are visited (see core/data/trading_calendar.py).
+
+    Yields:
+      dict: date, buy_code, refer_ratio, refer_price and minute_data (the buy stock's intraday bars,
+            see get_simulation_bars).
+    """
+    # Only the sessions are visited, weekends and holidays are not probed
+    for current_date in trading_sessions(start_date, end_date, [pc_code, buy_code1, buy_code2]):
+        current_date_str = current_date.strftime('%Y-%m-%d')
+        day = resolve_opening_day(pc_code, strategy, buy_code1, buy_code2, current_date_str)
+        if day is not None:
+            day['date'] = current_date
+            # Retrieve 1-minute data for the given ticker and date
+            day['minute_data'] = get_simulation_bars(day['buy_code'], current_date_str, market='intraday')
+            yield day
+
+
+def prepare_opening_days(pc_code, strategy, buy_code1, buy_code2, start_date, end_date):
+    """
+    Prepare every day from start_date to end_date (inclusive) that has data.
+
+    Returns:
+      list: One dictionary per day, see iter_opening_days.
+    """
+    return list(iter_opening_days(pc_code, strategy, buy_code1, buy_code2, start_date, end_date))
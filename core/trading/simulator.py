@@ -2,13 +2,70 @@
 Module to simulate trades based on 1-minute data.
 
 This function now expects the minute-level data to be passed as an argument.
-It iterates over the data (for a given date) and compares the buy_price
+It walks through the data (for a given date) and compares the buy_price
 with each minute's Open, Low, High, and Close in order.
 If a condition is met, it returns the profit/loss percentage:
   - A positive number indicates take profit.
   - A negative number indicates stop loss.
 If no condition is met across all minutes, it returns 0.
+
+The walk is vectorized: the bars are flattened into one price path
+(Open, Low, High, Close of the first bar, then of the second bar, ...), the stop and
+target conditions are evaluated on the whole path at once, and argmax finds the first hit.
+
+Besides DataFrames, the minute data can be the records of core.data.mmap_store.read_mmap_bars,
+so bars stored with the "mmap" method are simulated straight from the mapped file.
 """
+import numpy as np
+
+# Order in which the prices of a bar are visited
+PRICE_PATH_COLUMNS = ['Open', 'Low', 'High', 'Close']
+
+NO_TRADE = {'profit_loss': 0, 'sell_time': 0, 'buy_price': 0, 'sell_price': 0}
+
+
+def price_path(minute_data):
+    """
+    Flatten the bars into the order the prices are visited: O, L, H, C of each bar.
+
+    Returns:
+      ndarray: float64 array of length 4 * len(minute_data); position // 4 is the bar.
+    """
+    # Fill column by column; selecting a column subset of the frame first costs more than the simulation
+    path = np.empty((len(minute_data), len(PRICE_PATH_COLUMNS)))
+    for i, column in enumerate(PRICE_PATH_COLUMNS):
+        path[:, i] = np.asarray(minute_data[column], dtype=float)
+    return path.ravel()
+
+
+def _bar_time(minute_data, bar):
+    if isinstance(minute_data, np.ndarray):
+        # mmap records: t is epoch minutes in market time
+        return str(np.datetime64(int(minute_data['t'][bar]), 'm').astype('datetime64[s]')).replace('T', ' ')
+    return minute_data.index[bar].strftime('%Y-%m-%d %H:%M:%S')
+
+
+def first_exit(buy_price, stop_loss, take_profit, path):
+    """
+    Return the position in the price path where the trade is closed, or -1.
+
+    A position closes the trade when its price is below buy_price by more than stop_loss
+    percent, or above it by more than take_profit percent.
+    """
+    if buy_price == 0:
+        # Same as the per-price loop, which divides by the buy price at the first price
+        # that differs from it
+        if np.any((path < 0) | (path > 0)):
+            raise ZeroDivisionError("float division by zero")
+        return -1
+    loss_pct = (buy_price - path) / buy_price * 100.0
+    profit_pct = (path - buy_price) / buy_price * 100.0
+    hits = ((path < buy_price) & (loss_pct > stop_loss)) | ((path > buy_price) & (profit_pct > take_profit))
+    position = int(hits.argmax()) if len(hits) else 0
+    if not len(hits) or not hits[position]:
+        return -1
+    return position
+
 
 def simulate_trade(buy_price, stop_loss, take_profit, minute_data):
     """
@@ -20,30 +77,45 @@ def simulate_trade(buy_price, stop_loss, take_profit, minute_data):
       take_profit (float): Take profit threshold percentage (e.g., 5 means 5%).
       minute_data (DataFrame): A pandas DataFrame containing 1-minute data
                                for a specific date. Must include columns 'Open', 'Low', 'High', 'Close'.
+                               mmap records (see read_mmap_bars) are accepted as well.
 
     Returns:
-      float: The profit/loss percentage that triggered the sell.
-             A positive value for profit, negative for loss, or 0 if no condition met.
-    """
-    # Iterate over each minute's data in chronological order
-    for idx, row in minute_data.iterrows():
-        # Check the prices in the order: Open, Low, High, Close
-        prices = [row['Open'], row['Low'], row['High'], row['Close']]
-        for price in prices:
-            sell_time = 0
-            if price < buy_price:
-                loss_pct = (buy_price - price) / buy_price * 100.0
-                if loss_pct > stop_loss:#如果蜡烛图最低点比止损比例大，则价格肯定到过止损点，按止损比例计算
-                    result_value = -round(stop_loss, 2)
-                    sell_price = buy_price * (1 - stop_loss/100)
-                    sell_time = idx.strftime('%Y-%m-%d %H:%M:%S')
-                    return {'profit_loss':result_value, 'sell_time':sell_time, 'buy_price': buy_price, 'sell_price':  round(price,2)}
-            elif price > buy_price:
-                profit_pct = (price - buy_price) / buy_price * 100.0
-                if profit_pct > take_profit:
-                    result_value = round(profit_pct, 2)
-                    sell_time = idx.strftime('%Y-%m-%d %H:%M:%S')
-                    return {'profit_loss':result_value, 'sell_time':sell_time, 'buy_price': buy_price, 'sell_price':  round(price,2)}
-        # Continue to next minute if no condition met
-    return {'profit_loss':0, 'sell_time':0, 'buy_price': 0, 'sell_price': 0}
+      dict: profit_loss is the profit/loss percentage that triggered the sell
+            (positive for profit, negative for loss), sell_time the time of the bar,
+            sell_price the price that triggered it. All values are 0 if no condition is met.
+    """
+    return _trade_result(buy_price, stop_loss, take_profit, minute_data, price_path(minute_data))
+
+
+def simulate_trades(trades, minute_data):
+    """
+    Simulate several trades on the same minute-level data.
+
+    The price path is built once and shared by all trades, which is what makes a batch
+    cheaper than calling simulate_trade per trade.
+
+    Parameters:
+      trades (list): (buy_price, stop_loss, take_profit) tuples.
+      minute_data (DataFrame): See simulate_trade.
+
+    Returns:
+      list: One result dictionary per trade, as returned by simulate_trade.
+    """
+    path = price_path(minute_data)
+    return [_trade_result(buy_price, stop_loss, take_profit, minute_data, path)
+            for buy_price, stop_loss, take_profit in trades]
+
+
+def _trade_result(buy_price, stop_loss, take_profit, minute_data, path):
+    position = first_exit(buy_price, stop_loss, take_profit, path)
+    if position < 0:
+        return dict(NO_TRADE)
 
+    price = float(path[position])
+    sell_time = _bar_time(minute_data, position // 4)
+    if price < buy_price:
+        # 如果蜡烛图最低点比止损比例大，则价格肯定到过止损点，按止损比例计算
+        result_value = -round(stop_loss, 2)
+    else:
+        result_value = round((price - buy_price) / buy_price * 100.0, 2)
+    return {'profit_loss': result_value, 'sell_time': sell_time, 'buy_price': buy_price, 'sell_price': round(price, 2)}
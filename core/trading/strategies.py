@@ -25,8 +25,8 @@ TRADING_STRATEGIES = [
     Strategy(
         3,
         "MACD Strategy",
-        "",
-        "opening_buy_strategy",
-        "inactive"
+        "Intraday MACD and Signal Line Crossover Strategy",
+        "macd_strategy",
+        "testing"
     )
 ]
\ No newline at end of file
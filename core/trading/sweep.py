@@ -0,0 +1,192 @@
+"""
+Module to backtest a grid of (buy_price_up_ratio, take_profit, stop_loss) combinations.
+
+Each day's intraday price path (see core.trading.simulator.price_path) is evaluated against
+the whole grid at once instead of calling simulate_trade per combination:
+  - For every buy price, the loss and profit percentages along the path are turned into
+    running maxima (cummax). The first position where the running loss exceeds a stop loss
+    is found with searchsorted, for all stop losses at once, and likewise for take profits.
+  - The exit of every (take_profit, stop_loss) pair is the earlier of the two positions,
+    computed by broadcasting.
+The results match simulate_trade combination by combination. Days are split into chunks
+that are evaluated in a process pool.
+
+This module only depends on NumPy so the pool workers do not need Django.
+"""
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+# Defaults for the sweep section of config.yaml
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_CHUNK_DAYS = 20
+DEFAULT_MAX_COMBINATIONS = 20000
+
+# Per-combination totals accumulated over the days
+TOTAL_FIELDS = ('profit_loss', 'profit_loss_ratio', 'trades', 'wins', 'losses')
+
+
+def parameter_range(start, stop, step):
+    """
+    Return the values from start to stop (inclusive) in steps of step.
+    A missing or non-positive step, or stop below start, gives just start.
+    """
+    if step is None or step <= 0 or stop is None or stop <= start:
+        return np.array([float(start)])
+    count = int(np.floor((stop - start) / step + 1e-9)) + 1
+    return np.round(start + step * np.arange(count), 6)
+
+
+def first_exits(buy_price, path, take_profits, stop_losses):
+    """
+    Return the exit position in path for every (take_profit, stop_loss) pair of one buy price.
+
+    Returns:
+      ndarray: int array of shape (len(take_profits), len(stop_losses)); len(path) means no exit.
+    """
+    loss_pct = np.where(path < buy_price, (buy_price - path) / buy_price * 100.0, -np.inf)
+    profit_pct = np.where(path > buy_price, (path - buy_price) / buy_price * 100.0, -np.inf)
+    # Missing prices never trigger
+    loss_pct[np.isnan(loss_pct)] = -np.inf
+    profit_pct[np.isnan(profit_pct)] = -np.inf
+    # First position where the running maximum exceeds each threshold
+    loss_at = np.searchsorted(np.maximum.accumulate(loss_pct), stop_losses, side='right')
+    profit_at = np.searchsorted(np.maximum.accumulate(profit_pct), take_profits, side='right')
+    return np.minimum(profit_at[:, None], loss_at[None, :])
+
+
+def _exit_results(buy_price, path, exits, stop_losses, quantity):
+    """
+    Return the profit/loss ratio and amount of every exit, rounded exactly like
+    simulate_trade and opening_auto_simulation (Python round, not np.round).
+
+    Results only depend on the exit position (take profit) or on the stop loss, so only
+    the distinct exits are rounded in Python.
+    """
+    n = len(path)
+    loss_ratio = np.array([round(-round(s, 2), 2) for s in stop_losses.tolist()])
+    loss_amount = np.array([round(r * buy_price * quantity / 100, 2) for r in loss_ratio.tolist()])
+    positions, inverse = np.unique(exits, return_inverse=True)
+    is_loss = np.zeros(len(positions), dtype=bool)
+    ratio = np.zeros(len(positions))
+    amount = np.zeros(len(positions))
+    for i, position in enumerate(positions.tolist()):
+        if position == n:
+            continue
+        price = float(path[position])
+        if price < buy_price:
+            is_loss[i] = True
+        else:
+            ratio[i] = round(round((price - buy_price) / buy_price * 100.0, 2), 2)
+            amount[i] = round(ratio[i] * buy_price * quantity / 100, 2)
+    inverse = inverse.reshape(exits.shape)
+    loss = is_loss[inverse]
+    return (np.where(loss, loss_ratio[None, :], ratio[inverse]),
+            np.where(loss, loss_amount[None, :], amount[inverse]))
+
+
+def evaluate_days(paths, refer_prices, ratios, take_profits, stop_losses, quantity):
+    """
+    Simulate every combination on the given days and add up the results.
+
+    Parameters:
+      paths (list): One price path (ndarray) per day.
+      refer_prices (list): The reference price of each day.
+      ratios, take_profits, stop_losses (ndarray): The parameter values.
+      quantity (int): The number of shares per trade.
+
+    Returns:
+      dict: For each name in TOTAL_FIELDS, an array of shape
+            (len(ratios), len(take_profits), len(stop_losses)), plus 'days', the number of days.
+            Days whose buy price is 0 count as days without a trade.
+    """
+    shape = (len(ratios), len(take_profits), len(stop_losses))
+    totals = {name: np.zeros(shape) for name in TOTAL_FIELDS}
+    totals['days'] = 0
+    for path, refer_price in zip(paths, refer_prices):
+        totals['days'] += 1
+        for r, ratio in enumerate(ratios.tolist()):
+            # 购买价为参考价上浮一定比率
+            buy_price = round(refer_price * (1 + ratio), 2)
+            if buy_price == 0 or len(path) == 0:
+                continue
+            exits = first_exits(buy_price, path, take_profits, stop_losses)
+            ratio_result, amount = _exit_results(buy_price, path, exits, stop_losses, quantity)
+            totals['profit_loss'][r] += amount
+            totals['profit_loss_ratio'][r] += ratio_result
+            totals['trades'][r] += exits < len(path)
+            totals['wins'][r] += ratio_result > 0
+            totals['losses'][r] += ratio_result < 0
+    return totals
+
+
+def _merge_totals(totals, other):
+    for name in TOTAL_FIELDS:
+        totals[name] += other[name]
+    totals['days'] += other['days']
+    return totals
+
+
+def run_sweep(paths, refer_prices, ratios, take_profits, stop_losses, quantity,
+              max_workers=DEFAULT_MAX_WORKERS, chunk_days=DEFAULT_CHUNK_DAYS):
+    """
+    Evaluate the grid over all days, in a process pool by chunks of chunk_days days.
+    Date ranges of a single chunk are evaluated in this process.
+
+    Returns:
+      dict: See evaluate_days.
+    """
+    ratios, take_profits, stop_losses = (np.asarray(v, dtype=float) for v in (ratios, take_profits, stop_losses))
+    chunks = [(paths[i:i + chunk_days], refer_prices[i:i + chunk_days]) for i in range(0, len(paths), chunk_days)]
+    if len(chunks) <= 1 or max_workers <= 1:
+        return evaluate_days(paths, refer_prices, ratios, take_profits, stop_losses, quantity)
+
+    totals = evaluate_days([], [], ratios, take_profits, stop_losses, quantity)
+    with ProcessPoolExecutor(max_workers=min(max_workers, len(chunks))) as executor:
+        futures = [executor.submit(evaluate_days, chunk_paths, chunk_prices, ratios, take_profits,
+                                   stop_losses, quantity)
+                   for chunk_paths, chunk_prices in chunks]
+        for future in futures:
+            _merge_totals(totals, future.result())
+    return totals
+
+
+def rank_results(totals, ratios, take_profits, stop_losses, limit=None):
+    """
+    Turn the totals into a result table ranked by total profit/loss and a heatmap matrix.
+
+    Returns:
+      tuple: (results, heatmap). results is a list of dictionaries, best first. heatmap has
+             the take_profit (x) and stop_loss (y) values and, for each buy_price_up_ratio,
+             the matrix z[y][x] of total profit/loss.
+    """
+    profit_loss = totals['profit_loss']
+    order = np.argsort(-profit_loss, axis=None, kind='stable')
+    if limit:
+        order = order[:limit]
+    results = []
+    for rank, flat in enumerate(order.tolist(), start=1):
+        r, t, s = np.unravel_index(flat, profit_loss.shape)
+        trades = int(totals['trades'][r, t, s])
+        results.append({
+            'rank': rank,
+            'buy_price_up_ratio': float(ratios[r]),
+            'take_profit': float(take_profits[t]),
+            'stop_loss': float(stop_losses[s]),
+            'profit_loss': round(float(profit_loss[r, t, s]), 2),
+            'profit_loss_ratio': round(float(totals['profit_loss_ratio'][r, t, s]), 2),
+            'trades': trades,
+            'wins': int(totals['wins'][r, t, s]),
+            'losses': int(totals['losses'][r, t, s]),
+            'win_rate': round(float(totals['wins'][r, t, s]) / trades * 100, 2) if trades else 0,
+        })
+    heatmap = {
+        'x_label': 'take_profit',
+        'y_label': 'stop_loss',
+        'x': [float(v) for v in take_profits],
+        'y': [float(v) for v in stop_losses],
+        'matrices': [
+            {'buy_price_up_ratio': float(ratio), 'z': np.round(profit_loss[r].T, 2).tolist()}
+            for r, ratio in enumerate(ratios)
+        ],
+    }
+    return results, heatmap
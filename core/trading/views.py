@@ -4,23 +4,28 @@ Trading simulation view.
 This view processes simulation inputs for 5 groups.
 For each simulation row, it:
   - Retrieves the selected date, buy price, stop loss, and take profit from POST data.
-  - Calls get_local_data() (from core/utils.py) to obtain the 1-minute data for that ticker and date.
+  - Calls get_simulation_bars() (from core/data/querier.py) to obtain the 1-minute data for that ticker and date.
   - Passes the retrieved data to simulate_trade() to calculate the profit/loss percentage.
   - Returns a JSON response with the numeric result and its type.
 """
 
 import os
+import time
 import pandas as pd
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
+from django.core.serializers.json import DjangoJSONEncoder
 from django.views.decorators.http import require_POST
-from core.trading.simulator import simulate_trade
+from core.trading.simulator import simulate_trade, simulate_trades, price_path
 from django.conf import settings
 from django.shortcuts import render
-from core.data.querier import get_local_data, query_local_stock_data, get_stock_info_by_date, get_all_stock_list
+from core.data.querier import get_simulation_bars, get_stock_info_by_range, get_all_stock_list
 import json
-from core.forms import TradingOpeningForm
+from core.forms import TradingOpeningForm, OpeningSweepForm, MACDStrategyForm
+from core.trading.opening import iter_opening_days, prepare_opening_days
+from core.trading import sweep
+from core.trading.macd import run_macd_backtest
 from .strategies import TRADING_STRATEGIES
-from datetime import timedelta
+from datetime import datetime
 
 def get_trading_strategies():
     return TRADING_STRATEGIES
@@ -51,7 +56,7 @@ def swing_buy_strategy_view(request):
                     take_profit = float(request.POST.get(f"take_profit_{i}"))
 
                     # Retrieve 1-minute data for the given ticker and date
-                    minute_data = get_local_data(ticker, date=sim_date)
+                    minute_data = get_simulation_bars(ticker, sim_date)
 
                     # Pass the retrieved data to simulate_trade
                     result_value = simulate_trade(buy_price, stop_loss, take_profit, minute_data)
@@ -81,10 +86,12 @@ def opening_buy_strategy_view(request):
     stocks = get_all_stock_list()
 
     form = TradingOpeningForm()
+    sweep_form = OpeningSweepForm()
 
     context = {
         "stocks": stocks,
         "form":form,
+        "sweep_form": sweep_form,
     }
     return render(request, "core/trading/opening_buy_strategy.html", context)
 
@@ -96,14 +103,12 @@ def query_stock_data(request):
         ticker = request.POST.get('query_stock_code')
         start_date_str = request.POST.get('start_date')
         end_date_str = request.POST.get('end_date')
-        start_date = datetime.strptime(start_date_str, '%Y-%m-%d')
-        end_date = datetime.strptime(end_date_str, '%Y-%m-%d')
+        start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
+        end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
 
+        # All trading days of the range in one pass
         price_data = []
-        current_date = start_date
-
-        while current_date <= end_date:
-            info = get_stock_info_by_date(ticker, current_date)
+        for info in get_stock_info_by_range(ticker, start_date, end_date):
             price_data.append({
                 'date': info['date'],
                 'pre_market_open': info['pre_market_open'],
@@ -114,14 +119,68 @@ def query_stock_data(request):
                 'intraday_change': f'{info["intraday_change"]:.2f}%'
             })
 
-            current_date += timedelta(days=1)
-
         print('------------price_data:', price_data)
         # 返回 JSON 响应
         return JsonResponse(json.dumps(price_data), safe=False)
 
     return render(request, 'trading/opening_buy_strategy.html')
 
+def _opening_trade_result(day, pc_code, strategy, buy_price_up_ratio, quantity, take_profit, stop_loss):
+    refer_price = day['refer_price']
+    # 购买价为盘前收盘价 上浮一定比率
+    buy_price = round(refer_price * (1+buy_price_up_ratio),2)
+
+    result_value = simulate_trade(buy_price, stop_loss, take_profit, day['minute_data'])
+    profit_loss_ratio = round(result_value['profit_loss'],2)
+    profit_loss = round(profit_loss_ratio * buy_price*quantity / 100, 2)
+
+    return {'date': day['date'],
+            'pc_code': pc_code,
+            'strategy': strategy,
+            'strategy_result': day['refer_ratio'],
+            'pc_code_refer_price': refer_price,
+            'buy_code': day['buy_code'],
+            'buy_price_up_ratio': buy_price_up_ratio,
+            'buy_price': buy_price,
+            'quantity': quantity,
+            'take_profit': take_profit,
+            'stop_loss': stop_loss,
+            'sell_price': result_value['sell_price'],
+            'profit_loss_ratio': profit_loss_ratio,
+            'profit_loss': profit_loss,
+            'sell_time': result_value['sell_time'],
+            }
+
+
+def _stream_opening_results(days, *params):
+    """
+    Yield one NDJSON line per day ({"type": "day", "result": ...}) as soon as it is simulated,
+    then a summary line ({"type": "summary", ...}) with the totals of the run.
+    Only the current day is kept in memory. An error ends the stream with an "error" line.
+    """
+    started = time.perf_counter()
+    summary = {'type': 'summary', 'days': 0, 'trades': 0, 'wins': 0, 'losses': 0,
+               'profit_loss': 0.0, 'profit_loss_ratio': 0.0}
+    try:
+        for day in days:
+            result = _opening_trade_result(day, *params)
+            summary['days'] += 1
+            summary['trades'] += result['sell_time'] != 0
+            summary['wins'] += result['profit_loss_ratio'] > 0
+            summary['losses'] += result['profit_loss_ratio'] < 0
+            summary['profit_loss'] += result['profit_loss']
+            summary['profit_loss_ratio'] += result['profit_loss_ratio']
+            yield json.dumps({'type': 'day', 'result': result}, cls=DjangoJSONEncoder) + '\n'
+    except Exception as e:
+        print(f"Error in opening_auto_simulation stream: {e}")
+        yield json.dumps({'type': 'error', 'error': str(e)}) + '\n'
+        return
+    summary['profit_loss'] = round(summary['profit_loss'], 2)
+    summary['profit_loss_ratio'] = round(summary['profit_loss_ratio'], 2)
+    summary['seconds'] = round(time.perf_counter() - started, 4)
+    yield json.dumps(summary) + '\n'
+
+
 def opening_auto_simulation(request):
     if request.method == 'POST':
         print('In opening_auto_simulation:', request.POST)
@@ -139,71 +198,15 @@ def opening_auto_simulation(request):
             quantity = form.cleaned_data['quantity']
             take_profit = form.cleaned_data['take_profit']
             stop_loss = form.cleaned_data['stop_loss']
-            buy_code = buy_code1
-
-            current_date = start_date
-            while current_date <= end_date:
-                current_date_str = current_date.strftime('%Y-%m-%d')
-                if strategy == 'Pre-market Close':
-                    retVal = get_stock_info_by_date(pc_code, current_date_str)
-                    if not retVal:# current_date取不到数据，说明此非交易日，继续下一轮循环
-                        current_date += timedelta(days=1)
-                        continue
-                    else:
-                        refer_ratio = round(retVal['pre_market_change'],2)
-                    if refer_ratio >= 0:
-                        buy_code = buy_code1
-                    else:
-                        buy_code = buy_code2
-                    retVal = query_local_stock_data(buy_code, current_date_str, current_date_str, '1d')
-                    # current_date取不到数据，说明此非交易日，继续下一轮循环
-                    if not retVal:
-                        current_date += timedelta(days=1)
-                        continue
-                    else:
-                        refer_price = retVal[0]['markets']['pre-market']['Close']
-                elif strategy == 'Pre-market Avg':
-                    # 获取盘前平均价格
-                    refer_price = 0
-                elif strategy == 'Pre-market Weighted':
-                    # 获取加权平均价格
-                    refer_price = 0
-                elif strategy == 'Intraday Open':
-                    refer_price = get_stock_info_by_date(pc_code, current_date_str)['intraday_Open']
-                else:
-                    refer_price = 0  # 默认参考价格
-
-                # Retrieve 1-minute data for the given ticker and date
-                minute_data = get_local_data(buy_code, date=current_date_str, market='intraday')
-                # 购买价为盘前收盘价 上浮一定比率
-                buy_price = round(refer_price * (1+buy_price_up_ratio),2)
-
-                result_value = simulate_trade(buy_price, stop_loss, take_profit, minute_data)
-                profit_loss_ratio = round(result_value['profit_loss'],2)
-                profit_loss = round(profit_loss_ratio * buy_price*quantity / 100, 2)
-
-                retVal = {'date': current_date,
-                          'pc_code': pc_code,
-                          'strategy': strategy,
-                          'strategy_result': refer_ratio,
-                          'pc_code_refer_price': refer_price,
-                          'buy_code': buy_code,
-                          'buy_price_up_ratio': buy_price_up_ratio,
-                          'buy_price': buy_price,
-                          'quantity': quantity,
-                          'take_profit': take_profit,
-                          'stop_loss': stop_loss,
-                          'sell_price': result_value['sell_price'],
-                          'profit_loss_ratio': profit_loss_ratio,
-                          'profit_loss': profit_loss,
-                          'sell_time': result_value['sell_time'],
-                          }
-
+            params = (pc_code, strategy, buy_price_up_ratio, quantity, take_profit, stop_loss)
 
-                results.append(retVal)
-
-                current_date += timedelta(days=1)
+            days = iter_opening_days(pc_code, strategy, buy_code1, buy_code2, start_date, end_date)
+            if form.cleaned_data['stream']:
+                return StreamingHttpResponse(_stream_opening_results(days, *params),
+                                             content_type='application/x-ndjson')
 
+            for day in days:
+                results.append(_opening_trade_result(day, *params))
 
             return JsonResponse({'results': results})
 
@@ -213,52 +216,147 @@ def opening_auto_simulation(request):
     return render(request, 'trading/opening_buy_strategy.html', {'form': form})
 
 
+def opening_sweep_simulation(request):
+    """
+    Backtest the opening buy strategy for every combination of buy_price_up_ratio,
+    take_profit and stop_loss in the given ranges.
+
+    The days are prepared once and the whole grid is evaluated on each day's price path
+    (see core/trading/sweep.py). Returns the combinations ranked by total profit/loss and
+    a take_profit x stop_loss heatmap matrix per buy_price_up_ratio.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Invalid request method.'}, status=405)
+    form = OpeningSweepForm(request.POST)
+    if not form.is_valid():
+        return JsonResponse({'error': form.errors}, status=400)
+    data = form.cleaned_data
+    ratios = sweep.parameter_range(data['buy_price_up_ratio_start'], data['buy_price_up_ratio_stop'],
+                                   data['buy_price_up_ratio_step'])
+    take_profits = sweep.parameter_range(data['take_profit_start'], data['take_profit_stop'], data['take_profit_step'])
+    stop_losses = sweep.parameter_range(data['stop_loss_start'], data['stop_loss_stop'], data['stop_loss_step'])
+
+    sweep_config = settings.CONFIG.get('sweep') or {}
+    combinations = len(ratios) * len(take_profits) * len(stop_losses)
+    max_combinations = sweep_config.get('max_combinations', sweep.DEFAULT_MAX_COMBINATIONS)
+    if combinations > max_combinations:
+        return JsonResponse({'error': f'{combinations} combinations requested, at most {max_combinations} allowed.'},
+                            status=400)
+
+    started = time.perf_counter()
+    days = prepare_opening_days(data['pc_code'], data['strategy'], data['buy_code1'], data['buy_code2'],
+                                data['start_date'], data['end_date'])
+    loaded = time.perf_counter()
+    totals = sweep.run_sweep([price_path(day['minute_data']) for day in days], [day['refer_price'] for day in days],
+                             ratios, take_profits, stop_losses, data['quantity'],
+                             max_workers=sweep_config.get('max_workers', sweep.DEFAULT_MAX_WORKERS),
+                             chunk_days=sweep_config.get('chunk_days', sweep.DEFAULT_CHUNK_DAYS))
+    results, heatmap = sweep.rank_results(totals, ratios, take_profits, stop_losses, limit=data['top'] or 50)
+    finished = time.perf_counter()
+
+    return JsonResponse({
+        'results': results,
+        'heatmap': heatmap,
+        'days': totals['days'],
+        'combinations': combinations,
+        'load_seconds': round(loaded - started, 4),
+        'simulate_seconds': round(finished - loaded, 4),
+    })
+
+
 def calculate_profitloss(request):
     if request.method == 'POST':
         requestParam = request.POST.get('trade_data')
         print('In calculateProfitLoss requestParam:', requestParam)
         trade_list = json.loads(requestParam)
         print('In calculateProfitLoss:', trade_list)
-        sim_results = []
+        sim_results = [None] * len(trade_list)
 
         status = 'failure'
 
-        for trade in trade_list:
-            result_value = 0
-            date = trade['date']
-            pcondition_code = trade['precon_code']
-            strategy = trade['strategy']
-            buy_code = trade['buy_code']
+        # Group the trades by (buy_code, date) so the bars of a stock and day are loaded once
+        groups = {}
+        for i, trade in enumerate(trade_list):
             buy_price = float(trade['buy_price'])
-            quantity = int(trade['quantity'])
+            if buy_price == 0:
+                sim_results[i] = {"result": 0, "result_type": "neutral"}
+                status = 'success'
+                continue
             try:
-                if buy_price == 0:
-                    result_value = 0
+                # Results are per share, the quantity is only validated
+                int(trade['quantity'])
+                take_profit = float(trade['take_profit'])
+                stop_loss = float(trade['stop_loss'])
+            except Exception:
+                sim_results[i] = {"result": None, "result_type": "neutral"}
+                continue
+            groups.setdefault((trade['buy_code'], trade['date']), []).append((i, (buy_price, stop_loss, take_profit)))
+
+        load_seconds = 0.0
+        simulate_seconds = 0.0
+        for (buy_code, date), members in groups.items():
+            started = time.perf_counter()
+            try:
+                # Retrieve 1-minute data for the given ticker and date
+                minute_data = get_simulation_bars(buy_code, date, market='intraday')
+            except Exception as e:
+                print(f"Error loading {buy_code} on {date}: {e}")
+                minute_data = None
+            loaded = time.perf_counter()
+            try:
+                results = simulate_trades([params for _, params in members], minute_data) \
+                    if minute_data is not None else None
+            except Exception:
+                results = None
+            simulate_seconds += time.perf_counter() - loaded
+            load_seconds += loaded - started
+
+            for n, (i, _) in enumerate(members):
+                if results is None:
+                    sim_results[i] = {"result": None, "result_type": "neutral"}
+                    continue
+                result_value = results[n]
+                # Determine result type based on the numeric value
+                if result_value['profit_loss'] > 0:
+                    result_type = "positive"
+                elif result_value['profit_loss'] < 0:
+                    result_type = "negative"
                 else:
-                    take_profit = float(trade['take_profit'])
-                    stop_loss = float(trade['stop_loss'])
-
-                    # Retrieve 1-minute data for the given ticker and date
-                    minute_data = get_local_data(buy_code, date=date, market='intraday')
-                    # Pass the retrieved data to simulate_trade
-                    result_value = simulate_trade(buy_price, stop_loss, take_profit, minute_data)
-                    # Determine result type based on the numeric value
-                    if result_value['profit_loss'] > 0:
-                        result_type = "positive"
-                    elif result_value['profit_loss'] < 0:
-                        result_type = "negative"
-                    else:
-                        result_type = "neutral"
+                    result_type = "neutral"
+                sim_results[i] = {"result": result_value, "result_type": result_type}
                 status = 'success'
-            except Exception:
-                result_value = None
-                result_type = "neutral"
 
-            sim_results.append({
-                "result": result_value,
-                "result_type": result_type,
-            })
-        retVal = {"status": status, "simulate": sim_results}
+        timing = {
+            'trades': len(trade_list),
+            'groups': len(groups),
+            'load_seconds': round(load_seconds, 4),
+            'simulate_seconds': round(simulate_seconds, 4),
+        }
+        retVal = {"status": status, "simulate": sim_results, "timing": timing}
         print('------sim_result:', retVal)
 
     return JsonResponse(json.dumps(retVal), safe=False)
+
+
+def macd_strategy_view(request):
+    """
+    MACD strategy page (GET) and backtest (POST).
+
+    The backtest buys when the MACD line crosses above its signal line and sells when it
+    crosses back below or at the end of the intraday session (see core/trading/macd.py).
+    """
+    if request.method != 'POST':
+        context = {
+            "stocks": get_all_stock_list(),
+            "form": MACDStrategyForm(),
+        }
+        return render(request, "core/trading/macd_strategy.html", context)
+    form = MACDStrategyForm(request.POST)
+    if not form.is_valid():
+        return JsonResponse({'error': form.errors}, status=400)
+    data = form.cleaned_data
+    started = time.perf_counter()
+    backtest = run_macd_backtest(data['ticker'], data['start_date'], data['end_date'], data['interval'],
+                                 data['fast'], data['slow'], data['signal'], data['quantity'])
+    backtest['seconds'] = round(time.perf_counter() - started, 4)
+    return JsonResponse(backtest)
@@ -15,14 +15,24 @@ urlpatterns = [
     path('register/', login_views.register_user, name='register'),
     path('reset_password/', login_views.reset_password, name='reset_password'),
     path('', index_views.dashboard_view, name='index'),
+    path("update_all/", index_views.update_all_stocks, name="update_all_stocks"),
     path("update/<str:ticker>/", index_views.update_stock, name="update_stock"),
     path('stock_info/<str:ticker_code>/', index_views.stock_info_view, name='stock_info_view'),
+    path('cache_stats/', index_views.cache_stats_view, name='cache_stats'),
+    path('jobs/', index_views.job_list_view, name='job_list'),
+    path('jobs/<int:job_id>/', index_views.job_status_view, name='job_status'),
     #path('', analysis_views.analysis_index, name='index'),
+    path('stock_chart/<str:ticker>/', analysis_views.stock_chart_view, name='stock_chart'),
+    path('chart/<str:ticker>/', analysis_views.chart_image_view, name='chart_image'),
+    path('api/bars/<str:ticker>/', analysis_views.bars_api_view, name='bars_api'),
     path('swing_buy_strategy/', trading_views.swing_buy_strategy_view, name='swing_buy_strategy'),
     # Opening Buy Strategy page
     path("opening_buy_strategy/", trading_views.opening_buy_strategy_view, name="opening_buy_strategy"),
     path("opening_auto_simulation/", trading_views.opening_auto_simulation, name="opening_auto_simulation"),
+    path("opening_sweep_simulation/", trading_views.opening_sweep_simulation, name="opening_sweep_simulation"),
     path("query_stock_data/", trading_views.query_stock_data, name="query_stock_data"),
+    # MACD Strategy page and backtest
+    path("macd_strategy/", trading_views.macd_strategy_view, name="macd_strategy"),
     path("calculate_profitloss/", trading_views.calculate_profitloss, name="calculate_profitloss"),
     #path('home/', include('core.stocklist.urls')),
 ]
@@ -8,13 +8,15 @@ and provides a form to add a new stock. It uses the data-related methods from th
 
 import os
 import pandas as pd
+from django.http import JsonResponse
 from django.shortcuts import render, redirect
 from django.contrib import messages
 from django.conf import settings
 from core.data.querier import get_all_stock_list
 from core.trading.strategies import TRADING_STRATEGIES
-from core.data.fetcher import fetch_stock_data
-from core.data.storage import store_stock_data
+from core.data.cache import get_cache_stats
+from core.jobs.queue import enqueue_fetch, is_valid_ticker, job_to_dict
+from core.models import FetchJob
 
 
 def dashboard_view(request):
@@ -52,38 +54,74 @@ def add_stock(new_stock):
     existing_tickers = [stock["ticker"].upper() for stock in stocks]
     if new_stock in existing_tickers:
         msg = f"{new_stock} is already added."
+    elif not new_stock:
+        msg = "Please enter a ticker."
+    elif not is_valid_ticker(new_stock):
+        msg = "Please enter a valid ticker (up to 10 letters, digits or . - ^ =)."
     else:
-        try:
-            from core.data.fetcher import fetch_stock_data
-            # Fetch and store stock data (1-minute data, 7 days)
-            data = fetch_stock_data(new_stock, period="7d", interval="1m")
-            store_stock_data(new_stock, data, settings.CONFIG)
-            msg = f"{new_stock} has been added successfully."
-            ret = True
-        except Exception as e:
-            msg = f"Error adding {new_stock}: {e}"
-            print(msg)
+        # The fetch (1-minute data, 7 days) runs in the job worker
+        job, created = enqueue_fetch(new_stock, action="add")
+        msg = f"{new_stock} has been queued for download." if created else f"{new_stock} is already queued."
+        ret = True
     return {'ret': ret, 'msg': msg}
 
 
 def update_stock(request, ticker):
     """
-    Update stock data for the given ticker.
-    This view fetches new stock data from the network and updates local storage.
-    After updating, it redirects back to the stock list page.
+    Queue an update of the stock data for the given ticker.
+    The job worker fetches the bars after the last stored one and stores them.
+    After queueing, it redirects back to the stock list page.
+    """
+    if request.method == "POST" and not is_valid_ticker(ticker):
+        messages.error(request, "Invalid ticker.")
+    elif request.method == "POST":
+        job, created = enqueue_fetch(ticker, action="update")
+        if created:
+            messages.success(request, f"{ticker} update has been queued.")
+        else:
+            messages.info(request, f"{ticker} update is already queued.")
+    else:
+        messages.error(request, "Invalid request method.")
+    return redirect("index")
+
+
+def update_all_stocks(request):
+    """
+    Queue an update of every stored stock. Tickers that already have a queued or
+    running job are not queued twice.
     """
     if request.method == "POST":
-        try:
-            data = fetch_stock_data(ticker, period="7d", interval="1m")
-            store_stock_data(ticker, data, settings.CONFIG)
-            messages.success(request, f"{ticker} data updated successfully.")
-        except Exception as e:
-            messages.error(request, f"Error updating {ticker} data: {e}")
+        tickers = [stock["ticker"] for stock in get_all_stock_list() if is_valid_ticker(stock["ticker"])]
+        created = sum(enqueue_fetch(ticker, action="update")[1] for ticker in tickers)
+        messages.success(request, f"{created} of {len(tickers)} stock updates queued.")
     else:
         messages.error(request, "Invalid request method.")
     return redirect("index")
 
 
+def job_list_view(request):
+    """
+    Return the active fetch jobs and the most recently finished ones as JSON,
+    for the dashboard to poll.
+    """
+    active = FetchJob.objects.filter(status__in=FetchJob.ACTIVE_STATUSES).order_by('created_at')
+    recent = FetchJob.objects.exclude(status__in=FetchJob.ACTIVE_STATUSES).order_by('-finished_at')[:10]
+    return JsonResponse({
+        'active': [job_to_dict(job) for job in active],
+        'recent': [job_to_dict(job) for job in recent],
+    })
+
+
+def job_status_view(request, job_id):
+    """
+    Return the status and progress of one fetch job as JSON.
+    """
+    job = FetchJob.objects.filter(id=job_id).first()
+    if job is None:
+        return JsonResponse({'error': f'Job {job_id} not found.'}, status=404)
+    return JsonResponse(job_to_dict(job))
+
+
 def stock_info_view(request, ticker_code):
     # 获取指定股票的 StockInfo
     from core.data.fetcher import fetch_company_info, fetch_analyst_recommendations
@@ -107,3 +145,10 @@ def stock_info_view(request, ticker_code):
         recommendation['period_meaning'] = periods_meaning.get(recommendation['period'])
 
     return render(request, 'core/stock_info.html', {'stock_info': stock_info, 'stock_recommendations': recommendations})
+
+
+def cache_stats_view(request):
+    """
+    Return the hit/miss/eviction counters of the local data cache as JSON.
+    """
+    return JsonResponse(get_cache_stats())